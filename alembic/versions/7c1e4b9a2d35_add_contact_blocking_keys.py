@@ -0,0 +1,110 @@
+"""Add contact blocking keys
+
+Revision ID: 7c1e4b9a2d35
+Revises: 42b5093f9660
+Create Date: 2026-10-19 10:12:41.208315
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e4b9a2d35'
+down_revision = '42b5093f9660'
+branch_labels = None
+depends_on = None
+
+# Frozen copies of app.core.dedupe's key functions as of this revision
+# (PHONE_SIGNIFICANT_DIGITS=10); rerun `python -m app.core.dedupe --rebuild`
+# if the setting differs.
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+
+def _normalize_email(email):
+    if not email:
+        return None
+    email = email.strip().lower()
+    local, _, domain = email.partition("@")
+    return f"{local.split('+', 1)[0]}@{domain}" if domain else email
+
+
+def _phone_digits(phone):
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def _soundex(name):
+    letters = [c for c in (name or "").lower() if c.isalpha()]
+    if not letters:
+        return None
+    code, previous = letters[0].upper(), _SOUNDEX_CODES.get(letters[0])
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c)
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if c not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def _blocking_keys(first_name, last_name, email, phone):
+    keys = set()
+    if _normalize_email(email):
+        keys.add(("email", _normalize_email(email)))
+    if _phone_digits(phone):
+        keys.add(("phone", _phone_digits(phone)))
+    if _soundex(last_name):
+        initial = (first_name or "").strip()[:1].lower()
+        keys.add(("name", f"{_soundex(last_name)}:{initial}"))
+    return keys
+
+
+def _backfill(batch_size=1000):
+    contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('first_name', sa.String),
+                        sa.column('last_name', sa.String), sa.column('email', sa.String),
+                        sa.column('phone', sa.String))
+    keys = sa.table('contact_blocking_keys', sa.column('contact_id', sa.Integer), sa.column('kind', sa.String),
+                    sa.column('key', sa.String))
+    bind = op.get_bind()
+    rows = []
+    for contact in bind.execute(sa.select(contacts)).all():
+        rows.extend(
+            {"contact_id": contact.id, "kind": kind, "key": key}
+            for kind, key in _blocking_keys(contact.first_name, contact.last_name, contact.email, contact.phone)
+        )
+        if len(rows) >= batch_size:
+            bind.execute(keys.insert(), rows)
+            rows = []
+    if rows:
+        bind.execute(keys.insert(), rows)
+
+
+def upgrade():
+    op.create_table('contact_blocking_keys',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['contact_id'], ['contacts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_contact_blocking_keys_id'), 'contact_blocking_keys', ['id'], unique=False)
+    op.create_index(op.f('ix_contact_blocking_keys_contact_id'), 'contact_blocking_keys', ['contact_id'], unique=False)
+    op.create_index('ix_contact_blocking_keys_kind_key', 'contact_blocking_keys', ['kind', 'key'], unique=False)
+    # Existing contacts need keys too, or duplicate detection finds nothing among them
+    _backfill()
+
+
+def downgrade():
+    op.drop_index('ix_contact_blocking_keys_kind_key', table_name='contact_blocking_keys')
+    op.drop_index(op.f('ix_contact_blocking_keys_contact_id'), table_name='contact_blocking_keys')
+    op.drop_index(op.f('ix_contact_blocking_keys_id'), table_name='contact_blocking_keys')
+    op.drop_table('contact_blocking_keys')
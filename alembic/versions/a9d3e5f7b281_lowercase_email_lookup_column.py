@@ -0,0 +1,53 @@
+"""Store emails only lowercased in the lookup column
+
+Revision ID: a9d3e5f7b281
+Revises: f8b2d4a6c019
+Create Date: 2026-10-20 11:05:54.392018
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3e5f7b281'
+down_revision = 'f8b2d4a6c019'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of app.core.dedupe.lookup_email as of this revision. Databases
+# upgraded through e91f3c7a5d02 before it was corrected have "+tags" dropped
+# from email_normalized, which made /lookup?email= match other addresses.
+def _lookup_email(email):
+    if not email or not email.strip():
+        return None
+    return email.strip().lower()
+
+
+def _backfill(table_name):
+    table = sa.table(table_name, sa.column('id', sa.Integer), sa.column('email', sa.String),
+                     sa.column('email_normalized', sa.String))
+    bind = op.get_bind()
+    rows = [
+        {"row_id": row.id, "normalized": _lookup_email(row.email)}
+        for row in bind.execute(sa.select(table.c.id, table.c.email, table.c.email_normalized))
+        if row.email_normalized != _lookup_email(row.email)
+    ]
+    if rows:
+        bind.execute(
+            table.update().where(table.c.id == sa.bindparam("row_id")).values(
+                email_normalized=sa.bindparam("normalized")),
+            rows,
+        )
+
+
+def upgrade():
+    _backfill('companies')
+    _backfill('contacts')
+
+
+def downgrade():
+    # The lowercased values are what the earlier revisions' code looks up too,
+    # bar "+tag" folding; nothing to undo
+    pass
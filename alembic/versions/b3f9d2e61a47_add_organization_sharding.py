@@ -0,0 +1,39 @@
+"""Add organization sharding
+
+Revision ID: b3f9d2e61a47
+Revises: 7c1e4b9a2d35
+Create Date: 2026-10-19 11:03:27.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f9d2e61a47'
+down_revision = '7c1e4b9a2d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('organization_shards',
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.String(), nullable=False),
+    sa.Column('moving', sa.Boolean(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('organization_id')
+    )
+    op.add_column('companies', sa.Column('organization_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_companies_organization_id'), 'companies', ['organization_id'], unique=False)
+    op.add_column('contacts', sa.Column('organization_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_contacts_organization_id'), 'contacts', ['organization_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_contacts_organization_id'), table_name='contacts')
+    op.drop_column('contacts', 'organization_id')
+    op.drop_index(op.f('ix_companies_organization_id'), table_name='companies')
+    op.drop_column('companies', 'organization_id')
+    op.drop_table('organization_shards')
@@ -0,0 +1,56 @@
+"""Add webhook subscriptions and outbox
+
+Revision ID: c3f9e1b7a482
+Revises: a7e2c5d9f031
+Create Date: 2026-10-19 21:12:05.384917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9e1b7a482'
+down_revision = 'a7e2c5d9f031'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('webhook_subscriptions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=True),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('secret', sa.String(), nullable=False),
+    sa.Column('entity', sa.String(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.Column('failures', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('lease_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_webhook_subscriptions_organization_id'), 'webhook_subscriptions', ['organization_id'], unique=False)
+    op.create_table('webhook_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subscription_id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('entity', sa.String(), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_webhook_outbox_subscription', 'webhook_outbox', ['subscription_id', 'id'], unique=False)
+    op.create_index(op.f('ix_webhook_outbox_organization_id'), 'webhook_outbox', ['organization_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_webhook_outbox_organization_id'), table_name='webhook_outbox')
+    op.drop_index('ix_webhook_outbox_subscription', table_name='webhook_outbox')
+    op.drop_table('webhook_outbox')
+    op.drop_index(op.f('ix_webhook_subscriptions_organization_id'), table_name='webhook_subscriptions')
+    op.drop_table('webhook_subscriptions')
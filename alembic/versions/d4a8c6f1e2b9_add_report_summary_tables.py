@@ -0,0 +1,64 @@
+"""Add report summary tables
+
+Revision ID: d4a8c6f1e2b9
+Revises: b3f9d2e61a47
+Create Date: 2026-10-19 14:21:09.318442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8c6f1e2b9'
+down_revision = 'b3f9d2e61a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_company_contacts',
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('company_id', sa.Integer(), nullable=False),
+    sa.Column('contact_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('organization_id', 'company_id')
+    )
+    op.create_table('report_contact_growth',
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('created_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('organization_id', 'day')
+    )
+    op.create_table('report_contact_locations',
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('country', sa.String(), nullable=False),
+    sa.Column('region', sa.String(), nullable=False),
+    sa.Column('city', sa.String(), nullable=False),
+    sa.Column('contact_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('organization_id', 'country', 'region', 'city')
+    )
+    # Populate the summaries from the existing contacts
+    op.execute(
+        "INSERT INTO report_company_contacts (organization_id, company_id, contact_count) "
+        "SELECT coalesce(organization_id, 0), company_id, count(*) FROM contacts "
+        "WHERE deleted_at IS NULL AND company_id IS NOT NULL "
+        "GROUP BY coalesce(organization_id, 0), company_id"
+    )
+    op.execute(
+        "INSERT INTO report_contact_locations (organization_id, country, region, city, contact_count) "
+        "SELECT coalesce(organization_id, 0), coalesce(country, ''), coalesce(region, ''), coalesce(city, ''), count(*) "
+        "FROM contacts WHERE deleted_at IS NULL "
+        "GROUP BY coalesce(organization_id, 0), coalesce(country, ''), coalesce(region, ''), coalesce(city, '')"
+    )
+    op.execute(
+        "INSERT INTO report_contact_growth (organization_id, day, created_count) "
+        "SELECT coalesce(organization_id, 0), date(created_at), count(*) FROM contacts "
+        "WHERE created_at IS NOT NULL "
+        "GROUP BY coalesce(organization_id, 0), date(created_at)"
+    )
+
+
+def downgrade():
+    op.drop_table('report_contact_locations')
+    op.drop_table('report_contact_growth')
+    op.drop_table('report_company_contacts')
@@ -0,0 +1,32 @@
+"""Add list filter indexes
+
+Revision ID: e6a4d2b8f153
+Revises: c3f9e1b7a482
+Create Date: 2026-10-19 22:41:18.207634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a4d2b8f153'
+down_revision = 'c3f9e1b7a482'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_contacts_company_id'), 'contacts', ['company_id'], unique=False)
+    op.create_index(op.f('ix_contacts_created_at'), 'contacts', ['created_at'], unique=False)
+    op.create_index('ix_contacts_country_created_at', 'contacts', ['country', 'created_at'], unique=False)
+    op.create_index(op.f('ix_companies_created_at'), 'companies', ['created_at'], unique=False)
+    op.create_index('ix_companies_country_created_at', 'companies', ['country', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_companies_country_created_at', table_name='companies')
+    op.drop_index(op.f('ix_companies_created_at'), table_name='companies')
+    op.drop_index('ix_contacts_country_created_at', table_name='contacts')
+    op.drop_index(op.f('ix_contacts_created_at'), table_name='contacts')
+    op.drop_index(op.f('ix_contacts_company_id'), table_name='contacts')
@@ -0,0 +1,72 @@
+"""Add phone and email lookup columns
+
+Revision ID: e91f3c7a5d02
+Revises: d4a8c6f1e2b9
+Create Date: 2026-10-19 16:48:52.104327
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91f3c7a5d02'
+down_revision = 'd4a8c6f1e2b9'
+branch_labels = None
+depends_on = None
+
+# Frozen copies of app.core.dedupe.phone_digits/lookup_email as of this
+# revision (PHONE_SIGNIFICANT_DIGITS=10); rerun `python -m app.core.dedupe
+# --rebuild` if the setting differs.
+def _phone_digits(phone):
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def _normalize_email(email):
+    if not email or not email.strip():
+        return None
+    return email.strip().lower()
+
+
+def _backfill(table_name):
+    table = sa.table(table_name, sa.column('id', sa.Integer), sa.column('phone', sa.String),
+                     sa.column('email', sa.String), sa.column('phone_digits', sa.String),
+                     sa.column('email_normalized', sa.String))
+    bind = op.get_bind()
+    rows = [
+        {"row_id": row.id, "digits": _phone_digits(row.phone), "normalized": _normalize_email(row.email)}
+        for row in bind.execute(sa.select(table.c.id, table.c.phone, table.c.email))
+    ]
+    if rows:
+        bind.execute(
+            table.update().where(table.c.id == sa.bindparam("row_id")).values(
+                phone_digits=sa.bindparam("digits"), email_normalized=sa.bindparam("normalized")),
+            rows,
+        )
+
+
+def upgrade():
+    op.add_column('companies', sa.Column('phone_digits', sa.String(), nullable=True))
+    op.add_column('companies', sa.Column('email_normalized', sa.String(), nullable=True))
+    op.add_column('contacts', sa.Column('phone_digits', sa.String(), nullable=True))
+    op.add_column('contacts', sa.Column('email_normalized', sa.String(), nullable=True))
+    _backfill('companies')
+    _backfill('contacts')
+    op.create_index(op.f('ix_companies_phone_digits'), 'companies', ['phone_digits'], unique=False)
+    op.create_index(op.f('ix_companies_email_normalized'), 'companies', ['email_normalized'], unique=False)
+    op.create_index(op.f('ix_contacts_phone_digits'), 'contacts', ['phone_digits'], unique=False)
+    op.create_index(op.f('ix_contacts_email_normalized'), 'contacts', ['email_normalized'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_contacts_email_normalized'), table_name='contacts')
+    op.drop_index(op.f('ix_contacts_phone_digits'), table_name='contacts')
+    op.drop_index(op.f('ix_companies_email_normalized'), table_name='companies')
+    op.drop_index(op.f('ix_companies_phone_digits'), table_name='companies')
+    op.drop_column('contacts', 'email_normalized')
+    op.drop_column('contacts', 'phone_digits')
+    op.drop_column('companies', 'email_normalized')
+    op.drop_column('companies', 'phone_digits')
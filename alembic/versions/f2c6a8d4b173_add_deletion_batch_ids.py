@@ -0,0 +1,30 @@
+"""Add deletion batch ids
+
+Revision ID: f2c6a8d4b173
+Revises: e91f3c7a5d02
+Create Date: 2026-10-19 17:32:15.660981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a8d4b173'
+down_revision = 'e91f3c7a5d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('companies', sa.Column('deletion_batch_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_companies_deletion_batch_id'), 'companies', ['deletion_batch_id'], unique=False)
+    op.add_column('contacts', sa.Column('deletion_batch_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_contacts_deletion_batch_id'), 'contacts', ['deletion_batch_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_contacts_deletion_batch_id'), table_name='contacts')
+    op.drop_column('contacts', 'deletion_batch_id')
+    op.drop_index(op.f('ix_companies_deletion_batch_id'), table_name='companies')
+    op.drop_column('companies', 'deletion_batch_id')
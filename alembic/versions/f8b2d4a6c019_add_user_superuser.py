@@ -0,0 +1,26 @@
+"""Add user superuser flag
+
+Revision ID: f8b2d4a6c019
+Revises: e6a4d2b8f153
+Create Date: 2026-10-20 10:12:37.481906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8b2d4a6c019'
+down_revision = 'e6a4d2b8f153'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nobody is promoted: users without an organization lose access to tenant data
+    # until granted it with `python -m app.core.auth create-user --superuser` or an UPDATE
+    op.add_column('users', sa.Column('superuser', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    op.drop_column('users', 'superuser')
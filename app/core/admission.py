@@ -0,0 +1,225 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.security import bearer_token, decode_token
+
+
+def _matches(path: str, prefixes) -> bool:
+    for prefix in prefixes:
+        base = prefix.rstrip("/")
+        if path == prefix or (base and path.startswith(base + "/")):
+            return True
+    return False
+
+
+class AdmissionController:
+    """Concurrency limit sized to the DB pool, with a bounded priority wait queue.
+
+    Requests beyond the limit wait in a heap ordered by (priority, arrival);
+    a released slot is handed straight to the best waiter. Once the queue is
+    full, or a waiter times out, the request is rejected instead of piling up
+    on pool checkout.
+    """
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._service_time = 0.05  # EWMA of seconds a request holds a slot
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._service_time * (self.waiting + 1) / self.limit))
+
+    async def acquire(self, priority: int) -> bool:
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if self.waiting >= self.queue_size:
+            self.rejected_full += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            return False
+        except asyncio.CancelledError:
+            # Client went away; if a slot was already handed over, pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if not future.done() or future.cancelled():
+                self.waiting -= 1
+        self.admitted += 1
+        return True
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0):
+        """Hold a slot for the block, for routes in ADMISSION_STREAMING_PATHS; 503 when none is free."""
+        if not await self.acquire(priority):
+            raise HTTPException(status_code=503, detail="Server is busy, please retry",
+                                headers={"Retry-After": str(self.retry_after())})
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def release(self, duration: Optional[float] = None):
+        if duration is not None:
+            self._service_time += 0.1 * (duration - self._service_time)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot over directly; ``active`` stays the same
+                self.waiting -= 1
+                future.set_result(True)
+                return
+        self.active -= 1
+
+
+class TokenBucketLimiter:
+    """Per-client token buckets, kept in a bounded LRU map."""
+
+    def __init__(self, rate: float, burst: int, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.limited = 0
+
+    def take(self, client: str) -> float:
+        """Consume a token; returns 0 when allowed, else seconds until one is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [float(self.burst), now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        self.limited += 1
+        return (1 - bucket[0]) / self.rate
+
+
+def _priority(method: str, path: str) -> int:
+    """Lower is served first: configured route prefixes, then writes before reads."""
+    best = None
+    for prefix, priority in settings.ADMISSION_ROUTE_PRIORITIES.items():
+        if _matches(path, [prefix]) and (best is None or len(prefix) > len(best[0])):
+            best = (prefix, priority)
+    if best is not None:
+        return best[1]
+    return 1 if method in ("GET", "HEAD") else 0
+
+
+def _client_id(scope) -> str:
+    """The verified user behind a bearer token, else the peer's address.
+
+    Keying on the raw header would give a client sending a made-up token
+    per request a fresh bucket each time (and push real clients out of the
+    LRU); claims are cached, so a valid token costs no signature check.
+    """
+    headers = dict(scope.get("headers") or ())
+    token = bearer_token((headers.get(b"authorization") or b"").decode("latin-1"))
+    if token:
+        try:
+            return f"user:{decode_token(token)['sub']}"
+        except (HTTPException, KeyError):
+            pass  # Rejected later by the route; limited by address meanwhile
+    if settings.RATE_LIMIT_TRUST_FORWARDED and b"x-forwarded-for" in headers:
+        return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+controller = AdmissionController(
+    limit=settings.ADMISSION_MAX_CONCURRENCY or settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW,
+    queue_size=settings.ADMISSION_QUEUE_SIZE,
+    timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+
+limiter = TokenBucketLimiter(
+    rate=settings.RATE_LIMIT_PER_SECOND,
+    burst=settings.RATE_LIMIT_BURST,
+    max_clients=settings.RATE_LIMIT_MAX_CLIENTS,
+)
+
+
+class AdmissionMiddleware:
+    """Caps in-flight requests at what the database pool can serve."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or _matches(scope["path"], settings.ADMISSION_EXEMPT_PATHS)
+                or _matches(scope["path"], settings.ADMISSION_STREAMING_PATHS)):
+            await self.app(scope, receive, send)
+            return
+
+        if not await controller.acquire(_priority(scope["method"], scope["path"])):
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry"},
+                status_code=503,
+                headers={"Retry-After": str(controller.retry_after())},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(time.monotonic() - started)
+
+
+class RateLimitMiddleware:
+    """Answers 429 once a client exhausts its token bucket."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not settings.RATE_LIMIT_PER_SECOND
+                or _matches(scope["path"], settings.ADMISSION_EXEMPT_PATHS)):
+            await self.app(scope, receive, send)
+            return
+
+        wait = limiter.take(_client_id(scope))
+        if wait:
+            response = JSONResponse(
+                {"detail": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,271 @@
+import contextvars
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app import schemas
+from app.core import events, logs
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.sharding import DEFAULT_SHARD, engine_for
+from app.models import AuditEntry, Company, Contact
+
+logger = logging.getLogger(__name__)
+
+# The authenticated user behind the current request, set by app.core.auth
+current_user_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("current_user_id", default=None)
+
+# Timestamps are when the change happened, not when it was written
+_UNAUDITED = {"id", "created_at", "updated_at"}
+
+# Entity name and (response alias, attribute) of each audited field
+AUDITED_MODELS = {
+    model: (entity, [(field.alias or name, name) for name, field in schema.model_fields.items()
+                     if name not in _UNAUDITED])
+    for model, entity, schema in ((Contact, "contact", schemas.Contact), (Company, "company", schemas.Company))
+}
+
+events.PENDING_KEYS.append("pending_audit")
+
+
+def _noop(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the previous value when an audited field is assigned, so the diff
+# always has an old value even if the instance had been expired
+for _model, (_, _fields) in AUDITED_MODELS.items():
+    for _, _name in _fields:
+        event.listen(getattr(_model, _name), "set", _noop, active_history=True)
+
+
+def actor() -> Tuple[Optional[int], Optional[str]]:
+    """(user id, request id) responsible for changes made in the current context."""
+    return current_user_id.get(), logs.request_id.get()
+
+
+def _entry(entity: str, entity_id: int, action: str, changes: Dict[str, List[Any]],
+           organization_id: Optional[int], who: Tuple[Optional[int], Optional[str]]) -> Dict[str, Any]:
+    return {
+        "entity": entity,
+        "entity_id": entity_id,
+        "action": action,
+        "changes": jsonable_encoder(changes),
+        "user_id": who[0],
+        "request_id": who[1],
+        "organization_id": organization_id,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def collect_entries(session) -> List[Dict[str, Any]]:
+    """Audit rows for the contact and company changes in a flush that is in progress."""
+    entries = []
+    for obj in session.new:
+        if type(obj) in AUDITED_MODELS:
+            entity, fields = AUDITED_MODELS[type(obj)]
+            state = inspect(obj)
+            changes = {alias: [None, state.dict[name]] for alias, name in fields if state.dict.get(name) is not None}
+            entries.append(_entry(entity, obj.id, "created", changes, obj.organization_id,
+                                  state.info.get("audit_actor") or actor()))
+
+    for obj in session.dirty:
+        if type(obj) not in AUDITED_MODELS:
+            continue
+        entity, fields = AUDITED_MODELS[type(obj)]
+        state = inspect(obj)
+        changes = {}
+        for alias, name in fields:
+            history = state.attrs[name].history
+            if not history.has_changes():
+                continue
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if old != new:
+                changes[alias] = [old, new]
+        if not changes:
+            continue
+        if state.attrs.deleted_at.history.has_changes():
+            action = "deleted" if obj.deleted_at is not None else "restored"
+        else:
+            action = "updated"
+        entries.append(_entry(entity, obj.id, action, changes, obj.organization_id, actor()))
+
+    for obj in session.deleted:
+        if type(obj) in AUDITED_MODELS:
+            entity, fields = AUDITED_MODELS[type(obj)]
+            state = inspect(obj)
+            changes = {alias: [state.dict[name], None] for alias, name in fields if state.dict.get(name) is not None}
+            entries.append(_entry(entity, obj.id, "deleted", changes, obj.organization_id, actor()))
+    return entries
+
+
+def record_rows(session: Session, model, action: str, rows: List[Tuple[Mapping, Optional[Mapping]]]):
+    """Audit rows changed by a bulk statement, which bypasses the flush hooks.
+
+    ``rows`` holds (before, after) column mappings per row, with ``after``
+    None for a row that was deleted outright.
+    """
+    entity, fields = AUDITED_MODELS[model]
+    who = actor()
+    entries = []
+    for before, after in rows:
+        after = after or {}
+        changes = {alias: [before.get(name), after.get(name)] for alias, name in fields
+                   if before.get(name) != after.get(name)}
+        if changes:
+            entries.append(_entry(entity, before["id"], action, changes, before.get("organization_id"), who))
+    _queue(session, entries)
+
+
+def _queue(session: Session, entries: List[Dict[str, Any]]):
+    if not entries or settings.AUDIT_DURABILITY == "off":
+        return
+    if settings.AUDIT_DURABILITY == "transaction":
+        # Committed or rolled back together with the change itself
+        session.connection().execute(insert(AuditEntry.__table__), entries)
+    else:
+        session.info.setdefault("pending_audit", []).extend(entries)
+
+
+class AuditWriter:
+    """Writes committed audit rows in batches from a background thread.
+
+    Rows are buffered per shard and inserted ``batch_size`` at a time once a
+    batch is full or the oldest row has waited ``interval_ms``, so a write
+    request only pays for appending to a list. A failed insert is retried on
+    the next round. Once ``max_buffered`` rows are waiting, callers write
+    their own rows instead, trading latency for never dropping history.
+    """
+
+    def __init__(self, batch_size: int, interval_ms: float, max_buffered: int):
+        self.batch_size = max(1, batch_size)
+        self.interval = interval_ms / 1000
+        self.max_buffered = max_buffered
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._buffered = 0
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.written = 0
+        self.batches = 0
+        self.inline = 0
+        self.failures = 0
+
+    @property
+    def buffered(self) -> int:
+        return self._buffered
+
+    def submit(self, shard: str, entries: List[Dict[str, Any]]):
+        with self._cond:
+            full = self._stopping or self._buffered + len(entries) > self.max_buffered
+            if not full:
+                if self._thread is None:
+                    # Started lazily, so each pre-forked worker gets its own thread
+                    self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                    self._thread.start()
+                self._buffers.setdefault(shard, []).extend(entries)
+                self._buffered += len(entries)
+                if self._oldest is None:
+                    # The thread sleeps until there is something to time
+                    self._oldest = time.monotonic()
+                    self._cond.notify()
+                elif self._buffered >= self.batch_size:
+                    self._cond.notify()
+        if full:
+            self.inline += 1
+            self._insert(shard, entries)
+
+    def flush(self):
+        """Write everything buffered so far from the calling thread."""
+        with self._cond:
+            buffers, self._buffers, self._buffered, self._oldest = self._buffers, {}, 0, None
+        self._write(buffers)
+
+    def stop(self, timeout: float = 10):
+        """Write what is still buffered, then end the writer thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            self._thread = None
+
+    def _insert(self, shard: str, entries: List[Dict[str, Any]]):
+        with self._write_lock, engine_for(shard).begin() as conn:
+            for start in range(0, len(entries), self.batch_size):
+                conn.execute(insert(AuditEntry.__table__), entries[start:start + self.batch_size])
+                self.batches += 1
+            self.written += len(entries)
+
+    def _write(self, buffers: Dict[str, List[Dict[str, Any]]]) -> bool:
+        ok = True
+        for shard, entries in buffers.items():
+            try:
+                self._insert(shard, entries)
+            except Exception:
+                ok = False
+                self.failures += 1
+                logger.exception("Writing %d audit entries to shard %s failed", len(entries), shard)
+                with self._cond:
+                    if self._stopping:
+                        continue
+                    # Put them back ahead of anything newer for the next round
+                    self._buffers[shard] = entries + self._buffers.get(shard, [])
+                    self._buffered += len(entries)
+                    self._oldest = self._oldest or time.monotonic()
+        return ok
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._buffered >= self.batch_size:
+                        break
+                    if self._oldest is not None:
+                        due = self._oldest + self.interval - time.monotonic()
+                        if due <= 0:
+                            break
+                        self._cond.wait(due)
+                    else:
+                        self._cond.wait()
+                stopping = self._stopping
+                buffers, self._buffers, self._buffered, self._oldest = self._buffers, {}, 0, None
+            if not self._write(buffers) and not stopping:
+                # Don't hammer a database that is down
+                time.sleep(self.interval)
+            if stopping:
+                return
+
+
+writer = AuditWriter(settings.AUDIT_BATCH_SIZE, settings.AUDIT_FLUSH_INTERVAL_MS, settings.AUDIT_MAX_BUFFERED)
+
+
+def history(db: Session, entity: str, entity_id: int, limit: int, before: Optional[int] = None) -> List[AuditEntry]:
+    """An entity's audit entries, newest first; ``before`` continues from an earlier page's last id."""
+    query = select(AuditEntry).where(AuditEntry.entity == entity, AuditEntry.entity_id == entity_id)
+    if before is not None:
+        query = query.where(AuditEntry.id < before)
+    return db.execute(query.order_by(AuditEntry.id.desc()).limit(limit)).scalars().all()
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _capture_entries(session, flush_context):
+    if settings.AUDIT_DURABILITY != "off":
+        _queue(session, collect_entries(session))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _hand_off_entries(session):
+    entries = session.info.pop("pending_audit", None)
+    if entries:
+        writer.submit(session.info.get("shard", DEFAULT_SHARD), entries)
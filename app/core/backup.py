@@ -0,0 +1,283 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.core.sharding import DEFAULT_SHARD, engine_for, shard_urls
+from app.models import AuditEntry, Company, Contact
+
+logger = logging.getLogger(__name__)
+
+# Tables in a logical export, parents first so it can be loaded in order
+EXPORT_TABLES = (Company.__table__, Contact.__table__, AuditEntry.__table__)
+
+_FILENAME = re.compile(r"^pingcrm-(?P<shard>[\w-]+)-(?P<stamp>\d{8}T\d{6}Z)\.(?P<format>sqlite|jsonl)\.gz$")
+
+_running = threading.Lock()
+job: Dict[str, Any] = {"running": False, "last_error": None}
+
+
+class _Restarted(Exception):
+    """The source changed under a paged backup too often; copy it in one step instead."""
+
+
+class _HashingWriter:
+    """File wrapper that checksums and counts what is written through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def _fsync_directory(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_atomically(path: str, fill) -> Dict[str, Any]:
+    """Write gzip-compressed output to ``path`` via a temp file that replaces it only once complete."""
+    partial = path + ".partial"
+    try:
+        with open(partial, "wb") as f:
+            writer = _HashingWriter(f)
+            with gzip.GzipFile(filename="", mode="wb", fileobj=writer, compresslevel=settings.BACKUP_COMPRESS_LEVEL,
+                               mtime=0) as compressed:
+                fill(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    checksum = writer.sha256.hexdigest()
+    # sha256sum-compatible sidecar, so `sha256sum -c` verifies the snapshot too
+    with open(path + ".sha256.partial", "w") as f:
+        f.write(f"{checksum}  {os.path.basename(path)}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".sha256.partial", path + ".sha256")
+    _fsync_directory(os.path.dirname(path) or ".")
+    return {"sha256": checksum, "size_bytes": writer.size}
+
+
+def _copy_sqlite(engine, destination: str) -> int:
+    """Copy the live database with the online backup API; returns the pages copied.
+
+    A few pages are copied per step and the source is unlocked while the
+    copy sleeps between steps, so writers are only ever held up for one
+    step. A write from another connection restarts a paged backup; after
+    BACKUP_MAX_RESTARTS of those the rest is copied in one step.
+    """
+    pause = settings.BACKUP_STEP_SLEEP_MS / 1000
+    state = {"remaining": None, "restarts": 0, "total": 0}
+
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > settings.BACKUP_MAX_RESTARTS:
+                raise _Restarted()
+        state["remaining"], state["total"] = remaining, total
+        if remaining and pause:
+            time.sleep(pause)
+
+    source = engine.raw_connection()
+    try:
+        target = sqlite3.connect(destination)
+        try:
+            try:
+                source.driver_connection.backup(target, pages=settings.BACKUP_PAGES_PER_STEP, progress=progress)
+            except _Restarted:
+                logger.info("Database kept changing during the backup; copying it in one step")
+                source.driver_connection.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return state["total"]
+
+
+def _export_rows(engine, out) -> Dict[str, int]:
+    """Stream the exported tables as JSON lines: a header per table, then one array per row."""
+    counts = {}
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # One consistent snapshot across the tables
+            conn = conn.execution_options(isolation_level="REPEATABLE READ")
+            conn.execute(text("SET TRANSACTION READ ONLY"))
+        for table in EXPORT_TABLES:
+            columns = [column.name for column in table.c]
+            out.write(json.dumps({"table": table.name, "columns": columns}).encode() + b"\n")
+            # Server-side cursor: rows arrive in batches instead of all at once
+            result = conn.execution_options(stream_results=True, yield_per=settings.BACKUP_EXPORT_BATCH).execute(
+                select(table).order_by(*table.primary_key.columns)
+            )
+            count = 0
+            for partition in result.partitions():
+                out.write(b"".join(json.dumps(list(row), default=str).encode() + b"\n" for row in partition))
+                count += len(partition)
+            counts[table.name] = count
+        conn.rollback()
+    return counts
+
+
+def snapshot(shard: str = DEFAULT_SHARD, logical: bool = False, directory: Optional[str] = None) -> Dict[str, Any]:
+    """Write a compressed, checksummed snapshot of one shard and return its description.
+
+    SQLite shards are copied page by page with the online backup API unless
+    ``logical`` is set; every other database gets a logical export of the
+    companies, contacts and audit_log tables.
+    """
+    engine = engine_for(shard)
+    directory = directory or settings.BACKUP_DIR
+    os.makedirs(directory, exist_ok=True)
+    sqlite = engine.dialect.name == "sqlite" and not logical
+    if sqlite and engine.url.database in (None, "", ":memory:"):
+        raise ValueError("An in-memory SQLite database can't be backed up")
+
+    created = datetime.now(timezone.utc)
+    name = f"pingcrm-{shard}-{created:%Y%m%dT%H%M%SZ}.{'sqlite' if sqlite else 'jsonl'}.gz"
+    path = os.path.join(directory, name)
+    started = time.monotonic()
+
+    if sqlite:
+        scratch = tempfile.mkdtemp(dir=directory)
+        try:
+            copy = os.path.join(scratch, "copy.db")
+            pages = _copy_sqlite(engine, copy)
+
+            def fill(out):
+                with open(copy, "rb") as f:
+                    shutil.copyfileobj(f, out, 1048576)
+
+            written = _write_atomically(path, fill)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        details = {"pages": pages}
+    else:
+        details = {}
+        written = _write_atomically(path, lambda out: details.update(rows=_export_rows(engine, out)))
+
+    prune(shard, directory)
+    logger.info("Backed up shard %s to %s in %.1fs", shard, path, time.monotonic() - started)
+    return {
+        "file": name,
+        "shard": shard,
+        "format": "sqlite" if sqlite else "jsonl",
+        "created_at": created,
+        **written,
+        **details,
+    }
+
+
+def list_backups(directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Completed snapshots, newest first."""
+    directory = directory or settings.BACKUP_DIR
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for entry in os.scandir(directory):
+        match = _FILENAME.match(entry.name)
+        if not match or not os.path.exists(entry.path + ".sha256"):
+            continue
+        with open(entry.path + ".sha256") as f:
+            checksum = f.read().split()[0]
+        backups.append({
+            "file": entry.name,
+            "shard": match["shard"],
+            "format": match["format"],
+            "created_at": datetime.strptime(match["stamp"], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc),
+            "size_bytes": entry.stat().st_size,
+            "sha256": checksum,
+        })
+    return sorted(backups, key=lambda backup: backup["created_at"], reverse=True)
+
+
+def prune(shard: str, directory: Optional[str] = None):
+    """Keep the newest BACKUP_KEEP snapshots of ``shard``."""
+    directory = directory or settings.BACKUP_DIR
+    for backup in [b for b in list_backups(directory) if b["shard"] == shard][settings.BACKUP_KEEP:]:
+        for suffix in ("", ".sha256"):
+            try:
+                os.remove(os.path.join(directory, backup["file"] + suffix))
+            except OSError:
+                pass
+
+
+def verify(path: str) -> bool:
+    """Whether a snapshot still matches the checksum recorded next to it."""
+    with open(path + ".sha256") as f:
+        expected = f.read().split()[0]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1048576), b""):
+            digest.update(chunk)
+    return digest.hexdigest() == expected
+
+
+def start_in_background(shard: str, logical: bool = False) -> bool:
+    """Run ``snapshot`` on a thread of its own; False if a backup is already running."""
+    if not _running.acquire(blocking=False):
+        return False
+    job["running"] = True
+
+    def run():
+        try:
+            snapshot(shard, logical)
+            job["last_error"] = None
+        except Exception as e:
+            logger.exception("Backup of shard %s failed", shard)
+            job["last_error"] = str(e)
+        finally:
+            job["running"] = False
+            _running.release()
+
+    threading.Thread(target=run, name="backup", daemon=True).start()
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot the database without stopping the app")
+    parser.add_argument("--shard", default=DEFAULT_SHARD, choices=sorted(shard_urls()))
+    parser.add_argument("--logical", action="store_true", help="export companies, contacts and their history as JSON lines")
+    parser.add_argument("--dir", default=None, help=f"output directory (default {settings.BACKUP_DIR})")
+    parser.add_argument("--verify", metavar="FILE", help="check a snapshot against its checksum instead")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.verify:
+        ok = verify(args.verify)
+        print(f"{args.verify}: {'OK' if ok else 'FAILED'}")
+        raise SystemExit(0 if ok else 1)
+    result = snapshot(args.shard, logical=args.logical, directory=args.dir)
+    print(f"{os.path.join(args.dir or settings.BACKUP_DIR, result['file'])}  {result['sha256']}")
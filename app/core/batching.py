@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect
+
+from app import schemas
+from app.core import audit
+from app.core.config import settings
+from app.core.sharding import open_session
+from app.models import Contact
+
+logger = logging.getLogger(__name__)
+
+# (column values, caller's future, when it was queued, who asked for it)
+Pending = Tuple[Dict[str, Any], Future, float, Tuple[Optional[int], Optional[str]]]
+
+
+class ContactWriter:
+    """Group commit for contact creation.
+
+    Creates are queued per organization and a single writer thread turns
+    each queue into one transaction: a multi-row INSERT (with RETURNING, so
+    ids come back without another round trip) and one COMMIT. A batch is
+    written once it has ``max_size`` rows or its oldest row has waited
+    ``max_wait_ms``.
+
+    Every caller gets its own outcome. If the batch fails as a whole (say one
+    row repeats an existing email) it is rolled back and written again one
+    SAVEPOINT per row, so only the offending rows fail, each with its own
+    exception, and the rest still commit together.
+    """
+
+    def __init__(self, max_size: int, max_wait_ms: float):
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queues: Dict[Optional[int], List[Pending]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.batches = 0
+        self.rows = 0
+        self.fallbacks = 0
+
+    def submit(self, organization_id: Optional[int], values: Dict[str, Any]) -> Future:
+        """Queue a contact; the future resolves to its ``schemas.Contact`` or raises its error."""
+        future: Future = Future()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Contact writer is stopped")
+            if self._thread is None:
+                # Started lazily, so each pre-forked worker gets its own thread
+                self._thread = threading.Thread(target=self._run, name="contact-writer", daemon=True)
+                self._thread.start()
+            queue = self._queues.setdefault(organization_id, [])
+            queue.append((values, future, time.monotonic(), audit.actor()))
+            if len(queue) == 1 or len(queue) >= self.max_size:
+                self._cond.notify()
+        return future
+
+    def stop(self, timeout: float = 10):
+        """Write whatever is still queued, then end the writer thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _take(self) -> Tuple[Optional[Tuple[Optional[int], List[Pending]]], Optional[float]]:
+        """A batch that is due, or else how long until the next one will be."""
+        now = time.monotonic()
+        wait = None
+        for organization_id, queue in self._queues.items():
+            due = queue[0][2] + self.max_wait - now
+            if len(queue) >= self.max_size or due <= 0 or self._stopping:
+                batch, rest = queue[:self.max_size], queue[self.max_size:]
+                if rest:
+                    self._queues[organization_id] = rest
+                else:
+                    del self._queues[organization_id]
+                return (organization_id, batch), None
+            wait = due if wait is None else min(wait, due)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    batch, wait = self._take()
+                    if batch is not None or (self._stopping and not self._queues):
+                        break
+                    self._cond.wait(wait)
+            if batch is None:
+                return
+            organization_id, pending = batch
+            # Callers that gave up while queued are dropped; the rest can no longer be cancelled
+            pending = [item for item in pending if item[1].set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            try:
+                self._write(organization_id, pending)
+            except Exception as e:
+                logger.exception("Contact batch for organization %s failed", organization_id)
+                for _, future, _, _ in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+    @staticmethod
+    def _contact(values: Dict[str, Any], who) -> Contact:
+        contact = Contact(**values)
+        # The batch is flushed outside any request, so keep each row's author with it
+        inspect(contact).info["audit_actor"] = who
+        return contact
+
+    def _write(self, organization_id: Optional[int], pending: List[Pending]):
+        with open_session(organization_id) as db:
+            # Keep the returned columns loaded so results need no refresh
+            db.expire_on_commit = False
+            contacts = [self._contact(values, who) for values, _, _, who in pending]
+            try:
+                db.add_all(contacts)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.fallbacks += 1
+                self._write_each(db, pending)
+                return
+            self.batches += 1
+            self.rows += len(contacts)
+            for contact, (_, future, _, _) in zip(contacts, pending):
+                future.set_result(schemas.Contact.model_validate(contact))
+
+    @staticmethod
+    def _begin(db):
+        """Open the outer transaction on the database itself before any SAVEPOINT.
+
+        pysqlite only issues BEGIN ahead of an INSERT/UPDATE/DELETE, so a
+        SAVEPOINT sent first starts a transaction of its own and its RELEASE
+        commits the row at once, whatever happens to the batch afterwards.
+        """
+        connection = db.connection()
+        if connection.dialect.name == "sqlite" and not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN")
+
+    def _write_each(self, db, pending: List[Pending]):
+        written = []
+        self._begin(db)
+        for values, future, _, who in pending:
+            contact = self._contact(values, who)
+            try:
+                with db.begin_nested():
+                    db.add(contact)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            written.append((contact, future))
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            for _, future in written:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(written)
+        for contact, future in written:
+            future.set_result(schemas.Contact.model_validate(contact))
+
+
+contact_writer = ContactWriter(settings.CONTACT_BATCH_MAX_SIZE, settings.CONTACT_BATCH_MAX_WAIT_MS)
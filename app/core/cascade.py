@@ -0,0 +1,81 @@
+import uuid
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.core import audit, events, reports, webhooks
+from app.models import Contact, ContactBlockingKey
+
+# Every column, as ORM attributes so the tenant criteria apply to the SELECT
+_CONTACT_COLUMNS = [getattr(Contact, column.key) for column in Contact.__table__.c]
+
+
+def new_batch_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _affected(db: Session, where) -> List[Dict]:
+    return [dict(row) for row in db.execute(select(*_CONTACT_COLUMNS).where(*where)).mappings()]
+
+
+def update_contacts(db: Session, where, values: Dict, action: str, company_id: int) -> int:
+    """One UPDATE over the matching contacts, plus the side effects a flush would have had.
+
+    Bulk statements bypass the session's flush hooks, so the report summary
+    deltas and the live events (which also keep the autocomplete index
+    current) are derived here from the affected rows and applied in the same
+    transaction, and the changes are audited and queued for webhooks.
+    Blocking keys and lookup columns don't depend on the columns changed here.
+    """
+    before = _affected(db, where)
+    if not before:
+        return 0
+    db.execute(
+        update(Contact).where(*where).values(**values).execution_options(synchronize_session=False)
+    )
+    after = [{**row, **values} for row in before]
+    reports.apply_deltas(db.connection(), reports.row_deltas(zip(before, after)))
+    webhooks.record(db, events.queue_rows(db, Contact, action, after, company_id=company_id))
+    audit.record_rows(db, Contact, action, list(zip(before, after)))
+    return len(after)
+
+
+def soft_delete_company_contacts(db: Session, company_id: int, batch_id: str, when: datetime) -> int:
+    """Trash the company's active contacts, tagged with the company's deletion batch."""
+    return update_contacts(
+        db, [Contact.company_id == company_id, Contact.deleted_at == None],
+        {"deleted_at": when, "deletion_batch_id": batch_id}, "deleted", company_id,
+    )
+
+
+def restore_batch(db: Session, company_id: int, batch_id: str) -> int:
+    """Bring back exactly the contacts trashed together with the company."""
+    return update_contacts(
+        db, [Contact.deletion_batch_id == batch_id, Contact.deleted_at != None],
+        {"deleted_at": None, "deletion_batch_id": None}, "restored", company_id,
+    )
+
+
+def detach_company_contacts(db: Session, company_id: int) -> int:
+    """Clear company_id on the company's contacts before the company row is removed."""
+    return update_contacts(db, [Contact.company_id == company_id], {"company_id": None}, "updated", company_id)
+
+
+def delete_company_contacts(db: Session, company_id: int) -> int:
+    """Permanently delete the company's contacts (and their blocking keys)."""
+    where = [Contact.company_id == company_id]
+    before = _affected(db, where)
+    if not before:
+        return 0
+    db.execute(
+        delete(ContactBlockingKey)
+        .where(ContactBlockingKey.contact_id.in_(select(Contact.id).where(*where)))
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(delete(Contact).where(*where).execution_options(synchronize_session=False))
+    reports.apply_deltas(db.connection(), reports.row_deltas((row, None) for row in before))
+    webhooks.record(db, events.queue_rows(db, Contact, "deleted", before, company_id=company_id))
+    audit.record_rows(db, Contact, "deleted", [(row, None) for row in before])
+    return len(before)
@@ -1,20 +1,163 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str = "sqlite:///./pingcrm.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
     
+    # Sharding settings. Extra shards as JSON, e.g.
+    # SHARDS='{"eu": "sqlite:///./shards/eu.db", "big": "postgresql://...?options=-csearch_path%3Dbig"}'
+    # The "default" shard is always DATABASE_URL and also holds the shard map.
+    SHARDS: Dict[str, str] = {}
+    SHARD_MAP_TTL_SECONDS: int = 30
+    TENANT_HEADER: str = "X-Organization-Id"
+
     # JWT settings
     SECRET_KEY: str = "your-secret-key-here"  # Change this in production
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_REQUIRED: bool = False  # Require a bearer token on the CRM endpoints
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 60  # Verified token claims and user lookups
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt runs in this many worker processes
+    PASSWORD_HASH_MAX_PENDING: int = 32  # Hash/verify jobs allowed in flight before 503
     
     # CORS settings
     CORS_ORIGINS: list = ["*"]  # In production, replace with specific origins
     
+    # Admission control and rate limiting
+    ADMISSION_MAX_CONCURRENCY: Optional[int] = None  # Defaults to DB_POOL_SIZE + DB_MAX_OVERFLOW
+    ADMISSION_QUEUE_SIZE: int = 50
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    # Path prefix -> priority (lower is admitted first); otherwise writes 0, reads 1
+    ADMISSION_ROUTE_PRIORITIES: Dict[str, int] = {"/api/auth": 0}
+    # Paths that never touch the pool or hold connections open (event streams)
+    ADMISSION_EXEMPT_PATHS: List[str] = ["/", "/debug", "/metrics", "/docs", "/redoc", "/openapi.json", "/api/events", "/events"]
+    # Uploads: streaming the body doesn't hold a slot; the route takes one around its database work
+    ADMISSION_STREAMING_PATHS: List[str] = ["/api/users/me/photo", "/users/me/photo"]
+    RATE_LIMIT_PER_SECOND: float = 20.0  # Per client; 0 disables rate limiting
+    RATE_LIMIT_BURST: int = 40
+    RATE_LIMIT_MAX_CLIENTS: int = 10000
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # Key clients by X-Forwarded-For behind a proxy
+
+    # Pre-fork server (python -m app.core.server)
+    WORKERS: Optional[int] = None  # Defaults to the CPUs available to the process
+    WORKER_MAX_REQUESTS: int = 10000  # Recycle a worker after this many requests; 0 disables
+    WORKER_MAX_REQUESTS_JITTER: int = 1000  # Random extra requests so workers don't recycle together
+    WORKER_MAX_RSS_MB: int = 512  # Recycle a worker whose resident memory grows past this; 0 disables
+    WORKER_GRACEFUL_TIMEOUT: int = 30  # Seconds a stopping worker gets to finish in-flight requests
+
+    # Coalescing of identical concurrent GETs
+    COALESCE_ENABLED: bool = True
+    COALESCE_PATHS: List[str] = ["/api/contacts", "/api/companies", "/contacts", "/companies"]
+    COALESCE_MAX_BODY_BYTES: int = 1048576  # Larger responses are not shared
+
+    # Request deadlines, enforced on database statements (Vercel functions are killed at 10s)
+    DEADLINE_SECONDS: float = 8.0  # Default budget per request; 0 disables
+    DEADLINE_ROUTE_SECONDS: Dict[str, float] = {}  # Path prefix -> budget, e.g. {"/api/reports": 5}
+    DEADLINE_HEADER: str = "X-Request-Timeout"  # Per-request override, in seconds
+    DEADLINE_MAX_SECONDS: float = 30.0  # Largest budget the header may ask for
+
+    # Group commit for POST /contacts/: concurrent creates share one transaction
+    CONTACT_BATCHING: bool = False
+    CONTACT_BATCH_MAX_SIZE: int = 64  # Rows per multi-row INSERT
+    CONTACT_BATCH_MAX_WAIT_MS: float = 5.0  # How long the first create in a batch waits for company
+    CONTACT_BATCH_TIMEOUT_SECONDS: float = 10.0  # A create still queued after this gets a 503
+
+    # On-demand request profiling (collapsed-stack files for flame graphs)
+    PROFILE_TOKEN: Optional[str] = None  # Requests with PROFILE_HEADER set to this are profiled
+    PROFILE_HEADER: str = "X-Profile"
+    PROFILE_SAMPLE_RATE: float = 0.0  # Fraction of all requests profiled at random
+    PROFILE_INTERVAL_MS: float = 1.0  # Stack sampling interval
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_MAX_FILES: int = 200  # Oldest profiles are deleted beyond this
+
+    # Logging: JSON lines on stdout, written by a background thread
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000  # Records buffered for the writer; more are dropped, not waited on
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0  # Fraction of successful requests given an access log line
+    LOG_SLOW_REQUEST_MS: float = 1000.0  # Slower requests are always logged
+
+    # Online backups (python -m app.core.backup, /api/admin/backups)
+    BACKUP_DIR: str = "./backups"
+    BACKUP_KEEP: int = 7  # Snapshots kept per shard
+    BACKUP_PAGES_PER_STEP: int = 256  # SQLite pages copied per backup step
+    BACKUP_STEP_SLEEP_MS: float = 10.0  # Pause between steps, with the source unlocked
+    BACKUP_MAX_RESTARTS: int = 3  # Concurrent writes restart a paged copy; then copy in one step
+    BACKUP_EXPORT_BATCH: int = 1000  # Rows per fetch from the server-side cursor
+    BACKUP_COMPRESS_LEVEL: int = 6
+
+    # User photos (PUT /api/users/me/photo, GET /api/users/{id}/photo)
+    PHOTO_DIR: str = "./photos"
+    PHOTO_MAX_BYTES: int = 5 * 1024 * 1024
+    PHOTO_THUMBNAIL_SIZES: List[int] = [64, 128, 256]  # Longest side in pixels; other sizes are refused
+    PHOTO_THUMBNAIL_CACHE_MB: int = 256  # Thumbnails kept on disk; least recently served are evicted first
+
+    # Audit log of contact and company changes (GET /contacts/{id}/history)
+    # "buffered": written in batches off the request path; a crash loses up to AUDIT_FLUSH_INTERVAL_MS of history
+    # "transaction": inserted in the same transaction as the change; "off": not recorded
+    AUDIT_DURABILITY: str = "buffered"
+    AUDIT_BATCH_SIZE: int = 500  # Rows per INSERT
+    AUDIT_FLUSH_INTERVAL_MS: float = 200.0  # Longest a buffered row waits to be written
+    AUDIT_MAX_BUFFERED: int = 50000  # Beyond this, requests write their own rows rather than drop them
+
+    # Outbound webhooks (/api/webhooks; python -m app.core.webhooks)
+    WEBHOOK_BATCH_SIZE: int = 100  # Events per POST
+    WEBHOOK_POLL_SECONDS: float = 5.0  # Outbox check for other workers' writes and retries; local commits wake it
+    WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+    WEBHOOK_MAX_CONNECTIONS: int = 20  # Keep-alive pool shared by all endpoints; also endpoints delivered at once
+    WEBHOOK_RETRY_BASE_SECONDS: float = 5.0  # Backoff after the first failure, doubling with each one after
+    WEBHOOK_RETRY_MAX_SECONDS: float = 3600.0
+    WEBHOOK_MAX_FAILURES: int = 20  # Consecutive failures before a subscription is deactivated; 0 never
+    WEBHOOK_LEASE_SECONDS: float = 60.0  # How long a worker owns an endpoint's delivery without renewing
+    WEBHOOK_SUBSCRIPTION_TTL_SECONDS: float = 30.0  # Other workers see subscription changes within this
+    WEBHOOK_ALLOW_PRIVATE_URLS: bool = False  # Deliver to loopback/private addresses, e.g. a local stub receiver
+
+    # Database maintenance: statistics, vacuum, WAL checkpoints (python -m app.core.maintenance)
+    MAINTENANCE_INTERVAL_SECONDS: float = 6 * 3600  # Least time between runs; 0 disables the scheduler
+    MAINTENANCE_CHECK_SECONDS: float = 10.0  # How often the request rate is sampled
+    MAINTENANCE_QUIET_RPS: float = 1.0  # Requests per second per worker that still count as quiet
+    MAINTENANCE_QUIET_SECONDS: float = 60.0  # How long it must stay quiet before a run starts
+    MAINTENANCE_MAX_DELAY_SECONDS: float = 48 * 3600  # Run even without a quiet period after this; 0 never
+    MAINTENANCE_LOCK_FILE: str = "./maintenance.lock"  # Shared by the workers on a host; holds the last run
+    MAINTENANCE_ANALYSIS_LIMIT: int = 1000  # Rows sampled per SQLite index by ANALYZE
+    MAINTENANCE_VACUUM_PAGES: int = 1000  # Free pages released per incremental vacuum step
+    MAINTENANCE_CHECKPOINT_MODE: str = "TRUNCATE"  # PASSIVE, FULL, RESTART or TRUNCATE
+
     # Environment
     ENVIRONMENT: str = "development"
+
+    # Live update (Server-Sent Events) settings
+    EVENTS_QUEUE_SIZE: int = 100  # Buffered events per subscriber before it is dropped
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    EVENTS_MAX_SUBSCRIBERS: int = 1000  # Per worker process
+
+    # Autocomplete prefix index settings
+    AUTOCOMPLETE_MAX_ENTRIES: int = 500000  # Above this the index falls back to the database
+    AUTOCOMPLETE_MAX_KEY_LENGTH: int = 64
+    AUTOCOMPLETE_SCAN_FACTOR: int = 8  # Keys scanned per requested result
+    AUTOCOMPLETE_MAX_INDEXES: int = 200  # Per-organization indexes kept in memory (LRU)
+    # Other workers' writes are read from the audit log at most this often; 0 for a single process
+    AUTOCOMPLETE_SYNC_SECONDS: float = 1.0
+    AUTOCOMPLETE_SYNC_MAX_ROWS: int = 10000  # An index further behind the audit log than this is reloaded
+
+    # Duplicate contact detection settings
+    DEDUPE_ON_CREATE: str = "off"  # "off", "warn" (X-Possible-Duplicates header) or "reject" (409)
+    DEDUPE_MIN_SCORE: float = 0.6
+    DEDUPE_MAX_BLOCK_SIZE: int = 200  # Larger blocks are too generic to compare pairwise
+    PHONE_SIGNIFICANT_DIGITS: int = 10  # Trailing digits kept, so +1 555... matches 555...
+
+    # Faceted counts on list endpoints
+    FACET_MAX_BUCKETS: int = 20  # Most frequent values returned per facet
+
+    # Filters on list endpoints (filter=country:eq:USA&filter=createdAt:gte:2024-01-01)
+    FILTER_MAX_CLAUSES: int = 10
+    FILTER_MAX_IN_VALUES: int = 100
+    # "<table>.<column>" entries that may be filtered on without an index to support it; each is a scan
+    FILTER_UNINDEXED_ALLOWED: List[str] = []
+    FILTER_SHAPE_CACHE_SIZE: int = 1000  # Cached statements per list endpoint; filters make shapes open-ended
     
     class Config:
         env_file = ".env"
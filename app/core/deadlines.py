@@ -0,0 +1,168 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+
+# Absolute time.monotonic() by which the current request must be done
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+# SQLite VM instructions between deadline checks while a statement runs
+_SQLITE_CHECK_INTERVAL = 10000
+
+# PostgreSQL's error code for a statement cancelled by statement_timeout
+_QUERY_CANCELED = "57014"
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=504, detail="Request took too long and was cancelled")
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check():
+    """Give up with a 504 if the request has run out of time."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+@contextmanager
+def fresh(seconds: float):
+    """Hold the block to a new budget of ``seconds`` from now (none if 0).
+
+    For routes whose request body is streamed in first, so a slow upload
+    doesn't use up the time its database work gets.
+    """
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def route_budget(path: str) -> float:
+    """Seconds allowed for ``path``: the longest matching DEADLINE_ROUTE_SECONDS prefix, else the default."""
+    best = None
+    for prefix, seconds in settings.DEADLINE_ROUTE_SECONDS.items():
+        base = prefix.rstrip("/")
+        if (path == prefix or path.startswith(base + "/")) and (best is None or len(prefix) > len(best[0])):
+            best = (prefix, seconds)
+    return best[1] if best is not None else settings.DEADLINE_SECONDS
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _apply_deadline(conn, cursor, statement, parameters, context, executemany):
+    deadline = _deadline.get()
+    info = conn.connection.info
+    if deadline is None:
+        if info.get("deadline") is not None and conn.dialect.name == "sqlite":
+            conn.connection.driver_connection.set_progress_handler(None, 0)
+        info["deadline"] = None
+        return
+
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded()
+
+    if conn.dialect.name == "postgresql":
+        # SET LOCAL lasts until the transaction ends. Each statement may run
+        # for the whole timeout, so it is lowered again once enough of the
+        # budget has gone by since it was last set
+        applied = info.get("statement_timeout_set")
+        if applied is None or applied[0] != deadline or time.monotonic() - applied[1] > 0.1 * applied[2]:
+            cursor.execute(f"SET LOCAL statement_timeout = {max(1, int(left * 1000))}")
+            info["statement_timeout_set"] = (deadline, time.monotonic(), left)
+    elif conn.dialect.name == "sqlite" and info.get("deadline") != deadline:
+        # Kept until the connection goes back to the pool: rows are stepped
+        # through as they are fetched, after the execute call has returned
+        conn.connection.driver_connection.set_progress_handler(
+            lambda: time.monotonic() > deadline, _SQLITE_CHECK_INTERVAL,
+        )
+    info["deadline"] = deadline
+
+
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def _transaction_ended(conn):
+    # SET LOCAL values are gone with the transaction
+    conn.connection.info.pop("statement_timeout_set", None)
+
+
+@event.listens_for(Pool, "checkin")
+def _clear_deadline(dbapi_connection, connection_record):
+    if dbapi_connection is not None and connection_record.info.get("deadline") is not None:
+        if hasattr(dbapi_connection, "set_progress_handler"):
+            dbapi_connection.set_progress_handler(None, 0)
+        connection_record.info["deadline"] = None
+    connection_record.info.pop("statement_timeout_set", None)
+
+
+@event.listens_for(Engine, "handle_error")
+def _cancelled_by_deadline(context):
+    """Turn a statement the deadline interrupted into a 504 instead of a database error."""
+    left = remaining()
+    if left is None or left > 0:
+        return None
+    error = context.original_exception
+    if getattr(error, "pgcode", None) == _QUERY_CANCELED or "interrupted" in str(error):
+        return DeadlineExceeded()
+    return None
+
+
+class DeadlineMiddleware:
+    """Gives each request a time budget that its database statements are held to.
+
+    The budget comes from DEADLINE_ROUTE_SECONDS / DEADLINE_SECONDS and can
+    be overridden per request with DEADLINE_HEADER (seconds, at most
+    DEADLINE_MAX_SECONDS). No statement starts once it is spent, and one
+    that is running when it runs out is cancelled, so the client gets a 504
+    rather than a dropped connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.DEADLINE_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = route_budget(scope["path"])
+        for name, value in scope.get("headers") or ():
+            if name == self.header:
+                try:
+                    budget = float(value)
+                except ValueError:
+                    budget = 0
+                if not 0 < budget <= settings.DEADLINE_MAX_SECONDS:
+                    response = JSONResponse(
+                        {"detail": f"{settings.DEADLINE_HEADER} must be between 0 and "
+                                   f"{settings.DEADLINE_MAX_SECONDS:g} seconds"},
+                        status_code=400,
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+        if not budget:
+            await self.app(scope, receive, send)
+            return
+
+        token = _deadline.set(time.monotonic() + budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,253 @@
+import argparse
+import json
+import logging
+import re
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, bindparam, delete, event, func, insert, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import Company, Contact, ContactBlockingKey
+
+logger = logging.getLogger(__name__)
+
+# Columns that feed the blocking keys; other edits leave the keys alone
+KEY_COLUMNS = ("first_name", "last_name", "email", "phone")
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+
+def lookup_email(email: Optional[str]) -> Optional[str]:
+    """Lowercased and trimmed: the email_normalized lookup column, an exact match."""
+    if not email or not email.strip():
+        return None
+    return email.strip().lower()
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Lowercase, trim and drop any "+tag" from the local part; for duplicate blocking only."""
+    if not email:
+        return None
+    email = email.strip().lower()
+    local, _, domain = email.partition("@")
+    return f"{local.split('+', 1)[0]}@{domain}" if domain else email
+
+
+def phone_digits(phone: Optional[str]) -> Optional[str]:
+    """Digits only, keeping the trailing significant digits so country prefixes don't matter."""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) < 7:
+        return None
+    return digits[-settings.PHONE_SIGNIFICANT_DIGITS:]
+
+
+def soundex(name: Optional[str]) -> Optional[str]:
+    letters = [c for c in (name or "").lower() if c.isalpha()]
+    if not letters:
+        return None
+    code, previous = letters[0].upper(), _SOUNDEX_CODES.get(letters[0])
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c)
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if c not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def blocking_keys(first_name, last_name, email, phone) -> Set[Tuple[str, str]]:
+    keys = set()
+    if normalize_email(email):
+        keys.add(("email", normalize_email(email)))
+    if phone_digits(phone):
+        keys.add(("phone", phone_digits(phone)))
+    if soundex(last_name):
+        initial = (first_name or "").strip()[:1].lower()
+        keys.add(("name", f"{soundex(last_name)}:{initial}"))
+    return keys
+
+
+def contact_keys(contact) -> Set[Tuple[str, str]]:
+    return blocking_keys(contact.first_name, contact.last_name, contact.email, contact.phone)
+
+
+def score(a, b) -> Tuple[float, List[str]]:
+    """Similarity of two contact-like objects and the fields that matched."""
+    matched, total = [], 0.0
+    if normalize_email(a.email) and normalize_email(a.email) == normalize_email(b.email):
+        matched.append("email")
+        total += 0.7
+    if phone_digits(a.phone) and phone_digits(a.phone) == phone_digits(b.phone):
+        matched.append("phone")
+        total += 0.4
+    name_a = " ".join(filter(None, [a.first_name, a.last_name])).lower()
+    name_b = " ".join(filter(None, [b.first_name, b.last_name])).lower()
+    if name_a and name_b:
+        ratio = SequenceMatcher(None, name_a, name_b).ratio()
+        if ratio >= 0.8:
+            matched.append("name")
+        total += 0.3 * ratio
+    return min(round(total, 3), 1.0), matched
+
+
+def find_candidates(db: Session, probe, exclude_id: Optional[int] = None, limit: int = 20) -> List[Dict]:
+    """Score the contacts sharing at least one blocking key with ``probe``.
+
+    Only rows in the same blocks are read, through the (kind, key) index, so
+    the cost tracks block size rather than table size.
+    """
+    keys = contact_keys(probe)
+    if not keys:
+        return []
+    stmt = (
+        select(Contact)
+        .join(ContactBlockingKey, ContactBlockingKey.contact_id == Contact.id)
+        .where(or_(*[and_(ContactBlockingKey.kind == kind, ContactBlockingKey.key == key) for kind, key in keys]))
+        .where(Contact.deleted_at == None)
+        .distinct()
+        .limit(settings.DEDUPE_MAX_BLOCK_SIZE)
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(Contact.id != exclude_id)
+
+    candidates = []
+    for contact in db.scalars(stmt):
+        value, matched = score(probe, contact)
+        if value >= settings.DEDUPE_MIN_SCORE:
+            candidates.append({"contact": contact, "score": value, "matched_on": matched})
+    candidates.sort(key=lambda candidate: candidate["score"], reverse=True)
+    return candidates[:limit]
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _normalize_lookup_columns(session, flush_context, instances):
+    """Keep phone_digits/email_normalized in step with phone/email for exact-match lookups."""
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, (Company, Contact)):
+            continue
+        state = inspect(obj)
+        if obj in session.new or state.attrs.phone.history.has_changes():
+            obj.phone_digits = phone_digits(obj.phone)
+        if obj in session.new or state.attrs.email.history.has_changes():
+            obj.email_normalized = lookup_email(obj.email)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _sync_blocking_keys(session, flush_context):
+    changed = [obj for obj in session.new if isinstance(obj, Contact)]
+    for obj in session.dirty:
+        if isinstance(obj, Contact):
+            state = inspect(obj)
+            if any(state.attrs[column].history.has_changes() for column in KEY_COLUMNS):
+                changed.append(obj)
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Contact)]
+    if not changed and not removed:
+        return
+
+    stale = [obj.id for obj in changed if obj not in session.new] + removed
+    connection = session.connection()
+    if stale:
+        connection.execute(delete(ContactBlockingKey).where(ContactBlockingKey.contact_id.in_(stale)))
+    rows = [
+        {"contact_id": obj.id, "kind": kind, "key": key}
+        for obj in changed
+        for kind, key in contact_keys(obj)
+    ]
+    if rows:
+        connection.execute(insert(ContactBlockingKey), rows)
+
+
+def rebuild_keys(db: Session, batch_size: int = 1000) -> int:
+    """Recompute every contact's blocking keys."""
+    db.execute(delete(ContactBlockingKey))
+    count, rows = 0, []
+    stmt = select(Contact.id, *[getattr(Contact, column) for column in KEY_COLUMNS])
+    for row in db.execute(stmt).yield_per(batch_size):
+        rows.extend(
+            {"contact_id": row.id, "kind": kind, "key": key}
+            for kind, key in blocking_keys(row.first_name, row.last_name, row.email, row.phone)
+        )
+        count += 1
+        if len(rows) >= batch_size:
+            db.execute(insert(ContactBlockingKey), rows)
+            rows = []
+    if rows:
+        db.execute(insert(ContactBlockingKey), rows)
+    db.commit()
+    return count
+
+
+def rebuild_lookup_columns(db: Session, batch_size: int = 1000) -> int:
+    """Recompute phone_digits/email_normalized, e.g. after PHONE_SIGNIFICANT_DIGITS changes."""
+    count = 0
+    for model in (Company, Contact):
+        table = model.__table__
+        stmt = update(table).where(table.c.id == bindparam("row_id")).values(
+            phone_digits=bindparam("digits"), email_normalized=bindparam("normalized"),
+        )
+        rows = []
+        for row in db.execute(select(model.id, model.phone, model.email)).yield_per(batch_size):
+            rows.append({"row_id": row.id, "digits": phone_digits(row.phone), "normalized": lookup_email(row.email)})
+            count += 1
+            if len(rows) >= batch_size:
+                db.execute(stmt, rows)
+                rows = []
+        if rows:
+            db.execute(stmt, rows)
+    db.commit()
+    return count
+
+
+def find_duplicate_pairs(db: Session) -> Iterable[Dict]:
+    """Yield scored duplicate pairs, comparing contacts only within shared blocks."""
+    blocks = db.execute(
+        select(ContactBlockingKey.kind, ContactBlockingKey.key)
+        .group_by(ContactBlockingKey.kind, ContactBlockingKey.key)
+        .having(func.count() > 1)
+    ).all()
+    seen = set()
+    for kind, key in blocks:
+        members = db.scalars(
+            select(Contact)
+            .join(ContactBlockingKey, ContactBlockingKey.contact_id == Contact.id)
+            .where(ContactBlockingKey.kind == kind, ContactBlockingKey.key == key)
+            .where(Contact.deleted_at == None)
+            .order_by(Contact.id)
+        ).all()
+        if len(members) > settings.DEDUPE_MAX_BLOCK_SIZE:
+            logger.warning("Skipping oversized %s block %r with %d contacts", kind, key, len(members))
+            continue
+        for a, b in combinations(members, 2):
+            if (a.id, b.id) in seen:
+                continue
+            seen.add((a.id, b.id))
+            value, matched = score(a, b)
+            if value >= settings.DEDUPE_MIN_SCORE:
+                yield {"ids": [a.id, b.id], "score": value, "matched_on": matched}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find likely duplicate contacts")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute all blocking keys and phone/email lookup columns first")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            logger.info("Rebuilt blocking keys for %d contacts", rebuild_keys(db))
+            logger.info("Rebuilt lookup columns for %d companies and contacts", rebuild_lookup_columns(db))
+        for pair in find_duplicate_pairs(db):
+            print(json.dumps(pair))
+    finally:
+        db.close()
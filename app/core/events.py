@@ -0,0 +1,282 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, inspect
+
+from app import schemas
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import Company, Contact
+
+logger = logging.getLogger(__name__)
+
+# Entity name and response schema for every model whose changes are broadcast
+TRACKED_MODELS = {
+    Contact: ("contact", schemas.Contact),
+    Company: ("company", schemas.Company),
+}
+
+# Lists in session.info that are handed on at commit and must lose what a
+# rolled-back SAVEPOINT added; other modules queuing work that way add theirs
+PENDING_KEYS = ["pending_events"]
+
+
+class Subscriber:
+    """A single SSE client with its own bounded queue on the event loop that created it."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, entity: Optional[str], company_id: Optional[int],
+                 organization_id: Optional[int]):
+        self.loop = loop
+        self.entity = entity
+        self.company_id = company_id
+        self.organization_id = organization_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, evt: Dict[str, Any]) -> bool:
+        # Tenants only ever see their own organization's changes
+        if self.organization_id is not None and evt["organization_id"] != self.organization_id:
+            return False
+        if self.entity and evt["entity"] != self.entity:
+            return False
+        if self.company_id is not None and self.company_id not in evt["company_ids"]:
+            return False
+        return True
+
+
+class Broadcaster:
+    """Fans committed changes out to every subscriber in this process.
+
+    Each event is rendered to an SSE frame once and the same string is handed to
+    every matching subscriber. Delivery is batched per event loop so a publish
+    from a worker thread costs one ``call_soon_threadsafe`` per loop, not per
+    client. A subscriber whose queue is full is cut off instead of letting the
+    backlog grow; the client gets a ``resync`` event and reconnects.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[asyncio.AbstractEventLoop, set] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.overflows = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, entity: Optional[str] = None, company_id: Optional[int] = None,
+                  organization_id: Optional[int] = None) -> Subscriber:
+        loop = asyncio.get_running_loop()
+        subscriber = Subscriber(loop, entity, company_id, organization_id)
+        with self._lock:
+            self._subscribers.setdefault(loop, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            subs = self._subscribers.get(subscriber.loop)
+            if subs is not None:
+                subs.discard(subscriber)
+                if not subs:
+                    del self._subscribers[subscriber.loop]
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Register an in-process callback invoked synchronously for every event."""
+        self._listeners.append(listener)
+
+    def publish(self, entity: str, action: str, data: Dict[str, Any], company_ids=(),
+                organization_id: Optional[int] = None, shard: str = "default"):
+        evt = {
+            "id": next(self._ids),
+            "entity": entity,
+            "action": action,
+            "data": data,
+            "company_ids": {cid for cid in company_ids if cid is not None},
+            "organization_id": organization_id,
+            "shard": shard,
+        }
+        evt["frame"] = "id: {}\nevent: {}.{}\ndata: {}\n\n".format(
+            evt["id"], entity, action,
+            json.dumps({"entity": entity, "action": action, "data": data}),
+        )
+        self.published += 1
+
+        for listener in self._listeners:
+            try:
+                listener(evt)
+            except Exception:
+                logger.exception("Event listener %r failed", listener)
+
+        with self._lock:
+            targets = {loop: list(subs) for loop, subs in self._subscribers.items()}
+        for loop, subs in targets.items():
+            matching = [sub for sub in subs if sub.matches(evt)]
+            if not matching:
+                continue
+            try:
+                loop.call_soon_threadsafe(self._deliver, matching, evt["frame"])
+            except RuntimeError:
+                # The loop has been closed; its subscribers are gone
+                for sub in subs:
+                    self.unsubscribe(sub)
+
+    def _deliver(self, subscribers: List[Subscriber], frame: str):
+        for sub in subscribers:
+            if sub.overflowed:
+                continue
+            try:
+                sub.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                sub.overflowed = True
+                self.overflows += 1
+                self.unsubscribe(sub)
+
+    async def stream(self, entity: Optional[str] = None, company_id: Optional[int] = None,
+                     organization_id: Optional[int] = None) -> AsyncIterator[str]:
+        """Subscribe and yield SSE frames until the client goes away."""
+        heartbeat = settings.EVENTS_HEARTBEAT_SECONDS
+        subscriber = self.subscribe(entity=entity, company_id=company_id, organization_id=organization_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    frame = ": keep-alive\n\n"
+                if subscriber.overflowed:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+
+broadcaster = Broadcaster()
+
+
+def _serialize(obj, schema) -> Dict[str, Any]:
+    # Only use attributes already loaded on the instance so capturing an event
+    # never triggers a refresh query of its own
+    loaded = inspect(obj).dict
+    data = {}
+    for name, field in schema.model_fields.items():
+        if name in loaded:
+            data[field.alias or name] = loaded[name]
+    return jsonable_encoder(data)
+
+
+def _company_ids(obj) -> List[Optional[int]]:
+    if isinstance(obj, Company):
+        return [obj.id]
+    history = inspect(obj).attrs.company_id.history
+    return [obj.company_id, *history.deleted]
+
+
+def collect_changes(session) -> List[Dict[str, Any]]:
+    """Describe the tracked changes in a flush that is in progress."""
+    changes = []
+    for obj in session.new:
+        if type(obj) in TRACKED_MODELS:
+            changes.append(("created", obj))
+    for obj in session.dirty:
+        if type(obj) not in TRACKED_MODELS or not session.is_modified(obj):
+            continue
+        history = inspect(obj).attrs.deleted_at.history
+        if history.has_changes():
+            action = "deleted" if obj.deleted_at is not None else "restored"
+        else:
+            action = "updated"
+        changes.append((action, obj))
+    for obj in session.deleted:
+        if type(obj) in TRACKED_MODELS:
+            changes.append(("deleted", obj))
+
+    collected = []
+    for action, obj in changes:
+        entity, schema = TRACKED_MODELS[type(obj)]
+        collected.append({
+            "entity": entity,
+            "action": action,
+            "data": _serialize(obj, schema),
+            "company_ids": _company_ids(obj),
+            "organization_id": obj.organization_id,
+            "shard": session.info.get("shard", "default"),
+        })
+    return collected
+
+
+def queue_rows(session, model, action: str, rows: List[Dict[str, Any]],
+               company_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Queue events for rows changed by a bulk statement, which bypasses the flush hooks.
+
+    ``rows`` are column mappings as they are after the change; ``company_id``
+    also notifies that company's subscribers (e.g. a contact's former
+    company). The events go out with the session's other changes on commit;
+    they are also returned, for other consumers of the same changes.
+    """
+    entity, schema = TRACKED_MODELS[model]
+    queued = []
+    for row in rows:
+        queued.append({
+            "entity": entity,
+            "action": action,
+            "data": jsonable_encoder({
+                field.alias or name: row[name] for name, field in schema.model_fields.items() if name in row
+            }),
+            "company_ids": [row.get("company_id") if model is Contact else row["id"], company_id],
+            "organization_id": row.get("organization_id"),
+            "shard": session.info.get("shard", "default"),
+        })
+    session.info.setdefault("pending_events", []).extend(queued)
+    return queued
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _capture_changes(session, flush_context):
+    changes = collect_changes(session)
+    if changes:
+        session.info.setdefault("pending_events", []).extend(changes)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_changes(session):
+    for change in session.info.pop("pending_events", ()):
+        broadcaster.publish(**change)
+
+
+@event.listens_for(SessionLocal, "after_transaction_create")
+def _mark_savepoint(session, transaction):
+    # Remember how much was queued before a SAVEPOINT, so rolling it back
+    # discards only the changes made inside it
+    if transaction.nested:
+        marks = session.info.setdefault("event_marks", {})
+        marks[transaction] = {key: len(session.info.get(key, ())) for key in PENDING_KEYS}
+
+
+@event.listens_for(SessionLocal, "after_transaction_end")
+def _forget_savepoint(session, transaction):
+    if transaction.nested:
+        session.info.get("event_marks", {}).pop(transaction, None)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_changes(session, previous_transaction):
+    # A failed flush inside a SAVEPOINT rolls back its own subtransaction
+    # first; either way the enclosing savepoint, if any, is what is lost
+    transaction = previous_transaction
+    while transaction is not None and not transaction.nested:
+        transaction = transaction.parent
+    marks = session.info.get("event_marks", {}).get(transaction) if transaction is not None else None
+    for key in PENDING_KEYS:
+        if marks is None or key not in marks:
+            session.info.pop(key, None)
+        elif key in session.info:
+            del session.info[key][marks[key]:]
@@ -0,0 +1,94 @@
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import Select, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from app.core import deadlines
+from app.core.config import settings
+
+# Columns that can be faceted on; low-cardinality ones only
+FACETABLE = ("country", "region", "city", "company_id")
+
+Facets = List[Tuple[str, str]]
+
+
+def parse_facets(facets: Optional[str], schema: Type[BaseModel]) -> Optional[Facets]:
+    """Resolve a ``facets=country,companyId`` parameter to (alias, attribute) pairs."""
+    if not facets:
+        return None
+    lookup = {}
+    for name, field in schema.model_fields.items():
+        if name in FACETABLE:
+            lookup[name] = (field.alias or name, name)
+            lookup[field.alias or name] = (field.alias or name, name)
+
+    requested = [part.strip() for part in facets.split(",") if part.strip()]
+    unknown = [part for part in requested if part not in lookup]
+    if unknown:
+        choices = ", ".join(sorted({alias for alias, _ in lookup.values()}))
+        raise HTTPException(status_code=400, detail=f"Cannot facet on: {', '.join(unknown)}; choose from {choices}")
+
+    selected = []
+    for part in requested:
+        if lookup[part] not in selected:
+            selected.append(lookup[part])
+    return selected
+
+
+def facet_statement(query: Select, model, selected: Facets, dialect: str):
+    """One statement counting the values of every selected column.
+
+    The page's filters are reused by wrapping the unpaginated select as a
+    subquery. PostgreSQL groups it once with GROUPING SETS; elsewhere the
+    per-facet GROUP BYs are combined with UNION ALL. Either way each facet
+    keeps only its FACET_MAX_BUCKETS most frequent values.
+    """
+    base = query.with_only_columns(*[getattr(model, name) for _, name in selected]).order_by(None).subquery()
+    columns = [base.c[name] for _, name in selected]
+    count = func.count()
+
+    if dialect == "postgresql":
+        grouped = select(
+            *columns,
+            *[func.grouping(column).label(f"grouping_{i}") for i, column in enumerate(columns)],
+            count.label("n"),
+            func.row_number().over(partition_by=func.grouping(*columns), order_by=count.desc()).label("rank"),
+        ).group_by(func.grouping_sets(*columns)).subquery()
+        return select(grouped).where(grouped.c.rank <= settings.FACET_MAX_BUCKETS).order_by(grouped.c.rank)
+
+    combined = union_all(*[
+        select(literal(i).label("facet"), column.label("value"), count.label("n")).group_by(column)
+        for i, column in enumerate(columns)
+    ]).subquery()
+    ranked = select(
+        combined,
+        func.row_number().over(partition_by=combined.c.facet, order_by=combined.c.n.desc()).label("rank"),
+    ).subquery()
+    return (
+        select(ranked.c.facet, ranked.c.value, ranked.c.n)
+        .where(ranked.c.rank <= settings.FACET_MAX_BUCKETS)
+        .order_by(ranked.c.facet, ranked.c.rank)
+    )
+
+
+def facet_counts(session: Session, query: Select, model, selected: Facets,
+                 params: Optional[Dict[str, Any]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """``{alias: [{"value": ..., "count": ...}, ...]}`` for the rows matching ``query``."""
+    dialect = session.get_bind().dialect.name
+    result = {alias: [] for alias, _ in selected}
+    rows = session.execute(facet_statement(query, model, selected, dialect), params or {}).all()
+    deadlines.check()
+
+    if dialect == "postgresql":
+        width = len(selected)
+        for row in rows:
+            # The column being grouped on is the one whose GROUPING() flag is 0
+            facet = list(row[width:2 * width]).index(0)
+            result[selected[facet][0]].append({"value": row[facet], "count": row.n})
+        return result
+
+    for facet, value, count in rows:
+        result[selected[facet][0]].append({"value": value, "count": count})
+    return result
@@ -0,0 +1,33 @@
+from typing import List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+Fieldset = List[Tuple[str, str]]
+
+
+def parse_fields(fields: Optional[str], schema: Type[BaseModel]) -> Optional[Fieldset]:
+    """Resolve a ``fields=id,firstName,...`` parameter to (alias, attribute) pairs.
+
+    Both the camelCase aliases used in responses and the snake_case attribute
+    names are accepted. ``id`` is always included. Returns None when no
+    fieldset was requested, meaning the full representation.
+    """
+    if not fields:
+        return None
+    lookup = {}
+    for name, field in schema.model_fields.items():
+        lookup[name] = (field.alias or name, name)
+        lookup[field.alias or name] = (field.alias or name, name)
+
+    requested = [part.strip() for part in fields.split(",") if part.strip()]
+    unknown = [part for part in requested if part not in lookup]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+
+    selected = [lookup["id"]]
+    for part in requested:
+        if lookup[part] not in selected:
+            selected.append(lookup[part])
+    return selected
+
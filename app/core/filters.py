@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import DateTime, Integer, String, and_, bindparam
+
+from app.core.config import settings
+
+# operator -> how many values it takes: one, a list, or none
+OPERATORS = {
+    "eq": 1, "gt": 1, "gte": 1, "lt": 1, "lte": 1, "prefix": 1,
+    "in": "list",
+    "null": 0, "notnull": 0,
+}
+
+FILTER_HELP = ("field:operator:value, repeatable and combined with AND. Operators: eq, in (comma-separated "
+               "values), gt, gte, lt, lte, prefix (case-sensitive), null and notnull (no value). Only indexed "
+               "fields can be filtered on. E.g. country:eq:USA, createdAt:gte:2024-01-01")
+
+
+class Filters(NamedTuple):
+    """Parsed ``filter`` parameters: the query shape and the values bound into it.
+
+    ``shape`` holds (attribute, operator) pairs in a canonical order, so
+    requests that differ only in their values share one cached statement.
+    """
+    shape: Tuple[Tuple[str, str], ...] = ()
+    values: Tuple[Any, ...] = ()
+
+
+def escape_like(value: str) -> str:
+    """``value`` as a literal in a LIKE pattern written with ``escape="/"``."""
+    return value.replace("/", "//").replace("%", "/%").replace("_", "/_")
+
+
+def indexed_columns(model) -> Set[str]:
+    """Columns a B-tree lookup can start from: the leading column of an index or the primary key."""
+    table = model.__table__
+    leading = {list(index.columns)[0].name for index in table.indexes}
+    return leading | {list(table.primary_key.columns)[0].name}
+
+
+def _coerce(column, alias: str, value: str) -> Any:
+    try:
+        if isinstance(column.type, Integer):
+            return int(value)
+        if isinstance(column.type, DateTime):
+            parsed = datetime.fromisoformat(value)
+            # Stored as UTC; a naive value is taken to be UTC already
+            return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid value for {alias}: {value!r}")
+    return value
+
+
+def parse_filters(filters: Optional[List[str]], model, schema: Type[BaseModel], **equals: Any) -> Filters:
+    """Resolve ``filter=field:op:value`` parameters, e.g. ``country:eq:USA``, ``createdAt:gte:2024-01-01``.
+
+    Fields are the response fields (camelCase or snake_case); ``in`` takes
+    comma-separated values and ``null``/``notnull`` none. Filtering on a
+    column that no index starts with is refused unless it is listed in
+    FILTER_UNINDEXED_ALLOWED as "<table>.<column>". Keyword arguments that
+    aren't None are added as equality filters, for the older dedicated
+    query parameters.
+    """
+    lookup = {}
+    for name, field in schema.model_fields.items():
+        if name in model.__table__.c:
+            lookup[name] = (field.alias or name, name)
+            lookup[field.alias or name] = (field.alias or name, name)
+    indexed = indexed_columns(model)
+    allowed = set(settings.FILTER_UNINDEXED_ALLOWED)
+
+    clauses: List[Tuple[str, str, Any]] = [(name, "eq", value) for name, value in equals.items() if value is not None]
+    for raw in filters or ():
+        field, _, rest = raw.partition(":")
+        operator, _, value = rest.partition(":")
+        if field not in lookup:
+            choices = ", ".join(sorted({alias for alias, _ in lookup.values()}))
+            raise HTTPException(status_code=400, detail=f"Cannot filter on {field!r}; choose from {choices}")
+        if operator not in OPERATORS:
+            raise HTTPException(status_code=400, detail=f"Unknown filter operator {operator!r} in {raw!r}; "
+                                                        f"use one of {', '.join(OPERATORS)}")
+        alias, name = lookup[field]
+        column = model.__table__.c[name]
+        arity = OPERATORS[operator]
+        if arity == 0:
+            if value:
+                raise HTTPException(status_code=400, detail=f"{operator} takes no value, as in {alias}:{operator}")
+            clauses.append((name, operator, None))
+            continue
+        if operator == "prefix" and not isinstance(column.type, String):
+            raise HTTPException(status_code=400, detail=f"prefix only applies to text fields, not {alias}")
+        if operator == "prefix" and value.endswith("\U0010ffff"):
+            raise HTTPException(status_code=400, detail=f"Invalid value for {alias}: {value!r}")
+        if arity == "list":
+            values = [part for part in value.split(",") if part]
+            if not values or len(values) > settings.FILTER_MAX_IN_VALUES:
+                raise HTTPException(status_code=400, detail=f"in takes 1 to {settings.FILTER_MAX_IN_VALUES} values")
+            clauses.append((name, operator, [_coerce(column, alias, part) for part in values]))
+        elif not value:
+            raise HTTPException(status_code=400, detail=f"Missing value in {raw!r}")
+        else:
+            clauses.append((name, operator, _coerce(column, alias, value)))
+
+    if len(clauses) > settings.FILTER_MAX_CLAUSES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.FILTER_MAX_CLAUSES} filters per request")
+    for name, _, _ in clauses:
+        if name not in indexed and f"{model.__tablename__}.{name}" not in allowed:
+            alias = lookup[name][0]
+            raise HTTPException(status_code=400, detail=f"Filtering on {alias} isn't supported by an index; "
+                                                        f"filter on an indexed field or ask for it to be allowed")
+
+    clauses.sort(key=lambda clause: (clause[0], clause[1]))
+    return Filters(tuple((name, operator) for name, operator, _ in clauses), tuple(value for _, _, value in clauses))
+
+
+def filter_clauses(model, shape: Tuple[Tuple[str, str], ...]) -> List:
+    """WHERE clauses for a filter shape, with each value left as a ``f<i>`` bind parameter."""
+    clauses = []
+    for i, (name, operator) in enumerate(shape):
+        column, param = getattr(model, name), f"f{i}"
+        if operator == "eq":
+            clauses.append(column == bindparam(param))
+        elif operator == "in":
+            clauses.append(column.in_(bindparam(param, expanding=True)))
+        elif operator == "gt":
+            clauses.append(column > bindparam(param))
+        elif operator == "gte":
+            clauses.append(column >= bindparam(param))
+        elif operator == "lt":
+            clauses.append(column < bindparam(param))
+        elif operator == "lte":
+            clauses.append(column <= bindparam(param))
+        elif operator == "prefix":
+            # A range, so a B-tree index can seek to it (SQLite's case-insensitive LIKE
+            # can't use one), and LIKE to drop what a non-bytewise collation sorts into it
+            clauses.append(and_(column >= bindparam(param), column < bindparam(f"{param}_upper"),
+                                column.like(bindparam(f"{param}_like"), escape="/")))
+        elif operator == "null":
+            clauses.append(column == None)
+        elif operator == "notnull":
+            clauses.append(column != None)
+    return clauses
+
+
+def filter_params(filters: Filters) -> Dict[str, Any]:
+    """Values for the bind parameters of ``filter_clauses``."""
+    params = {}
+    for i, ((_, operator), value) in enumerate(zip(filters.shape, filters.values)):
+        if operator == "prefix":
+            escaped = escape_like(value)
+            # Every string starting with the prefix sorts below the prefix with its last character bumped
+            params.update({f"f{i}": value, f"f{i}_upper": value[:-1] + chr(ord(value[-1]) + 1),
+                           f"f{i}_like": escaped + "%"})
+        elif OPERATORS[operator]:
+            params[f"f{i}"] = value
+    return params
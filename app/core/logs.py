@@ -0,0 +1,199 @@
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+access_logger = logging.getLogger("app.access")
+
+# Set for the duration of a request; copied into threadpool workers with the context
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_db_time: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("db_time", default=None)
+
+# Attributes every LogRecord has, plus uvicorn's ANSI-coloured copy of the
+# message; anything else was passed with ``extra=``
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "color_message"}
+
+_handler: Optional[logging.Handler] = None
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, plus any extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _RequestContext(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        rid = request_id.get()
+        if rid is not None and not hasattr(record, "request_id"):
+            record.request_id = rid
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Hands records to a bounded queue, dropping them rather than blocking when it is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.addFilter(_RequestContext())
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Freeze the message now, since its arguments may change once this
+        # returns; the traceback is formatted by the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure(queued: bool = True):
+    """Send the root logger's records to stdout as JSON lines.
+
+    With ``queued`` the request path only appends to a bounded in-memory
+    queue and a background listener does the formatting and writing; the
+    listener is started by ``start()`` in each process that serves requests
+    (threads don't survive a fork). Otherwise records are written directly,
+    as the pre-fork parent does.
+    """
+    global _handler, _listener
+    stop()
+    sink = logging.StreamHandler(sys.stdout)
+    sink.setFormatter(JsonFormatter())
+    if queued:
+        _handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+        _listener = QueueListener(_handler.queue, sink, respect_handler_level=True)
+    else:
+        sink.addFilter(_RequestContext())
+        _handler = sink
+        _listener = None
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+
+def start():
+    """Start the background writer for the queue, if there is one and it isn't running."""
+    if _listener is not None and _listener._thread is None:
+        _listener.start()
+        # Records logged while the server shuts down are still written on exit
+        atexit.register(stop)
+
+
+def stop():
+    """Write out what is queued and stop the background writer."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def dropped() -> int:
+    return getattr(_handler, "dropped", 0)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if _db_time.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    spent = _db_time.get()
+    started = conn.info.get("query_started")
+    if spent is not None and started:
+        spent[0] += time.perf_counter() - started.pop()
+
+
+class AccessLogMiddleware:
+    """Tags each request with an id and logs one structured line when it finishes.
+
+    The id comes from an incoming X-Request-Id header or is generated, is
+    returned in the same header and is attached to every record logged while
+    the request runs. Successful requests are logged at LOG_SUCCESS_SAMPLE_RATE;
+    errors and requests slower than LOG_SLOW_REQUEST_MS always are.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope.get("headers") or ():
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex
+        id_token = request_id.set(rid)
+        spent = [0.0]
+        db_token = _db_time.set(spent)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if (status >= 400 or duration >= settings.LOG_SLOW_REQUEST_MS
+                    or random.random() < settings.LOG_SUCCESS_SAMPLE_RATE):
+                route = scope.get("route")
+                access_logger.info(
+                    "%s %s %d", scope["method"], scope["path"], status,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "route": getattr(route, "path", None),
+                        "status": status,
+                        "duration_ms": round(duration, 2),
+                        "db_ms": round(spent[0] * 1000, 2),
+                    },
+                )
+            _db_time.reset(db_token)
+            request_id.reset(id_token)
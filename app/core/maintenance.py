@@ -0,0 +1,247 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core import admission, backup
+from app.core.config import settings
+from app.core.database import Base
+from app.core.sharding import engine_for, shard_urls
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _timed(results: List[Dict[str, Any]], shard: str, step: str, run: Callable[[], Optional[Dict[str, Any]]]):
+    started = time.perf_counter()
+    details = run() or {}
+    duration = round((time.perf_counter() - started) * 1000, 2)
+    results.append({"shard": shard, "step": step, "duration_ms": duration, **details})
+    logger.info("Maintenance %s on shard %s took %.1f ms", step, shard, duration,
+                extra={"shard": shard, "step": step, "duration_ms": duration, **details})
+
+
+def _sqlite_steps(conn, shard: str, results: List[Dict[str, Any]], full: bool, keep_going: Callable[[], bool]):
+    def analyze():
+        # PRAGMA optimize only looks at tables its own connection has queried,
+        # which on a fresh connection is none, so refresh the statistics
+        # directly; analysis_limit keeps that to a sample of each index
+        conn.exec_driver_sql(f"PRAGMA analysis_limit = {0 if full else settings.MAINTENANCE_ANALYSIS_LIMIT}")
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize")
+
+    def vacuum():
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if mode != 2:
+            if free:
+                logger.info("Shard %s has %d free pages but incremental vacuum is off; run "
+                            "python -m app.core.maintenance --enable-incremental-vacuum once", shard, free)
+            return {"skipped": "auto_vacuum is not incremental", "free_pages": free}
+        released = 0
+        # In chunks, so a burst of traffic only waits for one of them
+        while free and keep_going():
+            chunk = min(free, settings.MAINTENANCE_VACUUM_PAGES)
+            # executescript steps the pragma to completion; execute() would free a single page
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({chunk})")
+            released += chunk
+            free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        return {"released_pages": released, "free_pages": free}
+
+    def checkpoint():
+        if conn.exec_driver_sql("PRAGMA journal_mode").scalar() != "wal":
+            return {"skipped": "not in WAL mode"}
+        busy, log_frames, checkpointed = conn.exec_driver_sql(
+            f"PRAGMA wal_checkpoint({settings.MAINTENANCE_CHECKPOINT_MODE})"
+        ).one()
+        return {"busy": bool(busy), "log_frames": log_frames, "checkpointed_frames": checkpointed}
+
+    for step, run in (("analyze", analyze), ("incremental_vacuum", vacuum), ("wal_checkpoint", checkpoint)):
+        if not keep_going():
+            return False
+        _timed(results, shard, step, run)
+    return True
+
+
+def run_once(shards: Optional[List[str]] = None, full: bool = False,
+             keep_going: Callable[[], bool] = lambda: True) -> List[Dict[str, Any]]:
+    """Run the maintenance steps on each shard and return how long each took.
+
+    SQLite shards get fresh planner statistics, an incremental vacuum of
+    their free pages and a WAL checkpoint; PostgreSQL shards get ANALYZE,
+    their own autovacuum doing the rest. ``keep_going`` is asked between
+    steps, so the scheduler can back off when traffic picks up; ``full``
+    analyzes every row instead of a sample.
+    """
+    results: List[Dict[str, Any]] = []
+    for shard in shards or sorted(shard_urls()):
+        engine = engine_for(shard)
+        # Maintenance statements manage their own transactions
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if engine.dialect.name == "sqlite":
+                if not _sqlite_steps(conn, shard, results, full, keep_going):
+                    break
+            elif engine.dialect.name == "postgresql":
+                if not keep_going():
+                    break
+
+                def analyze():
+                    # Only this app's tables: a shard may be one schema of a shared database
+                    preparer = conn.dialect.identifier_preparer
+                    conn.exec_driver_sql(f"ANALYZE {', '.join(map(preparer.format_table, Base.metadata.sorted_tables))}")
+
+                _timed(results, shard, "analyze", analyze)
+    return results
+
+
+def enable_incremental_vacuum(shard: str):
+    """Switch a SQLite shard to auto_vacuum=INCREMENTAL; rewrites the whole file once, with the database locked."""
+    engine = engine_for(shard)
+    if engine.dialect.name != "sqlite":
+        raise ValueError(f"Shard {shard} is not SQLite")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        started = time.perf_counter()
+        conn.exec_driver_sql("VACUUM")
+        logger.info("Shard %s switched to incremental vacuum in %.1fs", shard, time.perf_counter() - started)
+
+
+class MaintenanceScheduler:
+    """Runs ``run_once`` in the background once traffic has been quiet for a while.
+
+    Every MAINTENANCE_CHECK_SECONDS the thread reads how many requests the
+    admission controller has let in since the last check. After
+    MAINTENANCE_QUIET_SECONDS below MAINTENANCE_QUIET_RPS with nothing in
+    flight, and at least MAINTENANCE_INTERVAL_SECONDS since the last run,
+    maintenance starts; it stops between steps if requests pick up again.
+    A worker that never sees a quiet period still runs it after
+    MAINTENANCE_MAX_DELAY_SECONDS. The last run time is kept in a lock file
+    shared by the workers on the host, so one run covers all of them.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.interrupted = 0
+        self.last_results: List[Dict[str, Any]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._quiet_since: Optional[float] = None
+        self._last_admitted = 0
+        self._last_check = 0.0
+
+    def start(self):
+        if self._thread is None and settings.MAINTENANCE_INTERVAL_SECONDS:
+            self._stop.clear()
+            self._last_admitted, self._last_check = admission.controller.admitted, time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _quiet(self) -> bool:
+        """Sample the request rate; True while traffic is below the quiet threshold."""
+        now = time.monotonic()
+        if now - self._last_check < 1:
+            # Too short a window to tell a burst from a single request
+            return self._quiet_since is not None
+        admitted = admission.controller.admitted
+        rate = (admitted - self._last_admitted) / max(now - self._last_check, 1e-6)
+        self._last_admitted, self._last_check = admitted, now
+        if rate > settings.MAINTENANCE_QUIET_RPS or admission.controller.active or backup.job["running"]:
+            self._quiet_since = None
+            return False
+        if self._quiet_since is None:
+            self._quiet_since = now
+        return True
+
+    @staticmethod
+    def _try_lock(lock) -> bool:
+        """Take the host-wide lock, False if another worker holds it."""
+        if fcntl is None:
+            # No flock here, and no pre-fork workers to share with either
+            # (app.core.server forks); the file only keeps the last run
+            return True
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    @staticmethod
+    def _record(lock, state: Dict[str, Any]):
+        lock.seek(0)
+        lock.truncate()
+        lock.write(json.dumps(state))
+        lock.flush()
+
+    def _run(self):
+        while not self._stop.wait(settings.MAINTENANCE_CHECK_SECONDS):
+            quiet = self._quiet()
+            try:
+                with open(settings.MAINTENANCE_LOCK_FILE, "a+") as lock:
+                    if not self._try_lock(lock):
+                        continue  # Another worker is running it
+                    lock.seek(0)
+                    try:
+                        last_run = json.loads(lock.read() or "{}").get("last_run")
+                    except ValueError:
+                        last_run = None
+                    if last_run is None:
+                        # First start on this host: the interval counts from now
+                        self._record(lock, {"last_run": time.time()})
+                        continue
+                    since = time.time() - last_run
+                    if since < settings.MAINTENANCE_INTERVAL_SECONDS:
+                        continue
+                    overdue = settings.MAINTENANCE_MAX_DELAY_SECONDS and since >= settings.MAINTENANCE_MAX_DELAY_SECONDS
+                    if not overdue and not (quiet and time.monotonic() - self._quiet_since
+                                            >= settings.MAINTENANCE_QUIET_SECONDS):
+                        continue
+
+                    completed = True
+
+                    def keep_going() -> bool:
+                        nonlocal completed
+                        if self._stop.is_set() or not (overdue or self._quiet()):
+                            completed = False
+                        return completed
+
+                    self.last_results = run_once(keep_going=keep_going)
+                    if not completed:
+                        self.interrupted += 1
+                        logger.info("Maintenance stopped early: traffic picked up")
+                        continue
+                    self.runs += 1
+                    self._record(lock, {"last_run": time.time(), "results": self.last_results})
+            except Exception:
+                logger.exception("Database maintenance failed")
+
+
+scheduler = MaintenanceScheduler()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh planner statistics, reclaim free pages and checkpoint the WAL")
+    parser.add_argument("--shard", action="append", choices=sorted(shard_urls()), help="only this shard (repeatable)")
+    parser.add_argument("--full", action="store_true", help="analyze every row instead of a sample")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="switch SQLite shards to incremental vacuum first (one full VACUUM, locks the database)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.enable_incremental_vacuum:
+        for shard in args.shard or sorted(shard_urls()):
+            if engine_for(shard).dialect.name == "sqlite":
+                enable_incremental_vacuum(shard)
+    for result in run_once(args.shard, full=args.full):
+        print(json.dumps(result))
@@ -0,0 +1,386 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from email.utils import formatdate
+from typing import Dict, List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.responses import FileResponse, Response
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+# Pillow is only needed for thumbnails; without it the original photo is served
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp"}
+
+# Multipart boundaries and part headers on top of the photo itself
+_UPLOAD_OVERHEAD = 16384
+
+
+def _image_type(head: bytes) -> Optional[str]:
+    """File extension for the image format ``head`` starts with, from its magic bytes."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class _PhotoPart:
+    """Multipart parser callbacks that pick out the "file" field's bytes."""
+
+    def __init__(self):
+        self.pending: List[bytes] = []
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.found = False
+        self.complete = False
+        self._current = False
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # Only the first "file" field; anything else in the form is skipped
+        self._current = options.get(b"name") == b"file" and not self.found
+        self.found = self.found or self._current
+
+    def _part_data(self, data, start, end):
+        if self._current:
+            chunk = bytes(data[start:end])
+            if len(self.head) < 12:
+                self.head += chunk[:12 - len(self.head)]
+            self.sha256.update(chunk)
+            self.size += len(chunk)
+            self.pending.append(chunk)
+
+    def _part_end(self):
+        if self._current:
+            self._current = False
+            self.complete = True
+
+
+async def receive(request: Request, user_id: int) -> str:
+    """Stream a multipart upload's "file" field into PHOTO_DIR and return the stored file's name.
+
+    Chunks are written to disk as they arrive, so memory holds one network
+    chunk whatever the photo's size, and an upload is refused as soon as it
+    passes PHOTO_MAX_BYTES. Files are named after their content hash, which
+    doubles as the download ETag.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload with a file field")
+    too_large = HTTPException(status_code=413, detail=f"Photos are limited to {settings.PHOTO_MAX_BYTES} bytes")
+    if int(request.headers.get("content-length") or 0) > settings.PHOTO_MAX_BYTES + _UPLOAD_OVERHEAD:
+        raise too_large
+
+    os.makedirs(settings.PHOTO_DIR, exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=settings.PHOTO_DIR, suffix=".partial")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            part = _PhotoPart()
+            parser = MultipartParser(boundary, part.callbacks())
+            async for chunk in request.stream():
+                parser.write(chunk)
+                if part.size > settings.PHOTO_MAX_BYTES:
+                    raise too_large
+                if part.pending:
+                    data = b"".join(part.pending)
+                    part.pending.clear()
+                    await run_in_threadpool(f.write, data)
+            parser.finalize()
+        if not part.complete or not part.size:
+            raise HTTPException(status_code=400, detail="The upload has no file field")
+        extension = _image_type(part.head)
+        if extension is None:
+            raise HTTPException(status_code=415, detail="Photos must be JPEG, PNG, GIF or WebP")
+        filename = f"{user_id}-{part.sha256.hexdigest()[:16]}.{extension}"
+        os.replace(partial, os.path.join(settings.PHOTO_DIR, filename))
+        return filename
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def photo_of(user_id: int) -> Tuple[Optional[str], Optional[int]]:
+    """(photo file name, organization id) of a user; raises 404 for an unknown user."""
+    with SessionLocal() as db:
+        row = db.query(User.photo_path, User.organization_id).filter(User.id == user_id).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return row.photo_path, row.organization_id
+
+
+def set_photo(user_id: int, filename: Optional[str]):
+    """Point the user at a new photo (or none) and delete the one it replaces."""
+    with SessionLocal() as db:
+        user = db.get(User, user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        previous, user.photo_path = user.photo_path, filename
+        db.commit()
+    if previous and previous != filename:
+        remove(previous)
+
+
+def remove(filename: str):
+    """Delete a stored photo and its thumbnails."""
+    for path in [os.path.join(settings.PHOTO_DIR, filename)] + thumbnails.paths(filename):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _resize(source: str, destination: str, size: int) -> int:
+    with Image.open(source) as image:
+        resized = ImageOps.exif_transpose(image)
+        resized.thumbnail((size, size))
+        options = {}
+        if image.format == "JPEG":
+            options["quality"] = 85
+            if resized.mode not in ("RGB", "L"):
+                resized = resized.convert("RGB")
+        partial = destination + ".partial"
+        resized.save(partial, format=image.format, **options)
+    os.replace(partial, destination)
+    return os.path.getsize(destination)
+
+
+class ThumbnailCache:
+    """Resized photos on disk, made on first request and evicted least recently served first.
+
+    A hit costs an ``os.utime``, which is what orders eviction. Each worker
+    keeps a running total of the directory's size and, once it passes
+    ``max_bytes``, rescans it and deletes the oldest files down to 90% of
+    the limit. Concurrent requests for a missing thumbnail in one worker
+    wait for a single resize.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._total: Optional[int] = None
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def paths(self, filename: str) -> List[str]:
+        stem, extension = os.path.splitext(filename)
+        return [os.path.join(self.directory, f"{stem}-{size}{extension}") for size in settings.PHOTO_THUMBNAIL_SIZES]
+
+    def get(self, filename: str, size: int) -> str:
+        """Path of the photo ``filename`` scaled to fit ``size`` pixels square."""
+        source = os.path.join(settings.PHOTO_DIR, filename)
+        if Image is None:
+            return source
+        stem, extension = os.path.splitext(filename)
+        name = f"{stem}-{size}{extension}"
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+            self.hits += 1
+            return path
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            building = self._building.setdefault(name, threading.Lock())
+        with building:
+            if os.path.exists(path):
+                # Made by the request this one waited for
+                self.hits += 1
+                return path
+            self.misses += 1
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                written = _resize(source, path, size)
+            except (OSError, Image.DecompressionBombError) as e:
+                logger.warning("Could not make a %dpx thumbnail of %s: %s", size, filename, e)
+                return source
+            finally:
+                with self._lock:
+                    self._building.pop(name, None)
+        self._account(path, written)
+        return path
+
+    def _account(self, path: str, written: int):
+        with self._lock:
+            if self._total is None:
+                self._total = sum(entry.stat().st_size for entry in os.scandir(self.directory))
+            else:
+                self._total += written
+            if self._total <= self.max_bytes:
+                return
+            # Other workers add files too, so count what is really there
+            entries = sorted(
+                ((entry.stat(), entry.path) for entry in os.scandir(self.directory) if entry.is_file()),
+                key=lambda item: item[0].st_mtime,
+            )
+            self._total = sum(stat.st_size for stat, _ in entries)
+            for stat, old in entries:
+                if self._total <= self.max_bytes * 0.9:
+                    break
+                if old == path:
+                    continue  # About to be served
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+                self._total -= stat.st_size
+                self.evicted += 1
+
+
+thumbnails = ThumbnailCache(os.path.join(settings.PHOTO_DIR, "thumbnails"), settings.PHOTO_THUMBNAIL_CACHE_MB * 1024 * 1024)
+
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(first, last) byte of a single ``bytes=`` range; None serves the whole file.
+
+    Multiple or malformed ranges are ignored, as RFC 9110 allows; a range
+    starting past the end raises ValueError.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - suffix), size - 1
+    first, last = int(first), int(last) if last else size - 1
+    if first >= size:
+        raise ValueError("Range starts past the end")
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match calls for
+    return header.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+class _RangeFileResponse(FileResponse):
+    """206 response with one byte range of a file."""
+
+    def __init__(self, path: str, first: int, last: int, **kwargs):
+        super().__init__(path, status_code=206, **kwargs)
+        self.first, self.last = first, last
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.last - self.first + 1
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": self.first,
+                            "count": count})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.first)
+            while count > 0:
+                chunk = await file.read(min(self.chunk_size, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+            if count > 0:
+                # The file shrank underneath us; end the body rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def file_response(request: Request, path: str) -> Response:
+    """Serve a stored photo or thumbnail, honouring If-None-Match, Range and If-Range.
+
+    Stored names are content hashes, so the name is a strong ETag. The whole
+    file goes out through FileResponse, which hands the path to the server
+    when it supports the ASGI pathsend extension; a range uses zerocopysend
+    where available. Clients revalidate every time (no-cache), which costs
+    a 304 while the photo is unchanged.
+    """
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    name = os.path.basename(path)
+    etag = f'"{os.path.splitext(name)[0]}"'
+    headers = {
+        "etag": etag,
+        "cache-control": "private, no-cache",
+        "accept-ranges": "bytes",
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+    media_type = MEDIA_TYPES.get(os.path.splitext(name)[1].lstrip("."), "application/octet-stream")
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = stat_result.st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = _byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            first, last = byte_range
+            headers.update({"content-range": f"bytes {first}-{last}/{size}", "content-length": str(last - first + 1)})
+            return _RangeFileResponse(path, first, last, headers=headers, media_type=media_type,
+                                      stat_result=stat_result)
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
@@ -0,0 +1,336 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, or_, select
+
+from app.core.config import settings
+from app.core.events import broadcaster
+from app.core.filters import escape_like
+from app.core.sharding import DEFAULT_SHARD, open_session
+from app.models import AuditEntry, Company, Contact
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: Optional[str]) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def word_keys(text: Optional[str]) -> List[str]:
+    """Every suffix of ``text`` that starts at a word, so "acme corp" matches "corp"."""
+    words = normalize(text).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex:
+    """Sorted array of ``(key, id)`` pairs answering prefix queries with bisect.
+
+    Lookups cost O(log n) plus a bounded scan, independent of table size. Keys
+    are truncated and the number of entries is capped so memory stays bounded;
+    once the cap is hit the index reports itself incomplete and callers fall
+    back to the database. Change events only reach the worker that made the
+    change; other workers' changes are found in the audit log, whose ids the
+    index has applied up to ``synced_id``. An index that hasn't caught up
+    within AUTOCOMPLETE_SYNC_SECONDS isn't served until it has.
+    """
+
+    def __init__(self, name: str, build: Callable[[Dict[str, Any]], Tuple[List[str], Dict[str, Any]]]):
+        self.name = name
+        self._build = build
+        self._entries: List[Tuple[str, int]] = []
+        self._docs: Dict[int, Tuple[List[str], Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+        self._pending: Optional[List[Tuple[str, Any]]] = None
+        self.loaded = False
+        self.complete = True
+        # Loads and catch-ups of this index, one at a time
+        self.sync_lock = threading.RLock()
+        self.synced_shard: Optional[str] = None
+        self.synced_id = 0
+        self.synced_at = 0.0  # time.monotonic() of the last look at the audit log
+        self.recent_ids: Set[int] = set()  # Applied audit ids within _SYNC_OVERLAP of synced_id
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def current(self) -> bool:
+        interval = settings.AUTOCOMPLETE_SYNC_SECONDS
+        return not interval or time.monotonic() - self.synced_at < interval
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded and self.complete and self.current
+
+    def begin_load(self):
+        """Start queueing incremental changes that race with a full load."""
+        with self._lock:
+            self._pending = []
+
+    def _keys(self, row: Dict[str, Any]) -> Tuple[List[str], Dict[str, Any]]:
+        keys, item = self._build(row)
+        max_len = settings.AUTOCOMPLETE_MAX_KEY_LENGTH
+        return sorted({key[:max_len] for key in keys if key}), item
+
+    def load(self, rows: Iterable[Dict[str, Any]], capped: bool = True):
+        """Replace the whole index, sorting once instead of inserting row by row."""
+        entries, docs, complete = [], {}, True
+        for row in rows:
+            keys, item = self._keys(row)
+            if capped and len(entries) + len(keys) > settings.AUTOCOMPLETE_MAX_ENTRIES:
+                complete = False
+                break
+            docs[item["id"]] = (keys, item)
+            entries.extend((key, item["id"]) for key in keys)
+        entries.sort()
+        with self._lock:
+            self._entries, self._docs = entries, docs
+            self.complete, self.loaded = complete, True
+            pending, self._pending = self._pending or [], None
+            for op, arg in pending:
+                getattr(self, op)(arg)
+        if not complete:
+            logger.warning("%s autocomplete index hit its entry cap; falling back to the database", self.name)
+
+    def upsert(self, row: Dict[str, Any]):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("upsert", row))
+                return
+            if not self.loaded:
+                return
+            previous = self._docs.get(row["id"])
+            if previous is not None:
+                # Events may carry only some columns; keep the rest from the indexed copy
+                row = {**previous[1]["_row"], **row}
+            keys, item = self._keys(row)
+            item["_row"] = row
+            self._discard(row["id"])
+            if len(self._entries) + len(keys) > settings.AUTOCOMPLETE_MAX_ENTRIES:
+                self.complete = False
+                return
+            self._docs[row["id"]] = (keys, item)
+            for key in keys:
+                insort(self._entries, (key, row["id"]))
+
+    def remove(self, item_id: int):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("remove", item_id))
+                return
+            self._discard(item_id)
+
+    def _discard(self, item_id: int):
+        previous = self._docs.pop(item_id, None)
+        if previous is None:
+            return
+        for key in previous[0]:
+            pos = bisect_left(self._entries, (key, item_id))
+            if pos < len(self._entries) and self._entries[pos] == (key, item_id):
+                del self._entries[pos]
+
+    def search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        prefix = normalize(query)[:settings.AUTOCOMPLETE_MAX_KEY_LENGTH]
+        matches: Dict[int, str] = {}
+        with self._lock:
+            pos = bisect_left(self._entries, (prefix,))
+            end = min(len(self._entries), pos + limit * settings.AUTOCOMPLETE_SCAN_FACTOR)
+            for key, item_id in self._entries[pos:end]:
+                if not key.startswith(prefix):
+                    break
+                # Keep the shortest key per id: a match on the whole name beats a later word
+                if item_id not in matches or len(key) < len(matches[item_id]):
+                    matches[item_id] = key
+            ranked = sorted(matches, key=lambda item_id: (len(matches[item_id]), matches[item_id]))
+            return [
+                {k: v for k, v in self._docs[item_id][1].items() if k != "_row"}
+                for item_id in ranked[:limit]
+            ]
+
+
+def _contact_keys(row):
+    name = " ".join(filter(None, [row.get("first_name"), row.get("last_name")]))
+    keys = word_keys(name) + [normalize(row.get("email"))]
+    return keys, {"id": row["id"], "label": name, "email": row.get("email"), "_row": row}
+
+
+def _company_keys(row):
+    keys = word_keys(row.get("name")) + [normalize(row.get("email"))]
+    return keys, {"id": row["id"], "label": row.get("name") or "", "email": row.get("email"), "_row": row}
+
+
+# Entity -> (model, indexed columns, key builder, the text whose words are keys besides the email)
+ENTITIES = {
+    "contact": (Contact, ["id", "first_name", "last_name", "email"], _contact_keys,
+                lambda: Contact.first_name + " " + Contact.last_name),
+    "company": (Company, ["id", "name", "email"], _company_keys, lambda: Company.name),
+}
+
+# Audit ids read again on every catch-up, so a write that commits after a
+# later id has been seen isn't missed
+_SYNC_OVERLAP = 200
+
+# One index per (entity, organization); None is the unscoped default-shard index
+_indexes: "OrderedDict[Tuple[str, Optional[int]], PrefixIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+_warm_lock = threading.Lock()
+
+
+def get_index(entity: str, organization_id: Optional[int] = None) -> PrefixIndex:
+    """The index for a tenant, evicting the least recently used one past the cap."""
+    key = (entity, organization_id)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = PrefixIndex(f"{entity}s", ENTITIES[entity][2])
+            while len(_indexes) > settings.AUTOCOMPLETE_MAX_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(key)
+        return index
+
+
+def warm(entity: Optional[str] = None, organization_id: Optional[int] = None, reload: bool = False):
+    """Load the active rows of one or all entities into the tenant's indexes."""
+    with _warm_lock:
+        db = open_session(organization_id)
+        try:
+            for name, (model, columns, _, _) in ENTITIES.items():
+                index = get_index(name, organization_id)
+                if entity and (entity != name or (index.loaded and not reload)):
+                    continue
+                with index.sync_lock:
+                    index.begin_load()
+                    # Read first: a change committed during the load is applied again, never missed
+                    synced_id = db.connection().execute(select(func.max(AuditEntry.id))).scalar() or 0
+                    stmt = select(*[getattr(model, column) for column in columns]).where(model.deleted_at == None)
+                    index.load(row._asdict() for row in db.execute(stmt))
+                    index.synced_shard, index.synced_id = db.info["shard"], synced_id
+                    index.synced_at, index.recent_ids = time.monotonic(), set()
+                logger.info("Warmed %s autocomplete index with %d keys", name, len(index))
+        finally:
+            db.close()
+
+
+def sync(entity: str, organization_id: Optional[int]):
+    """Apply the changes other workers made since the index last looked at the audit log.
+
+    Only the rows named by new audit entries are read back, so a catch-up
+    costs one range scan of the audit log's primary key plus one lookup by
+    id, however large the table. An index that has fallen further behind
+    than AUTOCOMPLETE_SYNC_MAX_ROWS, or whose organization moved to another
+    shard, is reloaded instead.
+    """
+    model, columns, _, _ = ENTITIES[entity]
+    index = get_index(entity, organization_id)
+    limit = _SYNC_OVERLAP + settings.AUTOCOMPLETE_SYNC_MAX_ROWS
+    with index.sync_lock:
+        if index.current or not index.loaded:
+            return
+        checked = time.monotonic()
+        db = open_session(organization_id)
+        try:
+            behind = db.info["shard"] != index.synced_shard
+            if not behind:
+                entries = db.connection().execute(
+                    # Core, so tenant scoping doesn't steer the query off the primary key
+                    select(AuditEntry.id, AuditEntry.entity, AuditEntry.entity_id, AuditEntry.organization_id)
+                    .where(AuditEntry.id > index.synced_id - _SYNC_OVERLAP)
+                    .order_by(AuditEntry.id)
+                    .limit(limit)
+                ).all()
+                behind = len(entries) == limit
+            if not behind:
+                changed = {
+                    entry.entity_id for entry in entries
+                    if entry.id not in index.recent_ids and entry.entity == entity
+                    and (organization_id is None or entry.organization_id == organization_id)
+                }
+                stmt = select(*[getattr(model, column) for column in columns]) \
+                    .where(model.id.in_(changed), model.deleted_at == None)
+                rows = {row.id: row._asdict() for row in db.execute(stmt)} if changed else {}
+        finally:
+            db.close()
+        if not behind:
+            for item_id in changed:
+                if item_id in rows:
+                    index.upsert(rows[item_id])
+                else:
+                    index.remove(item_id)
+            if entries:
+                index.synced_id = max(index.synced_id, entries[-1].id)
+            index.recent_ids = {entry.id for entry in entries if entry.id > index.synced_id - _SYNC_OVERLAP}
+            index.synced_at = checked
+            return
+    # Outside the index's lock: warm() takes the global warm lock before it
+    logger.info("%s autocomplete index is too far behind to catch up; reloading", entity)
+    warm(entity, organization_id, reload=True)
+
+
+def _search_database(entity: str, organization_id: Optional[int], query: str, limit: int) -> List[Dict[str, Any]]:
+    """The index's answer computed from the database, for an index over its cap.
+
+    LIKE narrows the rows to those with a word or email starting like the
+    query; the keys are then built and matched exactly as the index does.
+    """
+    model, columns, build, text = ENTITIES[entity]
+    words = normalize(query)[:settings.AUTOCOMPLETE_MAX_KEY_LENGTH].split(" ")
+    # Words in the table may be separated by more than one space
+    pattern = "%".join(escape_like(word) for word in words) + "%"
+    stmt = (
+        select(*[getattr(model, column) for column in columns])
+        .where(model.deleted_at == None)
+        .where(or_(text().ilike(pattern, escape="/"), text().ilike("% " + pattern, escape="/"),
+                   model.email.ilike(pattern, escape="/")))
+        .limit(limit * settings.AUTOCOMPLETE_SCAN_FACTOR)
+    )
+    db = open_session(organization_id)
+    try:
+        rows = db.execute(stmt).all()
+    finally:
+        db.close()
+    matches = PrefixIndex(f"{entity}s", build)
+    # Bounded by the LIMIT already
+    matches.load((row._asdict() for row in rows), capped=False)
+    return matches.search(query, limit)
+
+
+def search(entity: str, organization_id: Optional[int], query: str, limit: int) -> List[Dict[str, Any]]:
+    """Blocking lookup used until the index is warm, when it is due to catch up, or once it is over its cap."""
+    index = get_index(entity, organization_id)
+    if not index.loaded:
+        warm(entity, organization_id)
+    elif index.complete:
+        sync(entity, organization_id)
+    if index.complete:
+        return index.search(query, limit)
+    return _search_database(entity, organization_id, query, limit)
+
+
+def _on_change(evt):
+    _, columns, _, _ = ENTITIES[evt["entity"]]
+    targets = [evt["organization_id"]] if evt["organization_id"] is not None else []
+    if evt["shard"] == DEFAULT_SHARD:
+        targets.append(None)
+    data = evt["data"]
+    for organization_id in targets:
+        with _indexes_lock:
+            index = _indexes.get((evt["entity"], organization_id))
+        if index is None:
+            continue
+        if evt["action"] == "deleted" or data.get("deletedAt"):
+            index.remove(data["id"])
+        else:
+            index.upsert({column: data[_alias(column)] for column in columns if _alias(column) in data})
+
+
+def _alias(column: str) -> str:
+    first, *rest = column.split("_")
+    return first + "".join(word.capitalize() for word in rest)
+
+
+broadcaster.add_listener(_on_change)
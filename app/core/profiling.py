@@ -0,0 +1,182 @@
+import hmac
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A thread whose innermost Python frame is in one of these is waiting, not working
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", os.path.join("concurrent", "futures", "thread.py"))
+
+_busy = threading.Lock()  # One profile at a time per process
+_sequence = itertools.count(1)
+
+
+# Import roots, longest first, so frames show module paths like asyncio/events.py
+_PATH_PREFIXES = sorted({os.path.abspath(path) + os.sep for path in sys.path if path}, key=len, reverse=True)
+
+
+def _label(code) -> str:
+    filename = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class Sampler:
+    """Samples the Python stacks of this process's busy threads at a fixed interval.
+
+    Stacks are aggregated in collapsed ("folded") form: root-to-leaf frame
+    labels joined by ``;`` with a sample count, the input format of
+    flamegraph.pl, speedscope and similar viewers. Each stack is rooted at
+    the event loop or the worker thread it was seen on. Threads are shared
+    by every request in the worker, so anything running concurrently with
+    the profiled request shows up as well.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.loop_thread = threading.get_ident()
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+        self._labels: Dict = {}
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        # The sampler only runs when it gets the GIL; without a shorter switch
+        # interval a busy request would be sampled every 5 ms at best
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._thread.start()
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def _stack(self, frame) -> Optional[Tuple[str, ...]]:
+        if frame.f_code.co_filename.endswith(_IDLE_FILES):
+            return None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _label(code)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._done.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = self._stack(frame)
+                if stack is None:
+                    continue
+                if ident == self.loop_thread:
+                    root = "event-loop"
+                else:
+                    if ident not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    root = names.get(ident, "thread")
+                self.counts[(root,) + stack] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.counts.most_common())
+
+
+def _write(sampler: Sampler, filename: str):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, filename)
+    with open(path + ".tmp", "w") as f:
+        f.write(sampler.folded())
+    os.replace(path + ".tmp", path)
+
+    # Keep only the newest profiles
+    profiles = sorted(
+        (entry for entry in os.scandir(settings.PROFILE_DIR) if entry.name.endswith(".folded")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:max(0, len(profiles) - settings.PROFILE_MAX_FILES)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    logger.info("Saved profile %s (%d samples)", path, sampler.samples)
+
+
+class ProfilerMiddleware:
+    """Profiles single requests on demand and saves each as a collapsed-stack file.
+
+    A request is profiled when it carries PROFILE_HEADER set to PROFILE_TOKEN
+    (the response then names the file in the same header), or at random
+    with probability PROFILE_SAMPLE_RATE. With neither configured the
+    middleware passes requests straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.PROFILE_HEADER.lower().encode("latin-1")
+        self.token = (settings.PROFILE_TOKEN or "").encode("latin-1")
+        self.enabled = bool(self.token) or settings.PROFILE_SAMPLE_RATE > 0
+
+    def _requested(self, scope) -> bool:
+        if self.token:
+            for name, value in scope.get("headers") or ():
+                if name == self.header:
+                    return hmac.compare_digest(value, self.token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = self._requested(scope)
+        if not requested and not random.random() < settings.PROFILE_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+        if not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{slug}-{os.getpid()}-{next(_sequence)}.folded"
+
+        async def send_with_name(message):
+            if requested and message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (self.header, filename.encode("latin-1"))]
+            await send(message)
+
+        sampler = Sampler(settings.PROFILE_INTERVAL_MS / 1000)
+        try:
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_with_name)
+            finally:
+                sampler.stop()
+            try:
+                await run_in_threadpool(_write, sampler, filename)
+            except OSError:
+                logger.exception("Could not save profile %s", filename)
+        finally:
+            _busy.release()
@@ -0,0 +1,126 @@
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import Select, bindparam, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.core import deadlines
+from app.core.config import settings
+from app.core.facets import Facets, facet_counts
+from app.core.fieldsets import Fieldset
+from app.core.filters import Filters, filter_clauses, filter_params
+
+
+def _json_value(value: Any) -> Any:
+    # What the response models would produce: pydantic writes a UTC offset as "Z"
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class ReadPath:
+    """List and detail reads for one model as Core ``select()`` statements.
+
+    Statements are built once per filter shape (status, whether there is a
+    search, which fields are filtered with which operators, which
+    fieldset), with the values bound at execution, so a request only looks
+    up its statement and SQLAlchemy's compiled cache does the rest. Rows
+    come back as plain tuples of the response columns, with no identity map
+    or attribute instrumentation, and are turned into JSON-ready dicts
+    without another pass through the response model. They are selected
+    through the mapped columns, so the session's tenant criteria still
+    apply.
+    """
+
+    def __init__(self, model, schema: Type[BaseModel], search_columns: Sequence):
+        self.model = model
+        self.fields: Fieldset = [(field.alias or name, name) for name, field in schema.model_fields.items()]
+        self.search_columns = search_columns
+        self._statements: Dict[Tuple, Tuple[Select, Select, Select]] = {}
+        self._by_id: Dict[Tuple, Select] = {}
+
+    def _columns(self, selected: Optional[Fieldset]):
+        return [getattr(self.model, name) for _, name in (selected or self.fields)]
+
+    def _where(self, status: str, search: bool, shape: Tuple[Tuple[str, str], ...]) -> List:
+        clauses = []
+        if status == "active":
+            clauses.append(self.model.deleted_at == None)
+        elif status == "trashed":
+            clauses.append(self.model.deleted_at != None)
+        # "all" status doesn't need filtering
+        if search:
+            clauses.append(or_(*[column.ilike(bindparam("pattern")) for column in self.search_columns]))
+        clauses.extend(filter_clauses(self.model, shape))
+        return clauses
+
+    def list_statements(self, status: str, search: bool, shape: Tuple[Tuple[str, str], ...],
+                        selected: Optional[Fieldset]) -> Tuple[Select, Select, Select]:
+        """(count, page, unpaginated) statements for one filter shape."""
+        key = (status, search, shape, tuple(selected) if selected else None)
+        statements = self._statements.get(key)
+        if statements is None:
+            where = self._where(status, search, shape)
+            rows = select(*self._columns(selected)).where(*where)
+            statements = (
+                select(func.count(self.model.id)).where(*where),
+                rows.offset(bindparam("skip")).limit(bindparam("limit")),
+                rows,
+            )
+            if len(self._statements) >= settings.FILTER_SHAPE_CACHE_SIZE:
+                # Filters make the number of shapes open-ended; forget the oldest
+                self._statements.pop(next(iter(self._statements)), None)
+            self._statements[key] = statements
+        return statements
+
+    def _item(self, row, selected: Optional[Fieldset]) -> Dict[str, Any]:
+        return {alias: _json_value(value) for (alias, _), value in zip(selected or self.fields, row)}
+
+    def page(self, db: Session, skip: int, limit: int, status: str = "active", search: Optional[str] = None,
+             filters: Filters = Filters(), selected: Optional[Fieldset] = None,
+             facets: Optional[Facets] = None) -> Dict[str, Any]:
+        """One page of rows as a JSON-ready paginated response.
+
+        The request's deadline is checked between the count, facets, page and
+        serialization, so a request that is out of time stops at the next
+        stage rather than only at its next statement.
+        """
+        count, paged, rows = self.list_statements(status, bool(search), filters.shape, selected)
+        params = filter_params(filters)
+        if search:
+            params["pattern"] = f"%{search}%"
+
+        total = db.execute(count, params).scalar()
+        deadlines.check()
+
+        # Value counts for the requested facets under the same filters, in one query
+        facet_buckets = None
+        if facets:
+            facet_buckets = {
+                alias: [{"value": _json_value(bucket["value"]), "count": bucket["count"]} for bucket in buckets]
+                for alias, buckets in facet_counts(db, rows, self.model, facets, params).items()
+            }
+            deadlines.check()
+
+        items = db.execute(paged, {**params, "skip": skip, "limit": limit}).all()
+        deadlines.check()
+        return {
+            "items": [self._item(row, selected) for row in items],
+            "total": total,
+            "page": skip // limit + 1,
+            "pages": (total + limit - 1) // limit if total > 0 else 1,
+            "facets": facet_buckets,
+        }
+
+    def get(self, db: Session, id: int, selected: Optional[Fieldset] = None) -> Optional[Dict[str, Any]]:
+        """One row by id as a JSON-ready dict, or None."""
+        key = tuple(selected) if selected else None
+        statement = self._by_id.get(key)
+        if statement is None:
+            statement = self._by_id[key] = select(*self._columns(selected)).where(self.model.id == bindparam("id"))
+        row = db.execute(statement, {"id": id}).first()
+        return None if row is None else self._item(row, selected)
@@ -0,0 +1,203 @@
+import argparse
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from app.core.database import SessionLocal
+from app.models import CompanyContactCount, Contact, DailyContactGrowth, LocationContactCount
+
+logger = logging.getLogger(__name__)
+
+# Columns whose old values decide which summary rows a contact counted towards
+TRACKED_COLUMNS = ("organization_id", "company_id", "country", "region", "city", "deleted_at")
+
+# (table, key columns, counter column) for each summary. Company and location
+# count active contacts; growth counts contacts by the UTC day they were
+# created, trashed or not
+SUMMARIES = {
+    "company": (CompanyContactCount.__table__, ("organization_id", "company_id"), "contact_count"),
+    "location": (LocationContactCount.__table__, ("organization_id", "country", "region", "city"), "contact_count"),
+    "growth": (DailyContactGrowth.__table__, ("organization_id", "day"), "created_count"),
+}
+
+
+def _noop(target, value, oldvalue, initiator):
+    pass
+
+
+# Make sure the previous value is loaded when one of these is assigned, so the
+# flush hook can always take the contact out of the rows it used to count in
+for _column in TRACKED_COLUMNS:
+    event.listen(getattr(Contact, _column), "set", _noop, active_history=True)
+
+
+def _previous(state, column):
+    history = state.attrs[column].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return state.attrs[column].value
+
+
+def _current(state, column):
+    return state.attrs[column].value
+
+
+def _contributions(values) -> dict:
+    """Summary keys an active contact counts towards; empty for trashed contacts."""
+    if values("deleted_at") is not None:
+        return {}
+    organization_id = values("organization_id") or 0
+    keys = {"location": (organization_id, values("country") or "", values("region") or "", values("city") or "")}
+    if values("company_id") is not None:
+        keys["company"] = (organization_id, values("company_id"))
+    return keys
+
+
+def collect_deltas(session) -> dict:
+    """Net +/- counts per summary row implied by the session's pending changes."""
+    deltas = {name: Counter() for name in SUMMARIES}
+    today = datetime.now(timezone.utc).date()
+
+    for obj in session.new:
+        if isinstance(obj, Contact):
+            state = inspect(obj)
+            for name, key in _contributions(lambda column: _current(state, column)).items():
+                deltas[name][key] += 1
+            deltas["growth"][(obj.organization_id or 0, today)] += 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Contact):
+            state = inspect(obj)
+            if not any(state.attrs[column].history.has_changes() for column in TRACKED_COLUMNS):
+                continue
+            for name, key in _contributions(lambda column: _previous(state, column)).items():
+                deltas[name][key] -= 1
+            for name, key in _contributions(lambda column: _current(state, column)).items():
+                deltas[name][key] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Contact):
+            state = inspect(obj)
+            for name, key in _contributions(lambda column: _previous(state, column)).items():
+                deltas[name][key] -= 1
+            created_at = _previous(state, "created_at")
+            if created_at is not None:
+                deltas["growth"][(_previous(state, "organization_id") or 0, created_at.date())] -= 1
+
+    return {name: {key: delta for key, delta in counter.items() if delta} for name, counter in deltas.items()}
+
+
+def row_deltas(changes: Iterable[Tuple[Mapping, Optional[Mapping]]]) -> dict:
+    """Deltas for contacts changed outside a flush (bulk UPDATE/DELETE).
+
+    ``changes`` holds (before, after) column mappings per contact, with
+    ``after`` None for a row that was deleted outright.
+    """
+    deltas = {name: Counter() for name in SUMMARIES}
+    for before, after in changes:
+        for name, key in _contributions(before.get).items():
+            deltas[name][key] -= 1
+        if after is not None:
+            for name, key in _contributions(after.get).items():
+                deltas[name][key] += 1
+        elif before.get("created_at") is not None:
+            deltas["growth"][(before.get("organization_id") or 0, before["created_at"].date())] -= 1
+    return {name: {key: delta for key, delta in counter.items() if delta} for name, counter in deltas.items()}
+
+
+def apply_deltas(connection: Connection, deltas: dict):
+    """Add each delta to its summary row with one upsert statement per table."""
+    for name, changes in deltas.items():
+        if not changes:
+            continue
+        table, keys, counter = SUMMARIES[name]
+        rows = [{**dict(zip(keys, key)), counter: delta} for key, delta in changes.items()]
+        dialect = connection.dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert_ = sqlite.insert if dialect == "sqlite" else postgresql.insert
+            stmt = insert_(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={counter: table.c[counter] + stmt.excluded[counter]},
+            )
+            connection.execute(stmt, rows)
+            continue
+        # Other backends: try the update first, insert the rows it missed
+        for row in rows:
+            match = [table.c[key] == row[key] for key in keys]
+            result = connection.execute(update(table).where(*match).values({counter: table.c[counter] + row[counter]}))
+            if not result.rowcount:
+                connection.execute(insert(table).values(row))
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _update_summaries(session, flush_context):
+    deltas = collect_deltas(session)
+    if any(deltas.values()):
+        apply_deltas(session.connection(), deltas)
+
+
+def _rebuild_statements(organization_id: Optional[int] = None) -> List:
+    """DELETE + INSERT ... SELECT ... GROUP BY per summary, optionally for one organization."""
+    active = Contact.__table__
+    organization = func.coalesce(active.c.organization_id, 0)
+    company = (
+        select(organization, active.c.company_id, func.count())
+        .where(active.c.deleted_at == None, active.c.company_id != None)
+        .group_by(organization, active.c.company_id)
+    )
+    location_columns = [func.coalesce(active.c[column], "") for column in ("country", "region", "city")]
+    location = (
+        select(organization, *location_columns, func.count())
+        .where(active.c.deleted_at == None)
+        .group_by(organization, *location_columns)
+    )
+    day = func.date(active.c.created_at)
+    growth = select(organization, day, func.count()).where(active.c.created_at != None).group_by(organization, day)
+
+    statements = []
+    for name, source in (("company", company), ("location", location), ("growth", growth)):
+        table, keys, counter = SUMMARIES[name]
+        clear = delete(table)
+        if organization_id is not None:
+            clear = clear.where(table.c.organization_id == organization_id)
+            source = source.where(active.c.organization_id == organization_id)
+        statements.append(clear)
+        statements.append(insert(table).from_select([*keys, counter], source))
+    return statements
+
+
+def rebuild(connection: Connection, organization_id: Optional[int] = None):
+    """Recompute the summaries from the contacts table in a few set-based statements."""
+    for statement in _rebuild_statements(organization_id):
+        connection.execute(statement)
+
+
+def rebuild_shards(shards: Iterable[str]):
+    from app.core.sharding import engine_for
+
+    for shard in shards:
+        with engine_for(shard).begin() as connection:
+            rebuild(connection)
+        logger.info("Rebuilt report summaries on shard %s", shard)
+
+
+if __name__ == "__main__":
+    from app.core.sharding import shard_urls
+
+    parser = argparse.ArgumentParser(description="Maintain the reporting summary tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_command = commands.add_parser("rebuild", help="recompute the summaries from the contacts table")
+    rebuild_command.add_argument("--shard", action="append", choices=sorted(shard_urls()),
+                                 help="shard to rebuild (repeatable, default all)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    rebuild_shards(args.shard or sorted(shard_urls()))
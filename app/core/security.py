@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# Keep this module free of database imports: it is re-imported by every
+# process in the hashing pool
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# A valid hash to verify against when the user doesn't exist, so a login for
+# an unknown email costs the same as a wrong password
+_DUMMY_HASH = "$2b$12$I5yhnfKXZrc9dV6Jt5QqgOKAp.S6aRSwz4NhxXQCcD0ONACrYG436"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING)
+
+token_cache = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    try:
+        return pwd_context.verify(password, hashed)
+    except ValueError:
+        return False
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned, not forked: forking a threaded server process is unsafe
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def _run_in_pool(fn, *args):
+    # Bound the backlog: past it, shed the request instead of queueing bcrypt work
+    if not _pending.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+    finally:
+        _pending.release()
+
+
+async def hash_password(password: str) -> str:
+    return await _run_in_pool(_hash, password)
+
+
+async def verify_password(password: str, hashed: Optional[str]) -> bool:
+    return await _run_in_pool(_verify, password, hashed or _DUMMY_HASH) and hashed is not None
+
+
+def create_access_token(user_id: int, organization_id: Optional[int], superuser: bool = False,
+                        expires_delta: Optional[timedelta] = None) -> str:
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
+    claims = {"sub": str(user_id), "org": organization_id, "exp": expire}
+    if superuser:
+        # The only way to an unscoped token: "org": null alone is refused (app/core/sharding.py)
+        claims["superuser"] = True
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """Verified claims of ``token``, cached until the token (or the cache TTL) expires."""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    remaining = claims["exp"] - datetime.now(timezone.utc).timestamp()
+    token_cache.set(token, claims, ttl=remaining)
+    return claims
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization[:7].lower() == "bearer ":
+        return authorization[7:].strip()
+    return None
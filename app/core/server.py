@@ -0,0 +1,242 @@
+import argparse
+import logging
+import math
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+import uvicorn
+from uvicorn.importer import import_from_string
+
+from app.core import logs
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    """CPUs this process may actually use: affinity mask, capped by a cgroup v2 quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _reset_after_fork():
+    """Drop state a forked worker must not share with its parent or siblings."""
+    from app.core import sharding
+
+    sharding.dispose_engines()
+    # A fresh log queue; the app's startup starts this worker's writer thread
+    logs.configure()
+    legacy = sys.modules.get("app.database")
+    if legacy is not None:
+        legacy.engine.dispose(close=False)
+
+
+class PreforkServer:
+    """Bind once, import the app once, then fork workers that share the socket.
+
+    Each worker runs its own uvicorn server (uvloop and httptools are used
+    when installed) and exits after ``max_requests`` plus some jitter. The
+    parent replaces workers that exit, recycles any whose resident memory
+    passes ``max_rss_mb``, restarts them all one by one on SIGHUP and stops
+    them gracefully on SIGTERM/SIGINT.
+    """
+
+    def __init__(self, app: str, host: str, port: int, workers: int, max_requests: int,
+                 max_requests_jitter: int, max_rss_mb: int, graceful_timeout: int, backlog: int = 2048):
+        self.app_path = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_rss_mb = max_rss_mb
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.children: Dict[int, float] = {}  # pid -> start time
+        self.retiring: Dict[int, float] = {}  # pid -> when it was asked to stop
+        self._stopping = False
+        self._reload = False
+
+    def run(self):
+        self.sock = _bind(self.host, self.port, self.backlog)
+        # Imported before forking so every worker shares the loaded code
+        self.app = import_from_string(self.app_path)
+        # Importing the app queues log records for a writer thread; the parent
+        # never starts one (threads don't survive fork), so it logs directly
+        logs.configure(queued=False)
+        logger.info("Listening on %s:%d with %d workers (pid %d)", self.host, self.port, self.workers, os.getpid())
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        for _ in range(self.workers):
+            self.spawn()
+        try:
+            while not self._stopping:
+                self.reap()
+                if self._reload:
+                    self._reload = False
+                    self.recycle(list(self.children), "reload requested")
+                self.check_memory()
+                while len(self.children) < self.workers and not self._stopping:
+                    self.spawn()
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame):
+        self._reload = True
+
+    def spawn(self):
+        limit = 0
+        if self.max_requests:
+            limit = self.max_requests + random.randint(0, self.max_requests_jitter)
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+        # Worker process
+        status = 1
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            _reset_after_fork()
+            config = uvicorn.Config(
+                self.app,
+                loop="auto",
+                http="auto",
+                limit_max_requests=limit or None,
+                timeout_graceful_shutdown=self.graceful_timeout,
+                # Server logs go through the app's JSON pipeline, which also logs access
+                log_config=None,
+                access_log=False,
+            )
+            uvicorn.Server(config).run(sockets=[self.sock])
+            status = 0
+        except Exception:
+            logger.exception("Worker %d crashed", os.getpid())
+        finally:
+            logs.stop()
+            logging.shutdown()
+            os._exit(status)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            started = self.children.pop(pid, None)
+            self.retiring.pop(pid, None)
+            if started is not None and not self._stopping:
+                code = os.waitstatus_to_exitcode(status)
+                logger.info("Worker %d exited with %s after %.0fs", pid, code, time.monotonic() - started)
+                if code and time.monotonic() - started < 5:
+                    # Failing on startup; don't respawn in a tight loop
+                    time.sleep(1)
+
+    def recycle(self, pids, reason: str):
+        """Start a replacement for each worker before asking it to finish up and exit."""
+        for pid in pids:
+            if pid not in self.children:
+                continue
+            logger.info("Recycling worker %d: %s", pid, reason)
+            del self.children[pid]
+            self.retiring[pid] = time.monotonic()
+            self.spawn()
+            os.kill(pid, signal.SIGTERM)
+
+    def check_memory(self):
+        if self.max_rss_mb:
+            for pid in list(self.children):
+                rss = _rss_mb(pid)
+                if rss is not None and rss > self.max_rss_mb:
+                    self.recycle([pid], f"resident memory {rss:.0f} MB")
+        # Workers that ignore a graceful stop for too long are killed
+        for pid, since in list(self.retiring.items()):
+            if time.monotonic() - since > self.graceful_timeout + 5:
+                os.kill(pid, signal.SIGKILL)
+                self.retiring[pid] = float("inf")
+
+    def stop(self):
+        pids = list(self.children) + list(self.retiring)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while (self.children or self.retiring) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children) + list(self.retiring):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.sock.close()
+        logger.info("Server stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked uvicorn workers")
+    parser.add_argument("--app", default="main:app", help="ASGI app to serve, as module:attribute")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=settings.WORKERS or available_cpus())
+    parser.add_argument("--max-requests", type=int, default=settings.WORKER_MAX_REQUESTS)
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.WORKER_MAX_REQUESTS_JITTER)
+    parser.add_argument("--max-rss-mb", type=int, default=settings.WORKER_MAX_RSS_MB)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.WORKER_GRACEFUL_TIMEOUT)
+    args = parser.parse_args()
+    logs.configure(queued=False)
+
+    PreforkServer(
+        app=args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        max_rss_mb=args.max_rss_mb,
+        graceful_timeout=args.graceful_timeout,
+    ).run()
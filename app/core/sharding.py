@@ -0,0 +1,309 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import create_engine, delete, event, func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from app.core import reports
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine as default_engine
+from app.core.security import bearer_token, decode_token
+from app.models import AuditEntry, Company, Contact, ContactBlockingKey, OrganizationShard, WebhookOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD = "default"
+
+# Models whose rows belong to one organization and move with it between shards
+TENANT_MODELS = (Company, Contact, AuditEntry, WebhookOutbox)
+
+_engines: Dict[str, Engine] = {DEFAULT_SHARD: default_engine}
+_engines_lock = threading.Lock()
+
+
+def shard_urls() -> Dict[str, str]:
+    return {DEFAULT_SHARD: settings.DATABASE_URL, **settings.SHARDS}
+
+
+def engine_for(shard: str) -> Engine:
+    """Engine for a named shard, created (with its tables) on first use."""
+    engine = _engines.get(shard)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        if shard not in _engines:
+            url = shard_urls().get(shard)
+            if url is None:
+                raise KeyError(f"Unknown shard: {shard}")
+            connect_args = {}
+            if url.startswith("sqlite"):
+                connect_args = {"check_same_thread": False}
+                directory = os.path.dirname(url.split(":///", 1)[-1])
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            engine = create_engine(
+                url,
+                connect_args=connect_args,
+                pool_pre_ping=True,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+            )
+            Base.metadata.create_all(bind=engine)
+            _engines[shard] = engine
+    return _engines[shard]
+
+
+def dispose_engines():
+    """Forget pooled connections inherited from a parent process (call after fork).
+
+    ``close=False`` leaves the parent's sockets alone; the child just opens
+    its own connections from now on.
+    """
+    for engine in list(_engines.values()):
+        engine.dispose(close=False)
+
+
+class ShardMap:
+    """organization_id -> (shard, moving), read from the default database and cached with a TTL."""
+
+    def __init__(self):
+        self._entries: Dict[int, Tuple[str, bool]] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        with default_engine.connect() as connection:
+            rows = connection.execute(
+                select(OrganizationShard.organization_id, OrganizationShard.shard, OrganizationShard.moving)
+            ).all()
+        self._entries = {row.organization_id: (row.shard, bool(row.moving)) for row in rows}
+        self._loaded_at = time.monotonic()
+
+    def lookup(self, organization_id: int) -> Tuple[str, bool]:
+        if time.monotonic() - self._loaded_at > settings.SHARD_MAP_TTL_SECONDS:
+            with self._lock:
+                if time.monotonic() - self._loaded_at > settings.SHARD_MAP_TTL_SECONDS:
+                    self._refresh()
+        # Organizations without an entry live on the default shard
+        return self._entries.get(organization_id, (DEFAULT_SHARD, False))
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def set(self, organization_id: int, shard: str, moving: bool = False):
+        with Session(default_engine) as db:
+            entry = db.get(OrganizationShard, organization_id)
+            if entry is None:
+                entry = OrganizationShard(organization_id=organization_id)
+                db.add(entry)
+            entry.shard, entry.moving = shard, moving
+            db.commit()
+        self.invalidate()
+
+
+shard_map = ShardMap()
+
+
+def get_organization_id(request: Request) -> Optional[int]:
+    """The tenant of the current request, or None for unscoped access.
+
+    An authenticated request is always scoped to its token's organization;
+    the tenant header is only honoured for unauthenticated access. A token
+    without an organization is refused unless it carries the superuser
+    claim, so a user who belongs nowhere doesn't end up seeing everything.
+    """
+    token = bearer_token(request.headers.get("Authorization"))
+    if token is not None:
+        claims = decode_token(token)
+        organization_id = claims.get("org")
+        if organization_id is None and not claims.get("superuser"):
+            raise HTTPException(status_code=403, detail="Token is not scoped to an organization")
+        return organization_id
+    if settings.AUTH_REQUIRED:
+        return None
+    value = request.headers.get(settings.TENANT_HEADER)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {settings.TENANT_HEADER} header")
+
+
+def open_session(organization_id: Optional[int] = None) -> Session:
+    """A session bound to the tenant's shard and scoped to its rows."""
+    shard, moving = shard_map.lookup(organization_id) if organization_id is not None else (DEFAULT_SHARD, False)
+    db = SessionLocal(bind=engine_for(shard))
+    db.info.update(organization_id=organization_id, shard=shard, read_only=moving)
+    return db
+
+
+# Dependency to get a tenant-aware DB session
+def get_db(organization_id: Optional[int] = Depends(get_organization_id)):
+    db = open_session(organization_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _scope_to_tenant(execute_state):
+    organization_id = execute_state.session.info.get("organization_id")
+    if organization_id is None or execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if execute_state.is_select or execute_state.is_update or execute_state.is_delete:
+        execute_state.statement = execute_state.statement.options(*[
+            with_loader_criteria(model, model.organization_id == organization_id, include_aliases=True)
+            for model in TENANT_MODELS
+        ])
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _stamp_tenant(session, flush_context, instances):
+    if session.info.get("read_only") and (session.new or session.dirty or session.deleted):
+        raise HTTPException(
+            status_code=503,
+            detail="Organization is being moved to another shard; try again shortly",
+            headers={"Retry-After": str(settings.SHARD_MAP_TTL_SECONDS)},
+        )
+    organization_id = session.info.get("organization_id")
+    if organization_id is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, TENANT_MODELS) and obj.organization_id is None:
+            obj.organization_id = organization_id
+
+
+def _copy_rows(source, target, table, where, id_maps, remap, drop=(), batch_size=1000) -> int:
+    """Stream rows of ``table`` from source to target, rewriting ids through ``id_maps``."""
+    count = 0
+    result = source.execute(select(table).where(where), execution_options={"yield_per": batch_size})
+    for rows in result.mappings().partitions():
+        batch = []
+        for row in rows:
+            row = {column: value for column, value in row.items() if column not in drop}
+            for column, mapping in remap.items():
+                if mapping in id_maps and row[column] in id_maps[mapping]:
+                    row[column] = id_maps[mapping][row[column]]
+            batch.append(row)
+        target.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+
+def _copy_outbox(source, target, organization_id: int, id_maps) -> int:
+    """Copy undelivered webhook events in their original order, which is their delivery order."""
+    rows = source.execute(
+        select(WebhookOutbox.__table__).where(WebhookOutbox.organization_id == organization_id)
+        .order_by(WebhookOutbox.id)
+    ).mappings().all()
+    batch = []
+    for row in rows:
+        row = {column: value for column, value in row.items() if column != "id"}
+        row["entity_id"] = id_maps.get(row["entity"], {}).get(row["entity_id"], row["entity_id"])
+        batch.append(row)
+    if batch:
+        target.execute(insert(WebhookOutbox.__table__), batch)
+    return len(batch)
+
+
+def _id_map(source, target, model, organization_id, renumber: bool) -> Dict[int, int]:
+    ids = source.execute(select(model.id).where(model.organization_id == organization_id)).scalars().all()
+    taken = set(target.execute(select(model.id).where(model.id.in_(ids))).scalars()) if ids else set()
+    if not taken:
+        return {}
+    if not renumber:
+        raise RuntimeError(
+            f"{len(taken)} {model.__tablename__} ids already exist on the target shard; "
+            "rerun with --renumber to assign new ids"
+        )
+    next_id = (target.execute(select(func.max(model.id))).scalar() or 0) + 1
+    return {old: new for new, old in enumerate(ids, start=next_id)}
+
+
+def rebalance(organization_id: int, target_shard: str, renumber: bool = False, wait: bool = True):
+    """Move an organization's companies, contacts, their history and webhook outbox to ``target_shard``.
+
+    The organization is marked as moving first, so (once every worker's cached
+    map has expired) its writes are refused instead of being lost mid-copy.
+    Rows are copied in one transaction on the target, the map is switched,
+    and only then are the source rows deleted. The organization's report
+    summaries are recomputed on both shards.
+    """
+    shard_map.invalidate()
+    source_shard, _ = shard_map.lookup(organization_id)
+    if source_shard == target_shard:
+        logger.info("Organization %s is already on shard %s", organization_id, target_shard)
+        return
+    source_engine, target_engine = engine_for(source_shard), engine_for(target_shard)
+
+    shard_map.set(organization_id, source_shard, moving=True)
+    if wait:
+        time.sleep(settings.SHARD_MAP_TTL_SECONDS)
+
+    try:
+        with source_engine.connect() as source, target_engine.begin() as target:
+            id_maps = {
+                "company": _id_map(source, target, Company, organization_id, renumber),
+                "contact": _id_map(source, target, Contact, organization_id, renumber),
+            }
+            contact_ids = select(Contact.id).where(Contact.organization_id == organization_id)
+            copied = {
+                "companies": _copy_rows(source, target, Company.__table__, Company.organization_id == organization_id,
+                                        id_maps, {"id": "company"}),
+                "contacts": _copy_rows(source, target, Contact.__table__, Contact.organization_id == organization_id,
+                                       id_maps, {"id": "contact", "company_id": "company"}),
+                "blocking keys": _copy_rows(source, target, ContactBlockingKey.__table__,
+                                            ContactBlockingKey.contact_id.in_(contact_ids),
+                                            id_maps, {"contact_id": "contact"}, drop=("id",)),
+                "audit entries": sum(
+                    _copy_rows(source, target, AuditEntry.__table__,
+                               (AuditEntry.organization_id == organization_id) & (AuditEntry.entity == entity),
+                               id_maps, {"entity_id": entity}, drop=("id",))
+                    for entity in ("company", "contact")
+                ),
+                "undelivered webhook events": _copy_outbox(source, target, organization_id, id_maps),
+            }
+            reports.rebuild(target, organization_id)
+    except Exception:
+        shard_map.set(organization_id, source_shard, moving=False)
+        raise
+
+    shard_map.set(organization_id, target_shard, moving=False)
+    with source_engine.begin() as source:
+        contact_ids = select(Contact.id).where(Contact.organization_id == organization_id)
+        source.execute(delete(ContactBlockingKey).where(ContactBlockingKey.contact_id.in_(contact_ids)))
+        source.execute(delete(Contact).where(Contact.organization_id == organization_id))
+        source.execute(delete(Company).where(Company.organization_id == organization_id))
+        source.execute(delete(AuditEntry).where(AuditEntry.organization_id == organization_id))
+        source.execute(delete(WebhookOutbox).where(WebhookOutbox.organization_id == organization_id))
+        reports.rebuild(source, organization_id)
+    logger.info("Moved organization %s from %s to %s: %s", organization_id, source_shard, target_shard, copied)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and rebalance organization shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="print the shard map")
+    move = commands.add_parser("rebalance", help="move an organization to another shard")
+    move.add_argument("organization_id", type=int)
+    move.add_argument("shard", choices=sorted(shard_urls()))
+    move.add_argument("--renumber", action="store_true", help="assign new ids when they collide on the target")
+    move.add_argument("--no-wait", action="store_true", help="don't wait for workers' shard map caches to expire")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "show":
+        shard_map.invalidate()
+        shard_map.lookup(0)
+        for organization_id, (shard, moving) in sorted(shard_map._entries.items()):
+            print(f"{organization_id}\t{shard}{' (moving)' if moving else ''}")
+    else:
+        rebalance(args.organization_id, args.shard, renumber=args.renumber, wait=not args.no_wait)
@@ -0,0 +1,101 @@
+import asyncio
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from app.core.config import settings
+
+# Headers that change who is asking or what they may see. Requests that
+# differ in any of them are never merged.
+_BOUNDARY_HEADERS = {b"authorization", b"cookie", b"accept"}
+
+# Response headers that belong to the leader's request alone and aren't replayed
+_PER_REQUEST_HEADERS = {b"set-cookie", b"x-request-id", b"server-timing"}
+
+
+# Process-wide counters: leaders executed the route, coalesced requests
+# replayed a leader's response, fallbacks waited but had to run anyway
+stats = {"leaders": 0, "coalesced": 0, "fallbacks": 0}
+
+
+def _matches(path: str) -> bool:
+    return any(path == prefix or path.startswith(prefix.rstrip("/") + "/") for prefix in settings.COALESCE_PATHS)
+
+
+def _key(scope) -> Tuple:
+    query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+    tenant_header = settings.TENANT_HEADER.lower().encode("latin-1")
+    boundary = tuple(sorted(
+        (name, value) for name, value in scope.get("headers") or ()
+        if name in _BOUNDARY_HEADERS or name == tenant_header
+    ))
+    return scope["path"].rstrip("/"), query, boundary
+
+
+class SingleFlightMiddleware:
+    """Merge identical concurrent GETs into one execution of the route.
+
+    The first request for a key (the leader) runs normally while its
+    response is recorded. Requests arriving with the same normalized path,
+    query and auth/tenant headers before it finishes wait for that response
+    and replay its bytes instead of querying the database themselves.
+
+    Only a successful (2xx) response is shared, without the leader's
+    per-request headers; when the leader fails, is shed or times out, each
+    waiting request runs the route itself. Requests asking to be profiled
+    always run on their own.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._profile_header = settings.PROFILE_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "GET" or not settings.COALESCE_ENABLED
+                or not _matches(scope["path"])
+                or any(name == self._profile_header for name, _ in scope.get("headers") or ())):
+            await self.app(scope, receive, send)
+            return
+
+        key = _key(scope)
+        leader = self._inflight.get(key)
+        if leader is not None:
+            result = await asyncio.shield(leader)
+            if result is not None:
+                stats["coalesced"] += 1
+                status, headers, body = result
+                await send({"type": "http.response.start", "status": status,
+                            "headers": headers + [(b"x-coalesced", b"1")]})
+                await send({"type": "http.response.body", "body": body})
+                return
+            # The leader failed, was rejected or its response was too large to share
+            stats["fallbacks"] += 1
+            await self.app(scope, receive, send)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        stats["leaders"] += 1
+        start: Optional[dict] = None
+        chunks = []
+        size = 0
+
+        async def record(message):
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and size <= settings.COALESCE_MAX_BODY_BYTES:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, record)
+            if start is not None and 200 <= start["status"] < 300 and size <= settings.COALESCE_MAX_BODY_BYTES:
+                headers = [(name, value) for name, value in start.get("headers", [])
+                           if name.lower() not in _PER_REQUEST_HEADERS and name.lower() != self._profile_header]
+                future.set_result((start["status"], headers, b"".join(chunks)))
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                future.set_result(None)
@@ -0,0 +1,480 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import random
+import secrets
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, event, insert, or_, select, update
+
+from app.core import events
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.sharding import DEFAULT_SHARD, engine_for, shard_map
+from app.models import WebhookOutbox, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def shard_of(organization_id: Optional[int]) -> str:
+    return shard_map.lookup(organization_id)[0] if organization_id is not None else DEFAULT_SHARD
+
+
+class SubscriptionMap:
+    """organization_id -> [(subscription id, entity)] of active subscriptions, cached with a TTL.
+
+    Read on every flush, so it is loaded from the catalog database once per
+    WEBHOOK_SUBSCRIPTION_TTL_SECONDS rather than queried per write; changes
+    made through this worker take effect at once, other workers' within
+    the TTL.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Optional[int], List[Tuple[int, Optional[str]]]] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        with engine_for(DEFAULT_SHARD).connect() as connection:
+            rows = connection.execute(
+                select(WebhookSubscription.id, WebhookSubscription.organization_id, WebhookSubscription.entity)
+                .where(WebhookSubscription.active == True)
+            ).all()
+        entries: Dict[Optional[int], List[Tuple[int, Optional[str]]]] = {}
+        for row in rows:
+            entries.setdefault(row.organization_id, []).append((row.id, row.entity))
+        self._entries = entries
+        self._loaded_at = time.monotonic()
+
+    def _current(self) -> Dict[Optional[int], List[Tuple[int, Optional[str]]]]:
+        if time.monotonic() - self._loaded_at > settings.WEBHOOK_SUBSCRIPTION_TTL_SECONDS:
+            with self._lock:
+                if time.monotonic() - self._loaded_at > settings.WEBHOOK_SUBSCRIPTION_TTL_SECONDS:
+                    self._refresh()
+        return self._entries
+
+    def active(self) -> bool:
+        return bool(self._current())
+
+    def matching(self, organization_id: Optional[int], entity: str) -> List[int]:
+        entries = self._current()
+        # Subscriptions without an organization hear about every change; only superusers make them
+        candidates = entries.get(organization_id, []) + (entries.get(None, []) if organization_id is not None else [])
+        return [subscription_id for subscription_id, wanted in candidates if wanted in (None, entity)]
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+
+subscriptions = SubscriptionMap()
+
+
+def record(session, changes: List[Dict[str, Any]]):
+    """Write outbox rows for changes collected by app.core.events, in the session's transaction.
+
+    One row per matching subscription, so each endpoint's delivery and
+    retries are independent of the others.
+    """
+    rows = []
+    created_at = _now()
+    for change in changes:
+        subscription_ids = subscriptions.matching(change["organization_id"], change["entity"])
+        if not subscription_ids:
+            continue
+        event_id = uuid.uuid4().hex
+        for subscription_id in subscription_ids:
+            rows.append({
+                "subscription_id": subscription_id,
+                "event_id": event_id,
+                "entity": change["entity"],
+                "entity_id": change["data"]["id"],
+                "action": change["action"],
+                "data": change["data"],
+                "organization_id": change["organization_id"],
+                "created_at": created_at,
+            })
+    if rows:
+        session.connection().execute(insert(WebhookOutbox.__table__), rows)
+        session.info["webhooks_written"] = True
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _write_outbox(session, flush_context):
+    # Nothing to collect, or query, until someone subscribes
+    if subscriptions.active():
+        record(session, events.collect_changes(session))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_dispatcher(session):
+    if session.info.pop("webhooks_written", False):
+        dispatcher.wake()
+
+
+def _backoff(failures: int) -> float:
+    delay = min(settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (failures - 1), settings.WEBHOOK_RETRY_MAX_SECONDS)
+    # Jitter, so endpoints that failed together don't all retry together
+    return delay * random.uniform(0.5, 1.0)
+
+
+def blocked_reason(url: str) -> Optional[str]:
+    """Why ``url`` may not be delivered to, or None when it may.
+
+    The dispatcher POSTs from inside the network, so endpoints must resolve
+    only to public addresses: no loopback, private, link-local, multicast or
+    reserved ones. Checked when a subscription is saved and again before
+    each delivery, since DNS can change in between.
+    """
+    if settings.WEBHOOK_ALLOW_PRIVATE_URLS:
+        return None
+    host = urlsplit(url).hostname
+    if not host:
+        return f"No host in {url}"
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        return f"Cannot resolve {host}"
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if not ip.is_global or ip.is_multicast:
+            return f"{host} resolves to a non-public address ({ip})"
+    return None
+
+
+def _check_url(url: str):
+    reason = blocked_reason(url)
+    if reason is not None:
+        raise HTTPException(status_code=400, detail=f"Webhook URL not allowed: {reason}")
+
+
+def sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class WebhookDispatcher:
+    """Delivers outbox rows to subscribed endpoints from an asyncio task.
+
+    Each round claims up to WEBHOOK_MAX_CONNECTIONS subscriptions that have
+    undelivered rows and aren't backing off, by taking a lease on their row
+    in the catalog database, so workers and hosts never deliver the same
+    endpoint at once. A claimed endpoint gets its rows WEBHOOK_BATCH_SIZE at
+    a time, oldest first, as one signed POST each over a shared pool of
+    keep-alive connections; delivered rows are deleted. A failed POST
+    leaves the rows in place and backs the endpoint off exponentially; after
+    WEBHOOK_MAX_FAILURES in a row it is deactivated. A commit that wrote
+    outbox rows wakes the task at once, otherwise it looks every
+    WEBHOOK_POLL_SECONDS for rows from other workers and for retries.
+    """
+
+    def __init__(self):
+        self.delivered = 0
+        self.batches = 0
+        self.failures = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self):
+        """Start delivering on the running event loop."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._stopping = False
+            self._task = self._loop.create_task(self.run())
+
+    async def stop(self, timeout: float = 10):
+        """Finish the deliveries in flight; what is left is picked up after a restart."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook deliveries still running at shutdown were abandoned")
+        self._task = self._loop = None
+
+    def wake(self):
+        """Look at the outbox now rather than at the next poll; safe from any thread."""
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass  # The loop has been closed
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                              max_keepalive_connections=settings.WEBHOOK_MAX_CONNECTIONS)
+        async with httpx.AsyncClient(timeout=settings.WEBHOOK_TIMEOUT_SECONDS, limits=limits,
+                                     headers={"User-Agent": "PingCRM-Webhooks"}) as client:
+            while not self._stopping:
+                self._wake.clear()
+                try:
+                    claimed = await run_in_threadpool(self._claim)
+                except Exception:
+                    logger.exception("Looking for webhook deliveries failed")
+                    claimed = []
+                if claimed:
+                    await asyncio.gather(*(self._deliver(client, subscription) for subscription in claimed))
+                    continue
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.WEBHOOK_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        if not subscriptions.active():
+            return []
+        now = _now()
+        with engine_for(DEFAULT_SHARD).connect() as catalog:
+            due = catalog.execute(
+                select(WebhookSubscription).where(
+                    WebhookSubscription.active == True,
+                    or_(WebhookSubscription.next_attempt_at == None, WebhookSubscription.next_attempt_at <= now),
+                    or_(WebhookSubscription.lease_until == None, WebhookSubscription.lease_until < now),
+                )
+            ).mappings().all()
+        by_shard: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        for subscription in due:
+            by_shard.setdefault(shard_of(subscription["organization_id"]), {})[subscription["id"]] = dict(subscription)
+
+        pending = []
+        for shard, candidates in by_shard.items():
+            with engine_for(shard).connect() as connection:
+                ids = connection.execute(
+                    select(WebhookOutbox.subscription_id).distinct()
+                    .where(WebhookOutbox.subscription_id.in_(list(candidates)))
+                ).scalars().all()
+            pending.extend({**candidates[subscription_id], "shard": shard} for subscription_id in ids)
+
+        claimed = []
+        with engine_for(DEFAULT_SHARD).begin() as catalog:
+            for subscription in pending[:settings.WEBHOOK_MAX_CONNECTIONS]:
+                # Only one dispatcher, in any worker, wins the lease
+                won = catalog.execute(
+                    update(WebhookSubscription)
+                    .where(WebhookSubscription.id == subscription["id"],
+                           or_(WebhookSubscription.lease_until == None, WebhookSubscription.lease_until < now))
+                    .values(lease_until=now + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS))
+                ).rowcount
+                if won:
+                    claimed.append(subscription)
+        return claimed
+
+    @staticmethod
+    def _load(subscription: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with engine_for(subscription["shard"]).connect() as connection:
+            return connection.execute(
+                select(WebhookOutbox)
+                .where(WebhookOutbox.subscription_id == subscription["id"])
+                .order_by(WebhookOutbox.id)
+                .limit(settings.WEBHOOK_BATCH_SIZE)
+            ).mappings().all()
+
+    @staticmethod
+    def _delivered(subscription: Dict[str, Any], ids: List[int]):
+        with engine_for(subscription["shard"]).begin() as connection:
+            connection.execute(delete(WebhookOutbox).where(WebhookOutbox.id.in_(ids)))
+        with engine_for(DEFAULT_SHARD).begin() as catalog:
+            # Keep the lease while there is more to send
+            catalog.execute(
+                update(WebhookSubscription).where(WebhookSubscription.id == subscription["id"])
+                .values(lease_until=_now() + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS))
+            )
+
+    @staticmethod
+    def _release(subscription: Dict[str, Any], error: Optional[str]):
+        values: Dict[str, Any] = {"lease_until": None}
+        if error is None:
+            values.update(failures=0, next_attempt_at=None, last_error=None)
+        else:
+            failures = subscription["failures"] + 1
+            values.update(failures=failures, last_error=error[:500],
+                          next_attempt_at=_now() + timedelta(seconds=_backoff(failures)))
+            if settings.WEBHOOK_MAX_FAILURES and failures >= settings.WEBHOOK_MAX_FAILURES:
+                values["active"] = False
+                logger.warning("Deactivated webhook %s after %d failed deliveries: %s",
+                               subscription["id"], failures, error)
+        with engine_for(DEFAULT_SHARD).begin() as catalog:
+            catalog.execute(update(WebhookSubscription).where(WebhookSubscription.id == subscription["id"])
+                            .values(**values))
+        if values.get("active") is False:
+            subscriptions.invalidate()
+
+    async def _deliver(self, client: httpx.AsyncClient, subscription: Dict[str, Any]):
+        error = None
+        try:
+            reason = await run_in_threadpool(blocked_reason, subscription["url"])
+            if reason is not None:
+                raise ValueError(reason)
+            while not self._stopping:
+                rows = await run_in_threadpool(self._load, subscription)
+                if not rows:
+                    break
+                body = json.dumps({"events": [
+                    {
+                        "id": row["event_id"],
+                        "entity": row["entity"],
+                        "action": row["action"],
+                        # entity_id follows the row if its organization moves shards
+                        "data": {**row["data"], "id": row["entity_id"]},
+                        "organizationId": row["organization_id"],
+                        "occurredAt": row["created_at"].isoformat(),
+                    }
+                    for row in rows
+                ]}, separators=(",", ":")).encode()
+                response = await client.post(subscription["url"], content=body, headers={
+                    "Content-Type": "application/json",
+                    "X-Webhook-Signature": sign(subscription["secret"], body),
+                })
+                if not response.is_success:
+                    raise httpx.HTTPStatusError(f"{response.status_code} from {subscription['url']}",
+                                                request=response.request, response=response)
+                await run_in_threadpool(self._delivered, subscription, [row["id"] for row in rows])
+                self.batches += 1
+                self.delivered += len(rows)
+                if len(rows) < settings.WEBHOOK_BATCH_SIZE:
+                    break
+        except Exception as e:
+            self.failures += 1
+            error = f"{type(e).__name__}: {e}"
+            logger.info("Webhook delivery to %s failed: %s", subscription["url"], error,
+                        extra={"subscription_id": subscription["id"]})
+        try:
+            await run_in_threadpool(self._release, subscription, error)
+        except Exception:
+            # The lease runs out by itself and another round retries
+            logger.exception("Releasing webhook %s failed", subscription["id"])
+
+
+dispatcher = WebhookDispatcher()
+
+
+def list_subscriptions(organization_id: Optional[int]) -> List[WebhookSubscription]:
+    with SessionLocal() as db:
+        return db.query(WebhookSubscription).filter(WebhookSubscription.organization_id == organization_id) \
+            .order_by(WebhookSubscription.id).all()
+
+
+def create_subscription(organization_id: Optional[int], url: str, entity: Optional[str]) -> WebhookSubscription:
+    _check_url(url)
+    with SessionLocal() as db:
+        subscription = WebhookSubscription(organization_id=organization_id, url=url, entity=entity,
+                                           secret=secrets.token_hex(32), active=True, failures=0)
+        db.add(subscription)
+        db.commit()
+        db.refresh(subscription)
+    subscriptions.invalidate()
+    return subscription
+
+
+def _owned(db, organization_id: Optional[int], subscription_id: int) -> WebhookSubscription:
+    subscription = db.get(WebhookSubscription, subscription_id)
+    if subscription is None or subscription.organization_id != organization_id:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    return subscription
+
+
+def update_subscription(organization_id: Optional[int], subscription_id: int, changes: Dict[str, Any]) -> WebhookSubscription:
+    if changes.get("url") is not None:
+        _check_url(changes["url"])
+    with SessionLocal() as db:
+        subscription = _owned(db, organization_id, subscription_id)
+        for key, value in changes.items():
+            setattr(subscription, key, value)
+        if changes.get("active"):
+            # Resuming: deliver the backlog now instead of after the last backoff
+            subscription.failures, subscription.next_attempt_at = 0, None
+        db.commit()
+        db.refresh(subscription)
+    subscriptions.invalidate()
+    dispatcher.wake()
+    return subscription
+
+
+def delete_subscription(organization_id: Optional[int], subscription_id: int):
+    with SessionLocal() as db:
+        db.delete(_owned(db, organization_id, subscription_id))
+        db.commit()
+    subscriptions.invalidate()
+    with engine_for(shard_of(organization_id)).begin() as connection:
+        connection.execute(delete(WebhookOutbox).where(WebhookOutbox.subscription_id == subscription_id))
+
+
+class _StubReceiver(BaseHTTPRequestHandler):
+    """Prints the events POSTed to it; fails some deliveries on purpose to exercise retries."""
+
+    secret: Optional[str] = None
+    fail_rate = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if random.random() < self.fail_rate:
+            self.send_response(503)
+            self.end_headers()
+            print(f"-> 503 (simulated failure, {len(body)} bytes)", flush=True)
+            return
+        verified = ""
+        if self.secret is not None:
+            ok = hmac.compare_digest(sign(self.secret, body), self.headers.get("X-Webhook-Signature", ""))
+            verified = " signature ok" if ok else " BAD SIGNATURE"
+        batch = json.loads(body)
+        print(f"-> 200 {len(batch['events'])} events{verified}", flush=True)
+        for evt in batch["events"]:
+            print(json.dumps(evt), flush=True)
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deliver webhooks, or receive them locally for testing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("dispatch", help="deliver the outbox until interrupted (e.g. where the app can't)")
+    receive = commands.add_parser("receive", help="run a stub endpoint that prints what it is sent "
+                                                   "(subscribing to it needs WEBHOOK_ALLOW_PRIVATE_URLS)")
+    receive.add_argument("--port", type=int, default=9000)
+    receive.add_argument("--secret", help="verify X-Webhook-Signature with this subscription secret")
+    receive.add_argument("--fail-rate", type=float, default=0.0, help="fraction of deliveries answered with 503")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "dispatch":
+        async def dispatch_forever():
+            dispatcher.start()
+            await dispatcher._task
+
+        try:
+            asyncio.run(dispatch_forever())
+        except KeyboardInterrupt:
+            pass
+    else:
+        _StubReceiver.secret, _StubReceiver.fail_rate = args.secret, args.fail_rate
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), _StubReceiver)
+        logger.info("Receiving webhooks on http://127.0.0.1:%d/", args.port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
@@ -5,8 +5,6 @@ import os
 import logging
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -16,12 +14,12 @@ try:
     # Get database URL from environment variables
     # Default to SQLite for local development but use PostgreSQL in production
     DATABASE_URL = os.getenv("DATABASE_URL", "")
-    logger.info(f"Database URL found: {'Yes' if DATABASE_URL else 'No'}")
+    logger.info("Database URL found: %s", "Yes" if DATABASE_URL else "No")
     
     if not DATABASE_URL:
         # Fallback to SQLite for local development
         DATABASE_URL = "sqlite:///./pingcrm.db"
-        logger.info(f"Using SQLite database: {DATABASE_URL}")
+        logger.info("Using SQLite database: %s", DATABASE_URL)
         SQLALCHEMY_DATABASE_URL = DATABASE_URL
     else:
         # Handle special case for PostgreSQL URLs from Vercel/Heroku
@@ -32,7 +30,7 @@ try:
         else:
             SQLALCHEMY_DATABASE_URL = DATABASE_URL
         
-        logger.info(f"Using PostgreSQL database: {SQLALCHEMY_DATABASE_URL[:10]}...")
+        logger.info("Using PostgreSQL database: %s...", SQLALCHEMY_DATABASE_URL[:10])
 
     # Create engine with appropriate parameters
     connect_args = {}
@@ -63,7 +61,7 @@ try:
             db.close()
 
 except Exception as e:
-    logger.error(f"Database setup error: {str(e)}", exc_info=True)
+    logger.error("Database setup error: %s", e, exc_info=True)
     
     # Create dummy base and engine for error cases
     Base = declarative_base()
@@ -1,7 +1,10 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import companies, contacts
+from .routers import admin, auth, companies, contacts, events, reports, users
+from .routers import webhooks as webhook_routes
 from .create_dummy_data import create_dummy_data
+from .core import audit, batching, maintenance, prefix_index, security, webhooks
+from .core.auth import enforce_auth, require_owner, require_superuser
 
 app = FastAPI(
     title="PingCRM API",
@@ -19,8 +22,14 @@ app.add_middleware(
 )
 
 # Include routers
-app.include_router(companies.router, prefix="/companies", tags=["companies"])
-app.include_router(contacts.router, prefix="/contacts", tags=["contacts"])
+app.include_router(auth.router, prefix="/auth", tags=["auth"])
+app.include_router(companies.router, prefix="/companies", tags=["companies"], dependencies=[Depends(enforce_auth)])
+app.include_router(contacts.router, prefix="/contacts", tags=["contacts"], dependencies=[Depends(enforce_auth)])
+app.include_router(events.router, prefix="/events", tags=["events"], dependencies=[Depends(enforce_auth)])
+app.include_router(reports.router, prefix="/reports", tags=["reports"], dependencies=[Depends(enforce_auth)])
+app.include_router(users.router, prefix="/users", tags=["users"], dependencies=[Depends(enforce_auth)])
+app.include_router(webhook_routes.router, prefix="/webhooks", tags=["webhooks"], dependencies=[Depends(require_owner)])
+app.include_router(admin.router, prefix="/admin", tags=["admin"], dependencies=[Depends(require_superuser)])
 
 @app.get("/")
 async def root():
@@ -30,3 +39,17 @@ async def root():
 @app.on_event("startup")
 async def startup_event():
     create_dummy_data()
+    prefix_index.warm()
+    maintenance.scheduler.start()
+    webhooks.dispatcher.start()
+
+@app.on_event("shutdown")
+async def stop_webhooks():
+    await webhooks.dispatcher.stop()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    security.shutdown_pool()
+    batching.contact_writer.stop()
+    audit.writer.stop()
+    maintenance.scheduler.stop()
@@ -1,5 +1,10 @@
 # This file makes the models directory a Python package
-from app.models.models import User, Organization
-from app.models.crm import Company, Contact
+from app.models.models import User, Organization, OrganizationShard
+from app.models.crm import Company, Contact, ContactBlockingKey
+from app.models.reports import CompanyContactCount, LocationContactCount, DailyContactGrowth
+from app.models.audit import AuditEntry
+from app.models.webhooks import WebhookOutbox, WebhookSubscription
 
-__all__ = ["User", "Organization", "Company", "Contact"] 
\ No newline at end of file
+__all__ = ["User", "Organization", "OrganizationShard", "Company", "Contact", "ContactBlockingKey",
+           "CompanyContactCount", "LocationContactCount", "DailyContactGrowth", "AuditEntry",
+           "WebhookSubscription", "WebhookOutbox"] 
\ No newline at end of file
@@ -0,0 +1,25 @@
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String
+from app.core.database import Base
+
+# Append-only history of contact and company changes, written by
+# app/core/audit.py. Rows are never updated; they live on the same shard as
+# the entity they describe and move with its organization.
+
+class AuditEntry(Base):
+    __tablename__ = "audit_log"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)  # "contact" or "company"
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # "created", "updated", "deleted" or "restored"
+    # Field (response alias) -> [old value, new value], for the fields that changed
+    changes = Column(JSON, nullable=False)
+    user_id = Column(Integer)  # No FK: users live in the catalog database
+    request_id = Column(String)
+    organization_id = Column(Integer, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # An entity's history, newest first
+        Index("ix_audit_log_entity", "entity", "entity_id", "id"),
+    )
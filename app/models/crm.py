@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -15,11 +15,24 @@ class Company(Base):
     region = Column(String)
     country = Column(String)
     postal_code = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Exact-match lookup keys derived from phone/email on every flush (app/core/dedupe.py)
+    phone_digits = Column(String, index=True)
+    email_normalized = Column(String, index=True)
+    organization_id = Column(Integer, index=True)  # No FK: organizations live in the catalog database
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
+    # Shared by a company and the contacts trashed together with it (app/core/cascade.py)
+    deletion_batch_id = Column(String, index=True)
 
-    contacts = relationship("Contact", back_populates="company")
+    # Deleting a company deals with its contacts set-based (app/core/cascade.py),
+    # so the ORM needn't load them first
+    contacts = relationship("Contact", back_populates="company", passive_deletes=True)
+
+    __table_args__ = (
+        # List filters (app/core/filters.py): a country, optionally within a date range
+        Index("ix_companies_country_created_at", "country", "created_at"),
+    )
 
 class Contact(Base):
     __tablename__ = "contacts"
@@ -34,9 +47,30 @@ class Contact(Base):
     region = Column(String)
     country = Column(String)
     postal_code = Column(String)
-    company_id = Column(Integer, ForeignKey("companies.id"))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    company_id = Column(Integer, ForeignKey("companies.id"), index=True)
+    phone_digits = Column(String, index=True)
+    email_normalized = Column(String, index=True)
+    organization_id = Column(Integer, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
+    deletion_batch_id = Column(String, index=True)
+
+    company = relationship("Company", back_populates="contacts")
+
+    __table_args__ = (
+        # List filters (app/core/filters.py): a country, optionally within a date range
+        Index("ix_contacts_country_created_at", "country", "created_at"),
+    )
+
+class ContactBlockingKey(Base):
+    __tablename__ = "contact_blocking_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    contact_id = Column(Integer, ForeignKey("contacts.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String, nullable=False)  # "email", "phone" or "name"
+    key = Column(String, nullable=False)
 
-    company = relationship("Company", back_populates="contacts") 
\ No newline at end of file
+    __table_args__ = (
+        Index("ix_contact_blocking_keys_kind_key", "kind", "key"),
+    )
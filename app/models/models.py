@@ -12,6 +12,8 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
     owner = Column(Boolean, default=False)
+    # Sees every organization's rows; a user without an organization who isn't one sees none
+    superuser = Column(Boolean, default=False, nullable=False)
     photo_path = Column(String, nullable=True)
     organization_id = Column(Integer, ForeignKey("organizations.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -34,4 +36,12 @@ class Organization(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    users = relationship("User", back_populates="organization") 
\ No newline at end of file
+    users = relationship("User", back_populates="organization")
+
+class OrganizationShard(Base):
+    __tablename__ = "organization_shards"
+
+    organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    shard = Column(String, nullable=False, default="default")
+    moving = Column(Boolean, default=False)  # Writes are refused while a rebalance copies the data
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, Date
+from app.core.database import Base
+
+# Summary tables kept up to date by the contact write paths (see
+# app/core/reports.py). organization_id is 0 for rows without a tenant and
+# missing location parts are stored as "" so they can be part of the key.
+
+class CompanyContactCount(Base):
+    __tablename__ = "report_company_contacts"
+
+    organization_id = Column(Integer, primary_key=True, default=0)
+    company_id = Column(Integer, primary_key=True)
+    contact_count = Column(Integer, nullable=False, default=0)
+
+class LocationContactCount(Base):
+    __tablename__ = "report_contact_locations"
+
+    organization_id = Column(Integer, primary_key=True, default=0)
+    country = Column(String, primary_key=True, default="")
+    region = Column(String, primary_key=True, default="")
+    city = Column(String, primary_key=True, default="")
+    contact_count = Column(Integer, nullable=False, default=0)
+
+class DailyContactGrowth(Base):
+    __tablename__ = "report_contact_growth"
+
+    organization_id = Column(Integer, primary_key=True, default=0)
+    day = Column(Date, primary_key=True)
+    created_count = Column(Integer, nullable=False, default=0)
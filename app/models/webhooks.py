@@ -0,0 +1,43 @@
+from sqlalchemy import JSON, Boolean, Column, DateTime, Index, Integer, String
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+# Outbound webhooks, delivered by app/core/webhooks.py. Subscriptions live in
+# the catalog (default) database next to the shard map; each change is
+# written to the outbox on the changed row's shard, in the same transaction,
+# once per matching subscription, and deleted once delivered.
+
+class WebhookSubscription(Base):
+    __tablename__ = "webhook_subscriptions"
+
+    id = Column(Integer, primary_key=True)
+    organization_id = Column(Integer, index=True)  # None: every change, for unscoped deployments
+    url = Column(String, nullable=False)
+    secret = Column(String, nullable=False)  # HMAC-SHA256 key for the X-Webhook-Signature header
+    entity = Column(String)  # "contact", "company" or None for both
+    active = Column(Boolean, nullable=False, default=True)
+    # Delivery state, shared by every worker
+    failures = Column(Integer, nullable=False, default=0)  # Consecutive failed deliveries
+    next_attempt_at = Column(DateTime(timezone=True))  # Backing off until then
+    last_error = Column(String)
+    lease_until = Column(DateTime(timezone=True))  # A dispatcher is delivering until then
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class WebhookOutbox(Base):
+    __tablename__ = "webhook_outbox"
+
+    id = Column(Integer, primary_key=True)
+    subscription_id = Column(Integer, nullable=False)  # No FK: subscriptions live in the catalog database
+    event_id = Column(String, nullable=False)  # Stable across retries and shard moves, for deduplication
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    data = Column(JSON, nullable=False)
+    organization_id = Column(Integer, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # A subscription's undelivered events, oldest first
+        Index("ix_webhook_outbox_subscription", "subscription_id", "id"),
+    )
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException
+from app import schemas
+from app.core import backup
+from app.core.sharding import DEFAULT_SHARD, shard_urls
+
+router = APIRouter()
+
+@router.get("/backups", response_model=schemas.BackupStatus)
+def list_backups():
+    """Completed snapshots, newest first, and whether one is being taken"""
+    return {"running": backup.job["running"], "last_error": backup.job["last_error"], "backups": backup.list_backups()}
+
+@router.post("/backups", response_model=schemas.StatusResponse, status_code=202)
+def create_backup(shard: str = DEFAULT_SHARD, logical: bool = False):
+    """Start a snapshot of a shard in the background; poll GET /backups for the result"""
+    if shard not in shard_urls():
+        raise HTTPException(status_code=400, detail=f"Unknown shard: {shard}")
+    if not backup.start_in_background(shard, logical):
+        raise HTTPException(status_code=409, detail="A backup is already running")
+    return {"status": "started", "message": f"Backing up shard {shard}"}
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import OAuth2PasswordRequestForm
+from app import schemas
+from app.core import security
+from app.core.auth import find_user_by_email, get_current_user, user_cache
+
+router = APIRouter()
+
+async def _authenticate(email: str, password: str):
+    user, hashed = await run_in_threadpool(find_user_by_email, email)
+    # Always run bcrypt, even for unknown emails, so timing doesn't reveal accounts
+    if not await security.verify_password(password, hashed) or user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_cache.set(user.id, user)
+    return {
+        "access_token": security.create_access_token(user.id, user.organization_id, user.superuser),
+        "token_type": "bearer",
+    }
+
+@router.post("/token", response_model=schemas.Token)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+    """OAuth2 password flow (form encoded), as used by the interactive docs"""
+    return await _authenticate(form_data.username, form_data.password)
+
+@router.post("/login", response_model=schemas.Token)
+async def login(credentials: schemas.LoginRequest):
+    return await _authenticate(credentials.email, credentials.password)
+
+@router.get("/me", response_model=schemas.User)
+async def read_current_user(user: schemas.User = Depends(get_current_user)):
+    return user
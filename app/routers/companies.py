@@ -1,62 +1,98 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import or_, and_
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from app.models import Company
 from app import schemas
-from app.core.database import get_db
+from app.core.sharding import get_db, get_organization_id
+from app.core.facets import parse_facets
+from app.core.filters import FILTER_HELP, parse_filters
+from app.core import audit, dedupe, fieldsets, prefix_index, reads
+from app.core import cascade as cascade_ops
 
 router = APIRouter()
 
+# Hot reads go through Core statements cached per filter shape; see app/core/reads.py
+company_reads = reads.ReadPath(
+    Company, schemas.Company,
+    search_columns=[Company.name, Company.email, Company.city, Company.phone],
+)
+
 @router.get("/", response_model=schemas.PaginatedResponse[schemas.Company])
 def get_companies(
     skip: int = 0, 
     limit: int = 10, 
     search: Optional[str] = None,
     status: str = "active",
+    fields: Optional[str] = None,
+    facets: Optional[str] = None,
+    filters: Optional[List[str]] = Query(None, alias="filter", description=FILTER_HELP),
+    db: Session = Depends(get_db)
+):
+    selected = fieldsets.parse_fields(fields, schemas.Company)
+    requested_facets = parse_facets(facets, schemas.Company)
+    requested_filters = parse_filters(filters, Company, schemas.Company)
+    page = company_reads.page(
+        db, skip, limit, status=status, search=search, filters=requested_filters,
+        selected=selected, facets=requested_facets,
+    )
+    return JSONResponse(page)
+
+@router.get("/autocomplete", response_model=List[schemas.AutocompleteItem])
+async def autocomplete_companies(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    organization_id: Optional[int] = Depends(get_organization_id)
+):
+    # Served from memory without a thread hop once the prefix index is warm
+    index = prefix_index.get_index("company", organization_id)
+    if index.ready:
+        return index.search(q, limit)
+    return await run_in_threadpool(prefix_index.search, "company", organization_id, q, limit)
+
+@router.get("/lookup", response_model=List[schemas.Company])
+def lookup_companies(
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    status: str = "active",
     db: Session = Depends(get_db)
 ):
-    # Base query
+    """Exact match on a normalized phone number (any formatting, e.g. E.164) or email"""
+    if (phone is None) == (email is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of phone or email")
     query = db.query(Company)
-    
-    # Apply status filter
+    if phone is not None:
+        digits = dedupe.phone_digits(phone)
+        if digits is None:
+            raise HTTPException(status_code=400, detail="Phone number is too short")
+        query = query.filter(Company.phone_digits == digits)
+    else:
+        query = query.filter(Company.email_normalized == dedupe.lookup_email(email))
     if status == "active":
         query = query.filter(Company.deleted_at == None)
     elif status == "trashed":
         query = query.filter(Company.deleted_at != None)
-    # "all" status doesn't need filtering
-    
-    # Apply search filter if provided
-    if search:
-        query = query.filter(
-            or_(
-                Company.name.ilike(f"%{search}%"),
-                Company.email.ilike(f"%{search}%"),
-                Company.city.ilike(f"%{search}%"),
-                Company.phone.ilike(f"%{search}%")
-            )
-        )
-    
-    # Get total count for pagination
-    total = query.count()
-    
-    # Apply pagination
-    companies = query.offset(skip).limit(limit).all()
-    
-    return {
-        "items": companies,
-        "total": total,
-        "page": skip // limit + 1,
-        "pages": (total + limit - 1) // limit if total > 0 else 1
-    }
+    return query.order_by(Company.id).limit(50).all()
 
 @router.get("/{company_id}", response_model=schemas.Company)
-def get_company(company_id: int, db: Session = Depends(get_db)):
-    company = db.query(Company).filter(Company.id == company_id).first()
+def get_company(company_id: int, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    selected = fieldsets.parse_fields(fields, schemas.Company)
+    company = company_reads.get(db, company_id, selected)
     if company is None:
         raise HTTPException(status_code=404, detail="Company not found")
-    return company
+    return JSONResponse(company)
+
+@router.get("/{company_id}/history", response_model=List[schemas.AuditEntry])
+def get_company_history(
+    company_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Changes to the company, newest first; pass the last entry's id as ``before`` for the next page"""
+    return audit.history(db, "company", company_id, limit, before)
 
 @router.post("/", response_model=schemas.Company)
 def create_company(company: schemas.CompanyCreate, db: Session = Depends(get_db)):
@@ -88,7 +124,7 @@ def update_company(
     return db_company
 
 @router.patch("/{company_id}/soft-delete", response_model=schemas.StatusResponse)
-def soft_delete_company(company_id: int, db: Session = Depends(get_db)):
+def soft_delete_company(company_id: int, cascade: bool = False, db: Session = Depends(get_db)):
     company = db.query(Company).filter(Company.id == company_id).first()
     if company is None:
         raise HTTPException(status_code=404, detail="Company not found")
@@ -99,9 +135,16 @@ def soft_delete_company(company_id: int, db: Session = Depends(get_db)):
     
     # Perform soft delete
     company.deleted_at = datetime.now()
+    message = "Company has been moved to trash"
+
+    # Trash its active contacts too, in one UPDATE, tagged so restore brings back just these
+    if cascade:
+        company.deletion_batch_id = cascade_ops.new_batch_id()
+        count = cascade_ops.soft_delete_company_contacts(db, company.id, company.deletion_batch_id, company.deleted_at)
+        message += f" with {count} contact(s)"
     db.commit()
     
-    return {"status": "success", "message": "Company has been moved to trash"}
+    return {"status": "success", "message": message}
 
 @router.patch("/{company_id}/restore", response_model=schemas.Company)
 def restore_company(company_id: int, db: Session = Depends(get_db)):
@@ -113,7 +156,10 @@ def restore_company(company_id: int, db: Session = Depends(get_db)):
     if company.deleted_at is None:
         raise HTTPException(status_code=400, detail="Company is not in trash")
     
-    # Restore company
+    # Restore company, and the contacts a cascading soft delete took with it
+    if company.deletion_batch_id is not None:
+        cascade_ops.restore_batch(db, company.id, company.deletion_batch_id)
+        company.deletion_batch_id = None
     company.deleted_at = None
     db.commit()
     db.refresh(company)
@@ -121,11 +167,16 @@ def restore_company(company_id: int, db: Session = Depends(get_db)):
     return company
 
 @router.delete("/{company_id}", response_model=schemas.StatusResponse)
-def delete_company(company_id: int, db: Session = Depends(get_db)):
+def delete_company(company_id: int, cascade: bool = False, db: Session = Depends(get_db)):
     company = db.query(Company).filter(Company.id == company_id).first()
     if company is None:
         raise HTTPException(status_code=404, detail="Company not found")
     
+    # Contacts are either deleted with the company or kept without one
+    if cascade:
+        cascade_ops.delete_company_contacts(db, company.id)
+    else:
+        cascade_ops.detach_company_contacts(db, company.id)
     db.delete(company)
     db.commit()
-    return {"status": "success", "message": "Company permanently deleted"} 
\ No newline at end of file
+    return {"status": "success", "message": "Company permanently deleted"}
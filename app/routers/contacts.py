@@ -1,14 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import or_
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from app.models import Contact
 from app import schemas
-from app.core.database import get_db
+from app.core.sharding import get_db, get_organization_id, open_session
+from app.core.facets import parse_facets
+from app.core.filters import FILTER_HELP, parse_filters
+from app.core import audit, batching, dedupe, fieldsets, prefix_index, reads
+from app.core.config import settings
 from datetime import datetime
 
 router = APIRouter()
 
+# Hot reads go through Core statements cached per filter shape; see app/core/reads.py
+contact_reads = reads.ReadPath(
+    Contact, schemas.Contact,
+    search_columns=[Contact.first_name, Contact.last_name, Contact.email, Contact.phone, Contact.city],
+)
+
 @router.get("/", response_model=schemas.PaginatedResponse[schemas.Contact])
 def get_contacts(
     skip: int = 0, 
@@ -16,64 +28,140 @@ def get_contacts(
     search: Optional[str] = None,
     company_id: Optional[int] = None,
     status: str = "active",
+    fields: Optional[str] = None,
+    facets: Optional[str] = None,
+    filters: Optional[List[str]] = Query(None, alias="filter", description=FILTER_HELP),
+    db: Session = Depends(get_db)
+):
+    selected = fieldsets.parse_fields(fields, schemas.Contact)
+    requested_facets = parse_facets(facets, schemas.Contact)
+    requested_filters = parse_filters(filters, Contact, schemas.Contact, company_id=company_id)
+    page = contact_reads.page(
+        db, skip, limit, status=status, search=search, filters=requested_filters,
+        selected=selected, facets=requested_facets,
+    )
+    return JSONResponse(page)
+
+@router.get("/autocomplete", response_model=List[schemas.AutocompleteItem])
+async def autocomplete_contacts(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    organization_id: Optional[int] = Depends(get_organization_id)
+):
+    # Served from memory without a thread hop once the prefix index is warm
+    index = prefix_index.get_index("contact", organization_id)
+    if index.ready:
+        return index.search(q, limit)
+    return await run_in_threadpool(prefix_index.search, "contact", organization_id, q, limit)
+
+@router.get("/lookup", response_model=List[schemas.Contact])
+def lookup_contacts(
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    status: str = "active",
     db: Session = Depends(get_db)
 ):
-    # Base query
+    """Exact match on a normalized phone number (any formatting, e.g. E.164) or email"""
+    if (phone is None) == (email is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of phone or email")
     query = db.query(Contact)
-    
-    # Apply status filter
+    if phone is not None:
+        digits = dedupe.phone_digits(phone)
+        if digits is None:
+            raise HTTPException(status_code=400, detail="Phone number is too short")
+        query = query.filter(Contact.phone_digits == digits)
+    else:
+        query = query.filter(Contact.email_normalized == dedupe.lookup_email(email))
     if status == "active":
         query = query.filter(Contact.deleted_at == None)
     elif status == "trashed":
         query = query.filter(Contact.deleted_at != None)
-    # "all" status doesn't need filtering
-    
-    # Apply search filter if provided
-    if search:
-        query = query.filter(
-            or_(
-                Contact.first_name.ilike(f"%{search}%"),
-                Contact.last_name.ilike(f"%{search}%"),
-                Contact.email.ilike(f"%{search}%"),
-                Contact.phone.ilike(f"%{search}%"),
-                Contact.city.ilike(f"%{search}%")
-            )
-        )
-    
-    # Filter by company if provided
-    if company_id:
-        query = query.filter(Contact.company_id == company_id)
-    
-    # Get total count for pagination
-    total = query.count()
-    
-    # Apply pagination
-    contacts = query.offset(skip).limit(limit).all()
-    
-    return {
-        "items": contacts,
-        "total": total,
-        "page": skip // limit + 1,
-        "pages": (total + limit - 1) // limit if total > 0 else 1
-    }
+    return query.order_by(Contact.id).limit(50).all()
 
 @router.get("/{contact_id}", response_model=schemas.Contact)
 def get_contact(
     contact_id: int, 
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
+    selected = fieldsets.parse_fields(fields, schemas.Contact)
+    contact = contact_reads.get(db, contact_id, selected)
+    if contact is None:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    return JSONResponse(contact)
+
+@router.get("/{contact_id}/duplicates", response_model=List[schemas.DuplicateCandidate])
+def get_contact_duplicates(contact_id: int, db: Session = Depends(get_db)):
     contact = db.query(Contact).filter(Contact.id == contact_id).first()
     if contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
-    return contact
+    return dedupe.find_candidates(db, contact, exclude_id=contact.id)
+
+@router.get("/{contact_id}/history", response_model=List[schemas.AuditEntry])
+def get_contact_history(
+    contact_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Changes to the contact, newest first; pass the last entry's id as ``before`` for the next page"""
+    return audit.history(db, "contact", contact_id, limit, before)
+
+def _check_duplicates(db: Session, contact: schemas.ContactCreate, response: Response):
+    # Optional duplicate check: one indexed probe of the blocking keys
+    candidates = dedupe.find_candidates(db, contact, limit=5)
+    if candidates and settings.DEDUPE_ON_CREATE == "reject":
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "Contact looks like a duplicate",
+                "duplicates": [
+                    {"id": c["contact"].id, "score": c["score"], "matchedOn": c["matched_on"]}
+                    for c in candidates
+                ],
+            },
+        )
+    if candidates:
+        response.headers["X-Possible-Duplicates"] = ",".join(str(c["contact"].id) for c in candidates)
+
+def _screen_contact(contact: schemas.ContactCreate, response: Response, organization_id: Optional[int]):
+    with open_session(organization_id) as db:
+        _check_duplicates(db, contact, response)
+
+def _create_contact(contact: schemas.ContactCreate, response: Response, organization_id: Optional[int]):
+    with open_session(organization_id) as db:
+        if settings.DEDUPE_ON_CREATE in ("warn", "reject"):
+            _check_duplicates(db, contact, response)
+        db_contact = Contact(**contact.model_dump())
+        db.add(db_contact)
+        db.commit()
+        db.refresh(db_contact)
+        return schemas.Contact.model_validate(db_contact)
 
 @router.post("/", response_model=schemas.Contact)
-def create_contact(contact: schemas.ContactCreate, db: Session = Depends(get_db)):
-    db_contact = Contact(**contact.model_dump())
-    db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
-    return db_contact
+async def create_contact(
+    contact: schemas.ContactCreate,
+    response: Response,
+    organization_id: Optional[int] = Depends(get_organization_id)
+):
+    if not settings.CONTACT_BATCHING:
+        return await run_in_threadpool(_create_contact, contact, response, organization_id)
+    if settings.DEDUPE_ON_CREATE in ("warn", "reject"):
+        await run_in_threadpool(_screen_contact, contact, response, organization_id)
+
+    # Group commit: wait on the event loop, not a worker thread, while the
+    # row is written together with other concurrent creates
+    future = batching.contact_writer.submit(organization_id, contact.model_dump())
+    waiter = asyncio.wrap_future(future)
+    done, _ = await asyncio.wait({waiter}, timeout=settings.CONTACT_BATCH_TIMEOUT_SECONDS)
+    if not done and future.cancel():
+        raise HTTPException(
+            status_code=503,
+            detail="Contact writes are backed up; try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    # Already being written: its outcome is on the way
+    return await waiter
 
 @router.put("/{contact_id}", response_model=schemas.Contact)
 def update_contact(
@@ -98,8 +186,9 @@ def delete_contact(contact_id: int, db: Session = Depends(get_db)):
     if contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
     
-    # Soft delete by setting deleted_at timestamp
+    # Soft delete by setting deleted_at timestamp; a company restore won't bring it back
     contact.deleted_at = datetime.utcnow()
+    contact.deletion_batch_id = None
     db.commit()
     return {"status": "success", "message": "Contact deleted successfully"}
 
@@ -114,5 +203,6 @@ def restore_contact(contact_id: int, db: Session = Depends(get_db)):
     
     # Restore by clearing deleted_at timestamp
     contact.deleted_at = None
+    contact.deletion_batch_id = None
     db.commit()
     return {"status": "success", "message": "Contact restored successfully"} 
\ No newline at end of file
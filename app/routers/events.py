@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.core.config import settings
+from app.core.events import broadcaster
+from app.core.sharding import get_organization_id
+
+router = APIRouter()
+
+@router.get("/")
+async def stream_events(
+    entity: Optional[str] = None,
+    company_id: Optional[int] = None,
+    organization_id: Optional[int] = Depends(get_organization_id)
+):
+    """Server-Sent Events stream of created/updated/deleted/restored contacts and companies"""
+    if entity not in (None, "contact", "company"):
+        raise HTTPException(status_code=400, detail="entity must be 'contact' or 'company'")
+
+    if broadcaster.subscriber_count >= settings.EVENTS_MAX_SUBSCRIBERS:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many live update subscribers",
+            headers={"Retry-After": "30"},
+        )
+
+    return StreamingResponse(
+        broadcaster.stream(entity=entity, company_id=company_id, organization_id=organization_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
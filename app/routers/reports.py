@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.models import Company, CompanyContactCount, LocationContactCount, DailyContactGrowth
+from app import schemas
+from app.core.sharding import get_db
+from datetime import date, datetime, timedelta, timezone
+
+router = APIRouter()
+
+# Reports read the summary tables only; see app/core/reports.py for how they're maintained
+
+LOCATION_LEVELS = ("country", "region", "city")
+
+def _scoped(stmt, model, db: Session):
+    organization_id = db.info.get("organization_id")
+    if organization_id is not None:
+        stmt = stmt.where(model.organization_id == organization_id)
+    return stmt
+
+@router.get("/contacts-by-company", response_model=List[schemas.CompanyContactReport])
+def contacts_by_company(limit: int = Query(20, ge=1, le=500), db: Session = Depends(get_db)):
+    """Active contacts per company, largest first"""
+    total = func.sum(CompanyContactCount.contact_count).label("contact_count")
+    stmt = _scoped(
+        select(CompanyContactCount.company_id, total).group_by(CompanyContactCount.company_id),
+        CompanyContactCount, db
+    ).having(total > 0).subquery()
+    rows = db.execute(
+        select(Company.id, Company.name, stmt.c.contact_count)
+        .join(stmt, stmt.c.company_id == Company.id)
+        .where(Company.deleted_at == None)
+        .order_by(stmt.c.contact_count.desc(), Company.id)
+        .limit(limit)
+    ).all()
+    return [{"company_id": id, "company_name": name, "contact_count": count} for id, name, count in rows]
+
+@router.get("/contacts-by-location", response_model=List[schemas.LocationContactReport])
+def contacts_by_location(
+    level: str = "country",
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Active contacts per country, region or city, largest first"""
+    if level not in LOCATION_LEVELS:
+        raise HTTPException(status_code=400, detail=f"level must be one of {', '.join(LOCATION_LEVELS)}")
+    columns = [getattr(LocationContactCount, name) for name in LOCATION_LEVELS[:LOCATION_LEVELS.index(level) + 1]]
+    total = func.sum(LocationContactCount.contact_count)
+    rows = db.execute(
+        _scoped(select(*columns, total.label("contact_count")), LocationContactCount, db)
+        .group_by(*columns)
+        .having(total > 0)
+        .order_by(total.desc(), *columns)
+        .limit(limit)
+    ).all()
+    return [
+        {**{column.key: row[i] or None for i, column in enumerate(columns)}, "contact_count": row[-1]}
+        for row in rows
+    ]
+
+@router.get("/contact-growth", response_model=List[schemas.ContactGrowthReport])
+def contact_growth(start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_db)):
+    """Contacts created per day (UTC), one entry per day in the range including empty days"""
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=29)
+    if start > end or (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="start must be before end and the range at most 366 days")
+    rows = db.execute(
+        _scoped(
+            select(DailyContactGrowth.day, func.sum(DailyContactGrowth.created_count)),
+            DailyContactGrowth, db
+        )
+        .where(DailyContactGrowth.day >= start, DailyContactGrowth.day <= end)
+        .group_by(DailyContactGrowth.day)
+    ).all()
+    counts = dict(rows)
+    return [
+        {"day": day, "created_count": counts.get(day, 0)}
+        for day in (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+    ]
@@ -0,0 +1,66 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from app import schemas
+from app.core import deadlines, photos
+from app.core.admission import controller
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.core.sharding import get_organization_id
+
+router = APIRouter()
+
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+@router.put("/me/photo", response_model=schemas.StatusResponse, openapi_extra=_UPLOAD_BODY)
+async def upload_photo(request: Request, user: schemas.User = Depends(get_current_user)):
+    """Replace your photo with the multipart "file" field (JPEG, PNG, GIF or WebP), streamed to disk"""
+    filename = await photos.receive(request, user.id)
+    try:
+        # The upload took what it took; the database write gets its own slot and budget
+        async with controller.slot():
+            with deadlines.fresh(deadlines.route_budget(request.url.path)):
+                await run_in_threadpool(photos.set_photo, user.id, filename)
+    except BaseException:
+        await run_in_threadpool(photos.remove, filename)
+        raise
+    return {"status": "success", "message": "Photo updated"}
+
+@router.delete("/me/photo", response_model=schemas.StatusResponse)
+async def delete_photo(user: schemas.User = Depends(get_current_user)):
+    async with controller.slot():
+        await run_in_threadpool(photos.set_photo, user.id, None)
+    return {"status": "success", "message": "Photo removed"}
+
+@router.get("/{user_id}/photo", responses={200: {"content": {media: {} for media in photos.MEDIA_TYPES.values()}}})
+async def download_photo(
+    user_id: int,
+    request: Request,
+    size: Optional[int] = None,
+    organization_id: Optional[int] = Depends(get_organization_id)
+):
+    """A user's photo, or a cached thumbnail with `size`; supports ETag revalidation and byte ranges"""
+    if size is not None and size not in settings.PHOTO_THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {settings.PHOTO_THUMBNAIL_SIZES}")
+    filename, user_organization_id = await run_in_threadpool(photos.photo_of, user_id)
+    # Other organizations' users don't exist as far as a tenant can tell
+    if organization_id is not None and user_organization_id != organization_id:
+        raise HTTPException(status_code=404, detail="User not found")
+    if filename is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    if size is None:
+        path = os.path.join(settings.PHOTO_DIR, filename)
+    else:
+        path = await run_in_threadpool(photos.thumbnails.get, filename, size)
+    return await photos.file_response(request, path)
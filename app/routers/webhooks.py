@@ -0,0 +1,50 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from app import schemas
+from app.core import webhooks
+from app.core.auth import get_current_user
+from app.core.sharding import get_organization_id
+
+router = APIRouter()
+
+def subscription_scope(
+    organization_id: Optional[int] = Depends(get_organization_id),
+    user: schemas.User = Depends(get_current_user)
+) -> Optional[int]:
+    """The organization whose subscriptions are managed; only a superuser may manage global ones"""
+    if organization_id is None and not user.superuser:
+        raise HTTPException(status_code=403, detail="Webhooks belong to an organization")
+    return organization_id
+
+@router.get("/", response_model=List[schemas.WebhookSubscription])
+def list_webhooks(organization_id: Optional[int] = Depends(subscription_scope)):
+    """Your organization's subscriptions and how their deliveries are going"""
+    return webhooks.list_subscriptions(organization_id)
+
+@router.post("/", response_model=schemas.WebhookSubscriptionCreated, status_code=201)
+def create_webhook(body: schemas.WebhookSubscriptionCreate, organization_id: Optional[int] = Depends(subscription_scope)):
+    """Subscribe a URL to contact and/or company changes; the secret in the response signs each delivery"""
+    return webhooks.create_subscription(organization_id, str(body.url), body.entity)
+
+@router.put("/{webhook_id}", response_model=schemas.WebhookSubscription)
+def update_webhook(
+    webhook_id: int,
+    body: schemas.WebhookSubscriptionUpdate,
+    organization_id: Optional[int] = Depends(subscription_scope)
+):
+    """Change a subscription; setting active resumes one deactivated after repeated failures"""
+    changes = body.model_dump(exclude_unset=True)
+    # A null entity means both; url and active have no such meaning
+    nulls = [name for name in ("url", "active") if name in changes and changes[name] is None]
+    if nulls:
+        raise HTTPException(status_code=422, detail=f"{' and '.join(nulls)} cannot be null")
+    if changes.get("url") is not None:
+        changes["url"] = str(changes["url"])
+    return webhooks.update_subscription(organization_id, webhook_id, changes)
+
+@router.delete("/{webhook_id}", response_model=schemas.StatusResponse)
+def delete_webhook(webhook_id: int, organization_id: Optional[int] = Depends(subscription_scope)):
+    """Unsubscribe, dropping any events not yet delivered"""
+    webhooks.delete_subscription(organization_id, webhook_id)
+    return {"status": "success", "message": "Webhook deleted"}
@@ -1,16 +1,16 @@
-from typing import Optional, List, Generic, TypeVar, Dict, Any
-from datetime import datetime
+from typing import Optional, List, Generic, TypeVar, Dict, Any, Literal
+from datetime import date, datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Try to import EmailStr from pydantic, fallback to str if email-validator not installed
 try:
-    from pydantic import BaseModel, EmailStr, Field
-    logger.info("Successfully imported EmailStr from pydantic")
+    from pydantic import BaseModel, EmailStr, Field, HttpUrl
+    logger.debug("Imported EmailStr from pydantic")
 except ImportError:
     logger.warning("email-validator not installed. Using str instead of EmailStr")
-    from pydantic import BaseModel, Field
+    from pydantic import BaseModel, Field, HttpUrl
     # Create a type alias so the rest of the code can still use EmailStr
     EmailStr = str
 
@@ -66,14 +66,141 @@ class Contact(ContactBase):
         populate_by_name = True
         alias_generator = lambda field_name: ''.join(word.capitalize() if i else word for i, word in enumerate(field_name.split('_')))
 
+class DuplicateCandidate(BaseModel):
+    contact: Contact
+    score: float
+    matched_on: List[str] = Field(alias="matchedOn")
+
+    class Config:
+        populate_by_name = True
+
+# Autocomplete schemas
+class AutocompleteItem(BaseModel):
+    id: int
+    label: str
+    email: Optional[str] = None
+
+# Report schemas
+class CompanyContactReport(BaseModel):
+    company_id: int = Field(alias="companyId")
+    company_name: str = Field(alias="companyName")
+    contact_count: int = Field(alias="contactCount")
+
+    class Config:
+        populate_by_name = True
+
+class LocationContactReport(BaseModel):
+    country: Optional[str] = None
+    region: Optional[str] = None
+    city: Optional[str] = None
+    contact_count: int = Field(alias="contactCount")
+
+    class Config:
+        populate_by_name = True
+
+class ContactGrowthReport(BaseModel):
+    day: date
+    created_count: int = Field(alias="createdCount")
+
+    class Config:
+        populate_by_name = True
+
+# Audit schemas
+class AuditEntry(BaseModel):
+    id: int
+    action: str
+    changes: Dict[str, List[Any]]
+    user_id: Optional[int] = Field(None, alias="userId")
+    request_id: Optional[str] = Field(None, alias="requestId")
+    created_at: datetime = Field(alias="createdAt")
+
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
+# Webhook schemas
+class WebhookSubscriptionCreate(BaseModel):
+    url: HttpUrl
+    entity: Optional[Literal["contact", "company"]] = None  # Both when omitted
+
+class WebhookSubscriptionUpdate(BaseModel):
+    url: Optional[HttpUrl] = None
+    entity: Optional[Literal["contact", "company"]] = None
+    active: Optional[bool] = None
+
+class WebhookSubscription(BaseModel):
+    id: int
+    url: str
+    entity: Optional[str] = None
+    active: bool
+    failures: int
+    last_error: Optional[str] = Field(None, alias="lastError")
+    next_attempt_at: Optional[datetime] = Field(None, alias="nextAttemptAt")
+    created_at: Optional[datetime] = Field(None, alias="createdAt")
+
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
+class WebhookSubscriptionCreated(WebhookSubscription):
+    secret: str  # Only ever returned here; signs every delivery
+
+# Backup schemas
+class Backup(BaseModel):
+    file: str
+    shard: str
+    format: str
+    created_at: datetime = Field(alias="createdAt")
+    size_bytes: int = Field(alias="sizeBytes")
+    sha256: str
+
+    class Config:
+        populate_by_name = True
+
+class BackupStatus(BaseModel):
+    running: bool
+    last_error: Optional[str] = Field(None, alias="lastError")
+    backups: List[Backup]
+
+    class Config:
+        populate_by_name = True
+
+# Auth schemas
+class User(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    email: EmailStr
+    owner: Optional[bool] = False
+    superuser: Optional[bool] = False
+    organization_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+        alias_generator = lambda field_name: ''.join(word.capitalize() if i else word for i, word in enumerate(field_name.split('_')))
+
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+
 # Pagination schemas
 T = TypeVar('T')
 
+class FacetBucket(BaseModel):
+    value: Any = None
+    count: int
+
 class PaginatedResponse(BaseModel, Generic[T]):
     items: List[T]
     total: int
     page: int
     pages: int
+    facets: Optional[Dict[str, List[FacetBucket]]] = None
 
 # Status response schema for operations like soft delete, restore, etc.
 class StatusResponse(BaseModel):
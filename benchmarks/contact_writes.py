@@ -0,0 +1,104 @@
+"""Contact creation throughput and latency with and without group commit.
+
+    python benchmarks/contact_writes.py [--waits 1,5,20] [--duration 10] [--duplicates 0.01]
+
+Seeds a throwaway SQLite database and runs ``python -m app.core.server`` on
+it once with CONTACT_BATCHING off and then once per batching wait, driving
+POST /api/contacts/ from concurrent clients. Each line shows creates per
+second against p50/p99 latency, so the cost of waiting for a batch to fill
+can be weighed against the commits it saves. A fraction of the requests
+reuse an existing email; those are expected to fail one by one without
+failing the rest of their batch, and are counted separately.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from throughput import ROOT, _wait_until_up, seed
+
+
+async def _drive(url: str, concurrency: int, duration: float, duplicates: float):
+    latencies, rejected, errors = [], 0, Counter()
+    deadline = time.monotonic() + duration
+
+    async def user(client):
+        nonlocal rejected
+        while time.monotonic() < deadline:
+            duplicate = random.random() < duplicates
+            email = "contact0@example.com" if duplicate else f"{uuid.uuid4().hex}@example.com"
+            body = {"firstName": "Load", "lastName": "Test", "email": email, "country": "USA", "city": "NYC"}
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=body)
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+                continue
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            elif duplicate:
+                rejected += 1
+            else:
+                errors[response.status_code] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*[user(client) for _ in range(concurrency)])
+    return latencies, rejected, errors
+
+
+def run(label: str, port: int, env: dict, workers: int, concurrency: int, duration: float, duplicates: float):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.core.server", "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--max-requests", "0"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        _wait_until_up(base + "/")
+        url = base + "/api/contacts/"
+        asyncio.run(_drive(url, concurrency, 1, 0))  # warm up connections
+        latencies, rejected, errors = asyncio.run(_drive(url, concurrency, duration, duplicates))
+    finally:
+        server.terminate()
+        server.wait(60)
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+    print(f"{label:>16}: {len(latencies) / duration:>7.0f} creates/s  "
+          f"p50 {percentile(0.5):6.1f} ms  p99 {percentile(0.99):6.1f} ms  "
+          f"duplicates rejected {rejected}  errors {dict(errors) or 0}")
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{directory}/bench.db"
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--waits", default="1,5,20", help="CONTACT_BATCH_MAX_WAIT_MS values to try")
+    parser.add_argument("--max-size", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--duplicates", type=float, default=0.01, help="fraction of creates reusing an email")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    seed(100)
+    env = {**os.environ, "RATE_LIMIT_PER_SECOND": "0", "PYTHONPATH": ROOT}
+
+    run("unbatched", args.port, {**env, "CONTACT_BATCHING": "false"},
+        args.workers, args.concurrency, args.duration, args.duplicates)
+    for wait in args.waits.split(","):
+        batched = {**env, "CONTACT_BATCHING": "true", "CONTACT_BATCH_MAX_WAIT_MS": wait,
+                   "CONTACT_BATCH_MAX_SIZE": str(args.max_size)}
+        run(f"batched {wait} ms", args.port, batched, args.workers, args.concurrency, args.duration,
+            args.duplicates)
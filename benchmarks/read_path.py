@@ -0,0 +1,72 @@
+"""Rows per second serialized by the ORM list path and the Core read path.
+
+    python benchmarks/read_path.py [--contacts 5000] [--limits 10,100,1000] [--duration 3]
+
+Seeds a throwaway SQLite database and, in process (no HTTP), repeatedly
+builds the GET /api/contacts/ response body both ways: the ORM query with
+validation through the response model that the route used to do, and the
+cached Core statements of ``app.core.reads`` rendered straight to JSON.
+Sparse fieldsets are timed too. Each line shows rows per second for one
+page size.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from throughput import seed
+
+
+def orm_page(db, Contact, schemas, limit: int):
+    query = db.query(Contact).filter(Contact.deleted_at == None)
+    total = query.count()
+    page = {"items": query.offset(0).limit(limit).all(), "total": total, "page": 1,
+            "pages": (total + limit - 1) // limit, "facets": None}
+    # What FastAPI does with a response_model: validate, dump by alias, encode
+    model = schemas.PaginatedResponse[schemas.Contact].model_validate(page)
+    return json.dumps(model.model_dump(mode="json", by_alias=True)).encode()
+
+
+def core_page(db, JSONResponse, contact_reads, limit: int, selected=None):
+    return JSONResponse(contact_reads.page(db, 0, limit, selected=selected)).body
+
+
+def measure(build, limit: int, duration: float) -> float:
+    build()  # warm the statement caches
+    rows, deadline = 0, time.perf_counter() + duration
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        build()
+        rows += limit
+    return rows / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{directory}/bench.db"
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contacts", type=int, default=5000)
+    parser.add_argument("--limits", default="10,100,1000", help="page sizes to try")
+    parser.add_argument("--duration", type=float, default=3, help="seconds per measurement")
+    args = parser.parse_args()
+
+    seed(args.contacts)
+    from fastapi.responses import JSONResponse
+
+    from app import schemas
+    from app.core import fieldsets
+    from app.core.database import SessionLocal
+    from app.models import Contact
+    from app.routers.contacts import contact_reads
+
+    selected = fieldsets.parse_fields("firstName,lastName,email", schemas.Contact)
+    with SessionLocal() as db:
+        for limit in map(int, args.limits.split(",")):
+            orm = measure(lambda: orm_page(db, Contact, schemas, limit), limit, args.duration)
+            core = measure(lambda: core_page(db, JSONResponse, contact_reads, limit), limit, args.duration)
+            sparse = measure(lambda: core_page(db, JSONResponse, contact_reads, limit, selected), limit,
+                             args.duration)
+            print(f"limit {limit:>5}: ORM {orm:>9.0f} rows/s  Core {core:>9.0f} rows/s ({core / orm:.1f}x)  "
+                  f"Core, 4 fields {sparse:>9.0f} rows/s")
@@ -0,0 +1,138 @@
+"""Compare request throughput of one worker against the pre-fork server.
+
+    python benchmarks/throughput.py [--workers 4] [--duration 10] [--path /api/contacts/?limit=20]
+
+Seeds a throwaway SQLite database, then for each worker count starts
+``python -m app.core.server`` on it and drives it with several load
+generator processes (keep-alive httpx clients), printing requests per
+second and latency percentiles. Rate limiting is switched off for the run.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed(contacts: int):
+    # Imported here: settings read DATABASE_URL once, so it must be set first
+    from app.core.database import Base, SessionLocal, engine
+    from app.models import Company, Contact
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        companies = [Company(name=f"Company {i}", email=f"info{i}@example.com", country="USA") for i in range(20)]
+        db.add_all(companies)
+        db.flush()
+        db.add_all([
+            Contact(first_name=f"First{i}", last_name=f"Last{i}", email=f"contact{i}@example.com",
+                    city="NYC", country="USA", company_id=companies[i % len(companies)].id)
+            for i in range(contacts)
+        ])
+        db.commit()
+
+
+async def _drive(url: str, concurrency: int, duration: float):
+    latencies, errors = [], Counter()
+    deadline = time.monotonic() + duration
+
+    async def user(client):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+                continue
+            if response.status_code != 200:
+                errors[response.status_code] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*[user(client) for _ in range(concurrency)])
+    return latencies, errors
+
+
+def _generator(url, concurrency, duration, results):
+    results.put(asyncio.run(_drive(url, concurrency, duration)))
+
+
+def _wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server did not come up at {url}")
+
+
+def run(workers: int, port: int, path: str, env: dict, generators: int, concurrency: int, duration: float):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.core.server", "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--max-requests", "0"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        _wait_until_up(base + "/")
+        url = base + path
+        asyncio.run(_drive(url, concurrency, 1))  # warm up caches and connections
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_generator, args=(url, concurrency, duration, results))
+            for _ in range(generators)
+        ]
+        for process in processes:
+            process.start()
+        latencies, errors = [], Counter()
+        for _ in processes:
+            batch, failed = results.get()
+            latencies.extend(batch)
+            errors.update(failed)
+        for process in processes:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait(60)
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+    print(f"{workers:>3} worker(s): {len(latencies) / duration:>8.0f} req/s  "
+          f"p50 {percentile(0.5):6.1f} ms  p99 {percentile(0.99):6.1f} ms  errors {dict(errors) or 0}")
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{directory}/bench.db"
+    from app.core.server import available_cpus
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=available_cpus())
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--path", default="/api/contacts/?limit=20")
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--generators", type=int, default=2, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per generator")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    seed(args.contacts)
+    env = {**os.environ, "RATE_LIMIT_PER_SECOND": "0", "PYTHONPATH": ROOT}
+
+    for workers in sorted({1, args.workers}):
+        run(workers, args.port, args.path, env, args.generators, args.concurrency, args.duration)
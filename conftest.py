@@ -0,0 +1,80 @@
+"""
+Settings shared by the test modules.
+
+Settings are read once per process, when the app is first imported, so
+every test module runs against the same configuration: a throwaway SQLite
+file (or TEST_DATABASE_URL), no rate limiting or request coalescing, and
+audit rows written in the request's own transaction so they are counted
+with the route that caused them.
+
+The modules share that database, so the ``client`` fixture gives each one
+empty tables, and the helpers below make names and emails unique.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", f"sqlite:///{_tmp}/tests.db")
+os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+os.environ["COALESCE_ENABLED"] = "false"
+os.environ["AUDIT_DURABILITY"] = "transaction"
+os.environ["PHOTO_DIR"] = os.path.join(_tmp, "photos")
+os.environ.pop("VERCEL", None)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _unique(prefix: str) -> str:
+    return f"{prefix}-{os.urandom(3).hex()}"
+
+
+@pytest.fixture(scope="module")
+def client():
+    """The production app, without its lifespan, over freshly created tables."""
+    # Imported here, so the app reads the settings above
+    import main
+    from app.core.database import Base, engine
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def unique():
+    """``unique("City")`` is "City-" plus a random suffix."""
+    return _unique
+
+
+@pytest.fixture
+def contact_body():
+    """A valid contact create/update body with a unique email; keyword arguments override fields."""
+    def body(**fields):
+        return {"firstName": "Test", "lastName": "Person", "email": f"{_unique('p')}@example.com", **fields}
+    return body
+
+
+@pytest.fixture
+def create_company(client):
+    """Create a company through the API and return it, as the response JSON."""
+    def create(**fields):
+        response = client.post("/api/companies/", json={
+            "name": _unique("Company"), "email": f"{_unique('c')}@example.com", **fields,
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create
+
+
+@pytest.fixture
+def create_contact(client, contact_body):
+    """Create a contact through the API and return it, as the response JSON."""
+    def create(**fields):
+        response = client.post("/api/contacts/", json=contact_body(**fields))
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create
@@ -1,21 +1,32 @@
-from fastapi import FastAPI, Request, status
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import logging
 import os
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 # Load environment variables
 load_dotenv()
 
+# Structured logging through a background writer, started with the app
+from app.core import logs
+logs.configure()
+logger = logging.getLogger(__name__)
+
 try:
     # Import modules with error handling
-    from app.routers import contacts, companies
+    from app.routers import admin, auth, contacts, companies, events, reports, users, webhooks as webhook_routes
+    from app.core.auth import enforce_auth, require_owner, require_superuser
+    from app.core import audit, batching, maintenance, photos, security, webhooks
+    from app.core import admission, singleflight
+    from app.core.admission import AdmissionMiddleware, RateLimitMiddleware
+    from app.core.events import broadcaster
+    from app.core.deadlines import DeadlineMiddleware
+    from app.core.logs import AccessLogMiddleware
+    from app.core.profiling import ProfilerMiddleware
+    from app.core.singleflight import SingleFlightMiddleware
     from app.database import engine, Base
 
     # Create database tables - only on traditional servers, not in serverless
@@ -35,14 +46,21 @@ try:
 
     # Configure CORS
     frontend_url = os.environ.get("FRONTEND_URL", "*")
-    logger.info(f"Frontend URL: {frontend_url}")
+    logger.info("Frontend URL: %s", frontend_url)
     
     allowed_origins = [frontend_url]
     if "," in frontend_url:
         allowed_origins = frontend_url.split(",")
     
-    logger.info(f"Allowed origins: {allowed_origins}")
+    logger.info("Allowed origins: %s", allowed_origins)
 
+    # Innermost, so a profile covers the request's own work and not its wait for admission
+    app.add_middleware(ProfilerMiddleware)
+    # Load shedding and deadlines sit inside CORS so their 4xx/5xx responses still carry CORS headers
+    app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(SingleFlightMiddleware)
+    app.add_middleware(RateLimitMiddleware)
+    app.add_middleware(DeadlineMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=allowed_origins,
@@ -50,11 +68,13 @@ try:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # Outermost, so the logged duration includes admission and rate limiting
+    app.add_middleware(AccessLogMiddleware)
 
     # Exception handlers
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
-        logger.error(f"Validation error: {str(exc)}")
+        logger.error("Validation error: %s", exc)
         return JSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             content={"detail": exc.errors(), "body": exc.body},
@@ -62,20 +82,109 @@ try:
 
     @app.exception_handler(Exception)
     async def general_exception_handler(request: Request, exc: Exception):
-        logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
+        logger.error("Unhandled exception: %s", exc, exc_info=exc)
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"detail": str(exc)},
         )
 
     # Include routers
-    app.include_router(contacts.router, prefix="/api/contacts", tags=["contacts"])
-    app.include_router(companies.router, prefix="/api/companies", tags=["companies"])
+    app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
+    app.include_router(contacts.router, prefix="/api/contacts", tags=["contacts"], dependencies=[Depends(enforce_auth)])
+    app.include_router(companies.router, prefix="/api/companies", tags=["companies"], dependencies=[Depends(enforce_auth)])
+    app.include_router(events.router, prefix="/api/events", tags=["events"], dependencies=[Depends(enforce_auth)])
+    app.include_router(reports.router, prefix="/api/reports", tags=["reports"], dependencies=[Depends(enforce_auth)])
+    app.include_router(users.router, prefix="/api/users", tags=["users"], dependencies=[Depends(enforce_auth)])
+    # Subscriptions send an organization's data elsewhere, so only owners manage them
+    app.include_router(webhook_routes.router, prefix="/api/webhooks", tags=["webhooks"], dependencies=[Depends(require_owner)])
+    app.include_router(admin.router, prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_superuser)])
+
+    @app.on_event("startup")
+    def start_logging():
+        logs.start()
+
+    @app.on_event("startup")
+    async def warm_autocomplete():
+        # Serverless instances warm lazily on the first autocomplete request instead
+        if not is_vercel:
+            from app.core import prefix_index
+            try:
+                await run_in_threadpool(prefix_index.warm)
+            except Exception as e:
+                logger.warning("Autocomplete warm-up skipped: %s", e)
+
+    @app.on_event("startup")
+    def start_maintenance():
+        # Serverless instances don't live long enough to see a quiet period
+        if not is_vercel:
+            maintenance.scheduler.start()
+
+    @app.on_event("startup")
+    async def start_webhooks():
+        # Serverless instances are frozen between requests; run python -m app.core.webhooks dispatch instead
+        if not is_vercel:
+            webhooks.dispatcher.start()
+
+    @app.on_event("shutdown")
+    async def stop_webhooks():
+        await webhooks.dispatcher.stop()
+
+    @app.on_event("shutdown")
+    def stop_background_work():
+        security.shutdown_pool()
+        batching.contact_writer.stop()
+        # After the contact writer, whose last batch adds audit entries of its own
+        audit.writer.stop()
+        maintenance.scheduler.stop()
 
     @app.get("/")
     async def root():
         return {"message": "Welcome to PingCRM API", "environment": "Vercel" if is_vercel else "Local"}
 
+    @app.get("/metrics")
+    async def metrics():
+        """In-process counters for this worker"""
+        return {
+            "coalescing": singleflight.stats,
+            "admission": {
+                "active": admission.controller.active,
+                "waiting": admission.controller.waiting,
+                "admitted": admission.controller.admitted,
+                "rejected_full": admission.controller.rejected_full,
+                "rejected_timeout": admission.controller.rejected_timeout,
+                "rate_limited": admission.limiter.limited,
+            },
+            "contact_batching": {
+                "batches": batching.contact_writer.batches,
+                "rows": batching.contact_writer.rows,
+                "fallbacks": batching.contact_writer.fallbacks,
+            },
+            "logging": {"dropped": logs.dropped()},
+            "audit": {
+                "buffered": audit.writer.buffered,
+                "written": audit.writer.written,
+                "batches": audit.writer.batches,
+                "inline": audit.writer.inline,
+                "failures": audit.writer.failures,
+            },
+            "webhooks": {
+                "delivered": webhooks.dispatcher.delivered,
+                "batches": webhooks.dispatcher.batches,
+                "failures": webhooks.dispatcher.failures,
+            },
+            "thumbnails": {
+                "hits": photos.thumbnails.hits,
+                "misses": photos.thumbnails.misses,
+                "evicted": photos.thumbnails.evicted,
+            },
+            "maintenance": {"runs": maintenance.scheduler.runs, "interrupted": maintenance.scheduler.interrupted},
+            "events": {
+                "subscribers": broadcaster.subscriber_count,
+                "published": broadcaster.published,
+                "overflows": broadcaster.overflows,
+            },
+        }
+
     @app.get("/debug")
     async def debug():
         """Endpoint for debugging server configuration"""
@@ -88,9 +197,10 @@ try:
 
 except Exception as e:
     # If there's an error during startup, create a minimal app that returns the error
-    logger.error(f"Startup error: {str(e)}", exc_info=True)
+    logger.error("Startup error: %s", e, exc_info=True)
     
     app = FastAPI(title="PingCRM API [ERROR]")
+    app.add_event_handler("startup", logs.start)
     
     @app.get("/")
     async def error_root():
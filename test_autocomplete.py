@@ -0,0 +1,93 @@
+"""
+Autocomplete prefix indexes (app/core/prefix_index.py): other workers'
+changes are caught up from the audit log without reloading, and the database
+fallback matches the same keys as the index.
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+import pytest
+
+from app.core import prefix_index
+from app.core.config import settings
+from app.core.events import broadcaster
+
+
+@pytest.fixture(autouse=True)
+def indexes(monkeypatch):
+    """Indexes of this module's rows only, caught up on every request that isn't served from memory."""
+    monkeypatch.setattr(prefix_index, "_indexes", OrderedDict())
+    monkeypatch.setattr(settings, "AUTOCOMPLETE_SYNC_SECONDS", 0.05)
+
+
+@pytest.fixture
+def create_named(create_contact):
+    """Create a contact with the given first and last name and return its id."""
+    return lambda first_name, last_name: create_contact(firstName=first_name, lastName=last_name)["id"]
+
+
+def autocomplete(client, q, limit=50):
+    response = client.get("/api/contacts/autocomplete", params={"q": q, "limit": limit})
+    assert response.status_code == 200, response.text
+    return [item["id"] for item in response.json()]
+
+
+def caught_up(client, q):
+    time.sleep(settings.AUTOCOMPLETE_SYNC_SECONDS * 2)
+    return autocomplete(client, q)
+
+
+def test_other_workers_changes_are_caught_up(client, monkeypatch, create_named):
+    tag = f"zq{os.urandom(3).hex()}"
+    known = create_named("Known", tag)
+    assert autocomplete(client, tag) == [known]
+    index = prefix_index.get_index("contact")
+    loaded_from = index.synced_id
+
+    # Change events only reach the worker that made the change; without them this is another worker
+    monkeypatch.setattr(broadcaster, "_listeners", [])
+    monkeypatch.setattr(prefix_index, "warm", lambda *args, **kwargs: pytest.fail("reloaded the whole index"))
+    other = create_named("Other", tag)
+    assert sorted(caught_up(client, tag)) == sorted([known, other])
+    assert index.synced_id > loaded_from
+
+    assert client.delete(f"/api/contacts/{other}").status_code == 200
+    assert caught_up(client, tag) == [known]
+
+
+def test_database_fallback_matches_the_index(client, monkeypatch, create_named):
+    tag = f"zx{os.urandom(3).hex()}"
+    ids = [
+        create_named("Ann", f"{tag} Lee"),
+        create_named("Annabel", f"{tag}"),
+        create_named("Bo_b", f"{tag}"),
+        create_named("100%", f"{tag}"),
+    ]
+    queries = [tag, "ann", "lee", f"ann {tag}", "bo_", "bo_b", "100%", "ann lee"]
+    indexed = {q: sorted(autocomplete(client, q)) for q in queries}
+    assert set(indexed[tag]) == set(ids)
+    # Later words are keys too
+    assert ids[0] in indexed["lee"] and ids[0] in indexed[f"ann {tag}"]
+
+    # Over its cap, the index hands every query to the database
+    monkeypatch.setattr(prefix_index, "_indexes", OrderedDict())
+    monkeypatch.setattr(settings, "AUTOCOMPLETE_MAX_ENTRIES", 1)
+    assert {q: sorted(autocomplete(client, q)) for q in queries} == indexed
+    assert not prefix_index.get_index("contact").complete
+
+
+@pytest.mark.parametrize("complete", [True, False], ids=["index", "database"])
+def test_wildcards_match_themselves(client, monkeypatch, create_named, complete):
+    tag = f"zw{os.urandom(3).hex()}"
+    underscore, percent = create_named(f"{tag}_c", "Person"), create_named(f"{tag}%", "Person")
+    create_named(f"{tag}bc", "Person")
+    if not complete:
+        monkeypatch.setattr(settings, "AUTOCOMPLETE_MAX_ENTRIES", 1)
+
+    assert autocomplete(client, f"{tag}_") == [underscore]
+    assert autocomplete(client, f"{tag}%") == [percent]
+    assert autocomplete(client, "%") == []
+    assert autocomplete(client, "_") == []
+    assert prefix_index.get_index("contact").complete is complete
@@ -0,0 +1,88 @@
+"""
+Group commit for contact creates (app/core/batching.py): concurrent creates
+share one transaction, and a row that fails only fails its own caller.
+"""
+
+import os
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+
+from app import schemas
+from app.core import batching
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import Contact
+
+
+@pytest.fixture
+def writer():
+    # Batches fill up by size well before the wait runs out, so every submit lands in one
+    writer = batching.ContactWriter(max_size=3, max_wait_ms=5000)
+    yield writer
+    writer.stop()
+
+
+def values(email=None):
+    email = email or f"b{os.urandom(4).hex()}@example.com"
+    return schemas.ContactCreate(firstName="Batch", lastName="Person", email=email).model_dump()
+
+
+def stored_emails(*emails):
+    with SessionLocal() as db:
+        return set(db.scalars(select(Contact.email).where(Contact.email.in_(emails))))
+
+
+def test_concurrent_creates_commit_as_one_batch(client, writer):
+    rows = [values() for _ in range(3)]
+
+    contacts = [future.result(timeout=10) for future in [writer.submit(None, row) for row in rows]]
+
+    assert [contact.email for contact in contacts] == [row["email"] for row in rows]
+    assert len({contact.id for contact in contacts}) == 3
+    assert (writer.batches, writer.rows, writer.fallbacks) == (1, 3, 0)
+    assert stored_emails(*(row["email"] for row in rows)) == {row["email"] for row in rows}
+
+
+def test_failing_row_fails_only_its_caller(client, writer, create_contact):
+    taken = create_contact(firstName="Taken")
+    first, duplicate, last = values(), values(taken["email"]), values()
+
+    # What other connections can see of the batch just before each of the writer's commits
+    visible = []
+
+    def before_commit(session):
+        if not session.in_nested_transaction():
+            visible.append(stored_emails(first["email"], last["email"]))
+
+    event.listen(SessionLocal, "before_commit", before_commit)
+    try:
+        futures = [writer.submit(None, row) for row in (first, duplicate, last)]
+
+        assert futures[0].result(timeout=10).email == first["email"]
+        with pytest.raises(IntegrityError):
+            futures[1].result(timeout=10)
+        assert futures[2].result(timeout=10).email == last["email"]
+    finally:
+        event.remove(SessionLocal, "before_commit", before_commit)
+    # The per-row SAVEPOINTs commit nothing on their own: the rows appear together or not at all
+    assert visible == [set(), set()]
+    # The batch was rolled back and written again row by row, committing the rest together
+    assert (writer.batches, writer.rows, writer.fallbacks) == (1, 2, 1)
+    assert stored_emails(first["email"], last["email"]) == {first["email"], last["email"]}
+
+
+def test_create_route_goes_through_the_writer(client, monkeypatch, contact_body):
+    writer = batching.ContactWriter(max_size=1, max_wait_ms=0)
+    monkeypatch.setattr(settings, "CONTACT_BATCHING", True)
+    monkeypatch.setattr(batching, "contact_writer", writer)
+    try:
+        body = contact_body(firstName="Routed")
+        response = client.post("/api/contacts/", json=body)
+    finally:
+        writer.stop()
+
+    assert response.status_code == 200, response.text
+    assert response.json()["email"] == body["email"]
+    assert writer.rows == 1
@@ -0,0 +1,75 @@
+"""
+Company soft-delete, restore and delete cascading to contacts
+(app/core/cascade.py): a restore brings back exactly the contacts the
+company's soft delete trashed, and nothing else.
+"""
+
+from sqlalchemy import func, select
+
+from app.core.database import SessionLocal
+from app.models import ContactBlockingKey
+
+
+def trashed(client, *contact_ids):
+    """Which of the contacts are in the trash, in order."""
+    return [client.get(f"/api/contacts/{contact_id}").json()["deletedAt"] is not None for contact_id in contact_ids]
+
+
+def test_restore_brings_back_exactly_the_trashed_batch(client, create_company, create_contact):
+    company_id, other_company_id = create_company()["id"], create_company()["id"]
+    batch = [create_contact(companyId=company_id)["id"] for _ in range(3)]
+    already_trashed = create_contact(companyId=company_id)["id"]
+    elsewhere = create_contact(companyId=other_company_id)["id"]
+    assert client.delete(f"/api/contacts/{already_trashed}").status_code == 200
+
+    response = client.patch(f"/api/companies/{company_id}/soft-delete?cascade=true")
+    assert response.status_code == 200, response.text
+    assert "3 contact(s)" in response.json()["message"]
+    assert trashed(client, *batch, already_trashed, elsewhere) == [True, True, True, True, False]
+
+    # Restored on its own and trashed again, a contact leaves the batch
+    left_batch = batch.pop()
+    assert client.post(f"/api/contacts/{left_batch}/restore").status_code == 200
+    assert client.delete(f"/api/contacts/{left_batch}").status_code == 200
+
+    response = client.patch(f"/api/companies/{company_id}/restore")
+    assert response.status_code == 200, response.text
+    assert response.json()["deletedAt"] is None
+    assert trashed(client, *batch, left_batch, already_trashed, elsewhere) == [False, False, True, True, False]
+
+    # The batch is used up: trashing and restoring again without cascade touches no contacts
+    assert client.patch(f"/api/companies/{company_id}/soft-delete").status_code == 200
+    assert client.patch(f"/api/companies/{company_id}/restore").status_code == 200
+    assert trashed(client, *batch, left_batch, already_trashed) == [False, False, True, True]
+
+
+def test_soft_delete_without_cascade_leaves_contacts_alone(client, create_company, create_contact):
+    company_id = create_company()["id"]
+    contacts = [create_contact(companyId=company_id)["id"] for _ in range(2)]
+
+    assert client.patch(f"/api/companies/{company_id}/soft-delete").status_code == 200
+    assert trashed(client, *contacts) == [False, False]
+    assert client.patch(f"/api/companies/{company_id}/restore").status_code == 200
+    assert trashed(client, *contacts) == [False, False]
+
+
+def test_delete_with_cascade_removes_contacts_and_their_keys(client, create_company, create_contact):
+    company_id = create_company()["id"]
+    contacts = [create_contact(companyId=company_id)["id"] for _ in range(2)]
+
+    assert client.delete(f"/api/companies/{company_id}?cascade=true").status_code == 200
+
+    assert [client.get(f"/api/contacts/{contact_id}").status_code for contact_id in contacts] == [404, 404]
+    with SessionLocal() as db:
+        keys = db.scalar(select(func.count()).where(ContactBlockingKey.contact_id.in_(contacts)))
+    assert keys == 0
+
+
+def test_delete_without_cascade_keeps_contacts_without_a_company(client, create_company, create_contact):
+    company_id = create_company()["id"]
+    contact_id = create_contact(companyId=company_id)["id"]
+
+    assert client.delete(f"/api/companies/{company_id}").status_code == 200
+
+    contact = client.get(f"/api/contacts/{contact_id}").json()
+    assert contact["companyId"] is None and contact["deletedAt"] is None
@@ -0,0 +1,117 @@
+"""
+The ``filter`` parameter on list endpoints (app/core/filters.py): each
+operator returns the rows it describes, and fields or operators outside the
+whitelist are refused with a 400.
+"""
+
+import pytest
+
+from app.core.config import settings
+
+
+@pytest.fixture
+def people(unique, create_company, create_contact):
+    """Contacts sharing a last name no other test uses, so filtering on it isolates them."""
+    tag = unique("Filter")
+    company_id = create_company(name="Filter Co")["id"]
+    rows = {}
+    for key, first_name, country, company in [
+        ("underscore", "Ann_a", "USA", company_id),
+        ("annabel", "Annabel", "Canada", None),
+        ("lowercase", "ann", None, None),
+        ("other", "Bob", "USA", None),
+    ]:
+        rows[key] = create_contact(firstName=first_name, lastName=tag, country=country, companyId=company)["id"]
+    return tag, company_id, rows
+
+
+def matching(client, tag, *filters, **params):
+    query = [("filter", f"lastName:eq:{tag}"), *(("filter", value) for value in filters), ("limit", 100),
+             *params.items()]
+    response = client.get("/api/contacts/", params=query)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def ids(page):
+    return sorted(item["id"] for item in page["items"])
+
+
+def expected(rows, *keys):
+    return sorted(rows[key] for key in keys)
+
+
+def test_eq_and_in(client, people):
+    tag, _, rows = people
+    assert ids(matching(client, tag, "country:eq:USA")) == expected(rows, "underscore", "other")
+    assert ids(matching(client, tag, "country:in:USA,Canada")) == expected(rows, "underscore", "annabel", "other")
+    assert ids(matching(client, tag, "country:in:Mexico")) == []
+
+
+def test_range_operators(client, people):
+    tag, _, rows = people
+    middle = rows["annabel"]
+    assert ids(matching(client, tag, f"id:gt:{middle}")) == expected(rows, "lowercase", "other")
+    assert ids(matching(client, tag, f"id:gte:{middle}")) == expected(rows, "annabel", "lowercase", "other")
+    assert ids(matching(client, tag, f"id:lt:{middle}")) == expected(rows, "underscore")
+    assert ids(matching(client, tag, f"id:lte:{middle}")) == expected(rows, "underscore", "annabel")
+    assert ids(matching(client, tag, "createdAt:gte:2000-01-01T00:00:00")) == expected(rows, *rows)
+
+
+def test_prefix_is_case_sensitive_and_literal(client, people):
+    tag, _, rows = people
+    assert ids(matching(client, tag, "firstName:prefix:Ann")) == expected(rows, "underscore", "annabel")
+    # _ is a LIKE wildcard; as a prefix it only matches itself
+    assert ids(matching(client, tag, "firstName:prefix:Ann_")) == expected(rows, "underscore")
+    assert ids(matching(client, tag, "firstName:prefix:ann")) == expected(rows, "lowercase")
+
+
+def test_null_and_notnull(client, people):
+    tag, _, rows = people
+    assert ids(matching(client, tag, "country:null")) == expected(rows, "lowercase")
+    assert ids(matching(client, tag, "country:notnull")) == expected(rows, "underscore", "annabel", "other")
+
+
+def test_combines_with_company_id_and_facets(client, people):
+    tag, company_id, rows = people
+    page = matching(client, tag, "country:notnull", company_id=company_id, facets="country")
+    assert ids(page) == expected(rows, "underscore")
+    assert page["total"] == 1
+    assert page["facets"]["country"] == [{"value": "USA", "count": 1}]
+
+
+@pytest.mark.parametrize("value, detail", [
+    ("city:eq:Chicago", "isn't supported by an index"),
+    ("nickname:eq:Al", "Cannot filter on 'nickname'"),
+    ("country:like:US", "Unknown filter operator 'like'"),
+    ("id:eq:abc", "Invalid value for id"),
+    ("createdAt:gte:yesterday", "Invalid value for createdAt"),
+    ("country:eq:", "Missing value"),
+    ("country:null:USA", "null takes no value"),
+    ("id:prefix:1", "prefix only applies to text fields"),
+    ("country:in:", "in takes 1 to"),
+])
+def test_rejects_filters_outside_the_whitelist(client, value, detail):
+    response = client.get("/api/contacts/", params={"filter": value})
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+
+
+def test_rejects_too_many_clauses_and_in_values(client):
+    clauses = [("filter", f"id:gt:{i}") for i in range(settings.FILTER_MAX_CLAUSES + 1)]
+    response = client.get("/api/contacts/", params=clauses)
+    assert response.status_code == 400
+    assert "filters per request" in response.json()["detail"]
+
+    values = ",".join(str(i) for i in range(settings.FILTER_MAX_IN_VALUES + 1))
+    response = client.get("/api/contacts/", params={"filter": f"id:in:{values}"})
+    assert response.status_code == 400
+    assert "in takes 1 to" in response.json()["detail"]
+
+
+def test_unindexed_field_can_be_allowed(client, people, monkeypatch):
+    tag, _, rows = people
+    monkeypatch.setattr(settings, "FILTER_UNINDEXED_ALLOWED", ["contacts.city"])
+    assert ids(matching(client, tag, "city:null")) == expected(rows, *rows)
+    # Allowing a column on one table doesn't allow it on another
+    assert client.get("/api/companies/", params={"filter": "city:null"}).status_code == 400
@@ -0,0 +1,104 @@
+"""
+Report summary tables (app/core/reports.py): every contact write adjusts
+the summary rows it affects, and the result must always equal a rebuild
+of the summaries from the contacts table.
+"""
+
+from sqlalchemy import select
+
+from app.core import reports
+from app.core.database import engine
+
+
+def company_count(client, company_id):
+    rows = client.get("/api/reports/contacts-by-company?limit=500").json()
+    return next((row["contactCount"] for row in rows if row["companyId"] == company_id), 0)
+
+
+def city_count(client, city):
+    rows = client.get("/api/reports/contacts-by-location?level=city&limit=1000").json()
+    return sum(row["contactCount"] for row in rows if row["city"] == city)
+
+
+def created_today(client):
+    return client.get("/api/reports/contact-growth").json()[-1]["createdCount"]
+
+
+def _summaries(connection):
+    return {
+        name: sorted(tuple(row) for row in connection.execute(select(table)) if row._mapping[counter])
+        for name, (table, _, counter) in reports.SUMMARIES.items()
+    }
+
+
+def assert_matches_rebuild():
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            maintained = _summaries(connection)
+            reports.rebuild(connection)
+            rebuilt = _summaries(connection)
+        finally:
+            transaction.rollback()
+    assert maintained == rebuilt
+
+
+def test_create_counts_towards_company_location_and_growth(client, unique, create_company, create_contact):
+    company_id = create_company()["id"]
+    city = unique("City")
+    before = created_today(client)
+
+    create_contact(city=city, companyId=company_id)
+    create_contact(city=city)
+
+    assert company_count(client, company_id) == 1
+    assert city_count(client, city) == 2
+    assert created_today(client) == before + 2
+    assert_matches_rebuild()
+
+
+def test_update_moves_contact_between_rows(client, unique, create_company, create_contact, contact_body):
+    first, second = create_company()["id"], create_company()["id"]
+    old_city, new_city = unique("City"), unique("City")
+    contact = create_contact(city=old_city, companyId=first)
+    before = created_today(client)
+
+    response = client.put(f"/api/contacts/{contact['id']}", json=contact_body(city=new_city, companyId=second))
+    assert response.status_code == 200, response.text
+
+    assert (company_count(client, first), company_count(client, second)) == (0, 1)
+    assert (city_count(client, old_city), city_count(client, new_city)) == (0, 1)
+    # Growth counts creations, which an update isn't
+    assert created_today(client) == before
+    assert_matches_rebuild()
+
+
+def test_delete_and_restore_change_active_counts_only(client, unique, create_company, create_contact):
+    company_id = create_company()["id"]
+    city = unique("City")
+    contact = create_contact(city=city, companyId=company_id)
+    before = created_today(client)
+
+    assert client.delete(f"/api/contacts/{contact['id']}").status_code == 200
+    assert (company_count(client, company_id), city_count(client, city)) == (0, 0)
+    # A trashed contact was still created that day
+    assert created_today(client) == before
+    assert_matches_rebuild()
+
+    assert client.post(f"/api/contacts/{contact['id']}/restore").status_code == 200
+    assert (company_count(client, company_id), city_count(client, city)) == (1, 1)
+    assert_matches_rebuild()
+
+
+def test_company_delete_detaches_contacts_from_its_count(client, unique, create_company, create_contact):
+    company_id = create_company()["id"]
+    city = unique("City")
+    create_contact(city=city, companyId=company_id)
+    create_contact(city=city, companyId=company_id)
+
+    assert client.delete(f"/api/companies/{company_id}").status_code == 200
+
+    assert company_count(client, company_id) == 0
+    # The contacts stay, just without a company
+    assert city_count(client, city) == 2
+    assert_matches_rebuild()
@@ -0,0 +1,157 @@
+"""
+Webhook delivery (app/core/webhooks.py) against the stub receiver on a
+local port: outbox rows are written in the change's own transaction, failed
+deliveries back off and retry, and an endpoint that keeps failing is
+deactivated.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import httpx
+import pytest
+from sqlalchemy import func, select, update
+
+import main
+from app.core import webhooks
+from app.core.auth import require_owner
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import Contact, WebhookOutbox, WebhookSubscription
+from app.routers import webhooks as webhook_routes
+
+
+@pytest.fixture(scope="module")
+def receiver_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), webhooks._StubReceiver)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def subscription(client, receiver_url, monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_ALLOW_PRIVATE_URLS", True)
+    monkeypatch.setattr(settings, "WEBHOOK_RETRY_BASE_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "WEBHOOK_MAX_FAILURES", 3)
+    subscription = webhooks.create_subscription(None, receiver_url, "contact")
+    monkeypatch.setattr(webhooks._StubReceiver, "secret", subscription.secret)
+    monkeypatch.setattr(webhooks._StubReceiver, "fail_rate", 0.0)
+    yield subscription
+    webhooks.delete_subscription(None, subscription.id)
+
+
+def outbox_rows(subscription_id):
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).where(WebhookOutbox.subscription_id == subscription_id))
+
+
+def stored(subscription_id):
+    with SessionLocal() as db:
+        return db.get(WebhookSubscription, subscription_id)
+
+
+def deliver_round(dispatcher):
+    """One dispatcher round, run the way its task runs it."""
+    async def round_():
+        async with httpx.AsyncClient(timeout=5) as http:
+            claimed = dispatcher._claim()
+            for subscription in claimed:
+                await dispatcher._deliver(http, subscription)
+            return len(claimed)
+
+    return asyncio.run(round_())
+
+
+def received(capsys):
+    """What the stub printed: its status lines and the events it was sent."""
+    lines = capsys.readouterr().out.splitlines()
+    return [line for line in lines if line.startswith("->")], [json.loads(line) for line in lines if line.startswith("{")]
+
+
+def test_outbox_rows_commit_with_the_change(client, subscription, create_contact, capsys):
+    with SessionLocal() as db:
+        db.add(Contact(first_name="Rolled", last_name="Back", email=f"r{os.urandom(4).hex()}@example.com"))
+        db.flush()
+        assert db.scalar(select(func.count()).where(WebhookOutbox.subscription_id == subscription.id)) == 1
+        db.rollback()
+    assert outbox_rows(subscription.id) == 0
+
+    contact = create_contact()
+    assert outbox_rows(subscription.id) == 1
+
+    dispatcher = webhooks.WebhookDispatcher()
+    assert deliver_round(dispatcher) == 1
+    statuses, events = received(capsys)
+    assert statuses == ["-> 200 1 events signature ok"]
+    assert [(evt["entity"], evt["action"], evt["data"]["email"]) for evt in events] == \
+        [("contact", "created", contact["email"])]
+    assert (dispatcher.delivered, dispatcher.failures) == (1, 0)
+    assert outbox_rows(subscription.id) == 0
+
+
+def test_failed_delivery_backs_off_then_retries(client, subscription, create_contact, monkeypatch, capsys):
+    create_contact()
+    monkeypatch.setattr(webhooks._StubReceiver, "fail_rate", 1.0)
+    dispatcher = webhooks.WebhookDispatcher()
+
+    assert deliver_round(dispatcher) == 1
+    failed = stored(subscription.id)
+    assert (failed.failures, failed.active) == (1, True)
+    assert "503" in failed.last_error and failed.next_attempt_at is not None
+    assert outbox_rows(subscription.id) == 1
+    # Backing off: not claimed again until next_attempt_at
+    assert dispatcher._claim() == []
+
+    monkeypatch.setattr(webhooks._StubReceiver, "fail_rate", 0.0)
+    time.sleep(settings.WEBHOOK_RETRY_BASE_SECONDS * 2)
+    assert deliver_round(dispatcher) == 1
+    statuses, events = received(capsys)
+    assert statuses[0].startswith("-> 503") and statuses[1:] == ["-> 200 1 events signature ok"]
+    assert len(events) == 1
+    recovered = stored(subscription.id)
+    assert (recovered.failures, recovered.next_attempt_at, recovered.last_error) == (0, None, None)
+    assert outbox_rows(subscription.id) == 0
+
+
+def test_deactivated_after_max_failures(client, subscription, create_contact, monkeypatch):
+    create_contact()
+    monkeypatch.setattr(webhooks._StubReceiver, "fail_rate", 1.0)
+    dispatcher = webhooks.WebhookDispatcher()
+
+    for _ in range(settings.WEBHOOK_MAX_FAILURES):
+        with SessionLocal() as db:
+            # Skip the backoff rather than wait it out
+            db.execute(update(WebhookSubscription).where(WebhookSubscription.id == subscription.id)
+                       .values(next_attempt_at=None))
+            db.commit()
+        assert deliver_round(dispatcher) == 1
+
+    deactivated = stored(subscription.id)
+    assert (deactivated.failures, deactivated.active) == (settings.WEBHOOK_MAX_FAILURES, False)
+    assert dispatcher.failures == settings.WEBHOOK_MAX_FAILURES
+    assert dispatcher._claim() == []
+    # No longer subscribed: a later change adds nothing to the row it never delivered
+    create_contact()
+    assert outbox_rows(subscription.id) == 1
+
+
+def test_update_rejects_null_url_and_active(client, subscription, monkeypatch):
+    # Signed in as the owner of global subscriptions
+    monkeypatch.setitem(main.app.dependency_overrides, require_owner, lambda: None)
+    monkeypatch.setitem(main.app.dependency_overrides, webhook_routes.subscription_scope, lambda: None)
+
+    for body in ({"url": None}, {"active": None}, {"url": None, "active": None}):
+        response = client.put(f"/api/webhooks/{subscription.id}", json=body)
+        assert response.status_code == 422, response.text
+
+    response = client.put(f"/api/webhooks/{subscription.id}", json={"entity": None})
+    assert response.status_code == 200, response.text
+    unchanged = stored(subscription.id)
+    assert (unchanged.url, unchanged.active, unchanged.entity) == (subscription.url, True, None)